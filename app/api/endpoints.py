@@ -1,35 +1,42 @@
 import asyncio
-import io
-import base64
-import json
+import hashlib
 import logging
 
 # Standard library
 import os
 import re
 import uuid
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, List, Optional
 
 # Third-party
 from dotenv import load_dotenv
-from fastapi import APIRouter, BackgroundTasks, File, Form, Request, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from app.api.streaming import coalesced_sse, hedged_stream, sse_data, stream_race
 from app.api.utils import write_bytes
 from app.background import job_store
+from app.blobs import blob_store
+from app.codec import dumps, dumps_text
+from app.dispatcher import job_dispatcher
+from app.scheduler import QueueFull, job_scheduler
+from app.services.ai.decoder import answer_text
 from app.services.ai.processor import AIProcessor
+from app.services.ai.retry import ingestion_scheduler
+from app.services.http_transport import transport_manager
+from app.services.preflight import pdf_preflight
+from app.services.text_extract import (
+    extract_inline_text,
+    inline_max_chars,
+    inline_text_enabled,
+    supports_inline,
+)
+from app.tasks import run_job
 
 # Local
-from app.services.ai.saia_console_client import SAIAConsoleClient
-
-# Optional PDF reader
-PdfReader = None
-try:
-    import PyPDF2
-
-    PdfReader = getattr(PyPDF2, "PdfReader", None)
-except Exception:
-    PdfReader = None
+from app.services.ai.saia_console_client import SAIAConsoleClient, job_stage
+from app.services.ai.sse import TextDelta
 
 # No DB persistence for demo: uploads go directly to SAIA files API
 load_dotenv()
@@ -41,22 +48,180 @@ STEM_TRUNCATION_LENGTH = 40
 MAX_STREAM_TOTAL_BYTES = 1_000_000  # 1 MB
 MAX_STREAM_CHUNKS = 1000
 
+ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".csv", ".txt"}
+
+# Chunk size used when streaming UploadFile bodies to SAIA
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 router = APIRouter()
 
 
-@router.get("/status/{job_id}")
-def job_status(job_id: str):
-    j = job_store.get(job_id)
-    if not j:
-        return {"status": "not_found"}
+@router.get("/status")
+def runtime_status(request: Request):
+    """In-process counters for tuning: client metrics, 8024 retry stats, preflight, blobs, caches, HTTP pools, jobs and /stream races."""
+    client = getattr(request.app.state, "saia_client", None)
+    return {
+        "saia_client": dict(client.metrics) if client is not None else None,
+        "ingestion_retry": ingestion_scheduler.stats(),
+        "preflight": dict(pdf_preflight.metrics),
+        "blobs": blob_store.stats(),
+        "http": transport_manager.stats(),
+        "scheduler": job_scheduler.stats(),
+        "dispatcher": job_dispatcher.stats(),
+        "stream_race": stream_race.stats(),
+        "jobs": job_store.stats(),
+        "result_cache": (
+            client.result_cache.stats()
+            if getattr(client, "result_cache", None) is not None
+            else None
+        ),
+    }
+
+
+def _job_view(job_id: str, j: dict) -> dict:
     return {
         "id": job_id,
         "status": j["status"],
+        "stage": j.get("stage"),
         "result": j["result"],
         "error": j["error"],
     }
 
 
+@router.get("/status/{job_id}")
+async def job_status(job_id: str, wait: float = 0):
+    """Job state; with ``wait`` (seconds, capped by STATUS_MAX_WAIT) it long-polls until the job ends."""
+    if wait > 0:
+        j = await job_store.wait(job_id, min(wait, _env_float("STATUS_MAX_WAIT", 30.0)))
+    else:
+        j = await job_store.aget(job_id)
+    if not j:
+        # queued through Redis by another web process: ask RQ directly
+        j = await job_dispatcher.lookup(job_id)
+    if not j:
+        return {"status": "not_found"}
+    return _job_view(job_id, j)
+
+
+@router.get("/status/{job_id}/events")
+async def job_events(job_id: str):
+    """SSE stream of stage transitions (queued, uploading, ingesting, chatting, finished/failed).
+
+    Each change is sent as an ``event: stage`` message; the last one is an
+    ``event: done`` carrying the result, then the stream closes.
+    """
+    heartbeat = _env_float("SSE_HEARTBEAT_SECONDS", 15.0)
+
+    async def gen():
+        found = False
+        async for j in job_store.events(job_id, heartbeat=heartbeat):
+            if j is None:
+                yield b": keep-alive\n\n"
+                continue
+            found = True
+            view = _job_view(job_id, j)
+            if j["status"] in ("finished", "failed"):
+                yield b"event: done\ndata: " + dumps(view) + b"\n\n"
+                return
+            data = dumps({"id": job_id, "status": view["status"], "stage": view["stage"]})
+            yield b"event: stage\ndata: " + data + b"\n\n"
+        if not found:
+            yield b"event: done\ndata: " + dumps({"id": job_id, "status": "not_found"}) + b"\n\n"
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def max_upload_bytes() -> int:
+    """Upload size limit; streaming uploads keep memory flat so they allow a larger cap."""
+    if _env_flag("STREAM_UPLOADS"):
+        return _env_int("STREAM_MAX_UPLOAD_BYTES", 25 * 1024 * 1024)  # 25 MB
+    return _env_int("MAX_UPLOAD_BYTES", 800 * 1024)  # 800 KB
+
+
+async def _iter_upload_file(
+    file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncGenerator[bytes, None]:
+    """Yield the UploadFile body in fixed-size chunks."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _hash_upload_file(file: UploadFile) -> str:
+    """sha256 of the UploadFile body in one chunked pass, rewinding it afterwards."""
+    h = hashlib.sha256()
+    async for chunk in _iter_upload_file(file):
+        h.update(chunk)
+    await file.seek(0)
+    return h.hexdigest()
+
+
+def _unique_alias(filename: Optional[str]) -> str:
+    """Alias format: <filename-stem>-<shortid>"""
+    try:
+        stem = os.path.splitext(filename or "file")[0]
+        stem = re.sub(r"[^A-Za-z0-9_\-]", "_", stem)[:STEM_TRUNCATION_LENGTH] or "file"
+        return f"{stem}-{uuid.uuid4().hex[:6]}"
+    except Exception:
+        return os.path.splitext(filename or "file")[0] or "file"
+
+
+def _client_key(request: Request) -> str:
+    """Identify the caller for fair queuing (Heroku's router sets X-Forwarded-For)."""
+    fwd = request.headers.get("x-forwarded-for")
+    if fwd:
+        return fwd.split(",")[0].strip()
+    return request.client.host if request.client else "anonymous"
+
+
+def _queue_full_response(retry_after: int) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+        content={
+            "error": "queue_full",
+            "detail": f"Demasiados trabajos en cola; reintenta en {retry_after}s",
+        },
+    )
+
+
+def _get_saia_client(request: Request):
+    """Prefer the shared client from app.state; fallback to a per-call client."""
+    client = getattr(request.app.state, "saia_client", None)
+    if client is None:
+        client = SAIAConsoleClient(
+            os.environ.get("GEAI_API_TOKEN"),
+            os.environ.get("ORGANIZATION_ID"),
+            os.environ.get("PROJECT_ID"),
+            os.environ.get("ASSISTANT_ID", "test_read"),
+        )
+    return client
+
+
 @router.post("/upload_pdf")
 async def upload_pdf(
     request: Request,
@@ -65,17 +230,34 @@ async def upload_pdf(
     folder: str = Form(None),
     assistant: str = Form(None),
     alias: str = Form(None),
-    background_tasks: BackgroundTasks = None,
+    no_cache: bool = Form(False),
 ):
+    # backpressure: refuse before reading or uploading anything when the queue is full
+    if job_scheduler.is_full():
+        job_scheduler.metrics["rejected"] += 1
+        return _queue_full_response(job_scheduler.retry_after())
+
     # server-side validation: limit size and allowed extensions
-    allowed_ext = {".pdf", ".png", ".jpg", ".jpeg", ".csv", ".txt"}
-    max_bytes = 800 * 1024  # 800 KB
-    contents = await file.read()
-    if len(contents) > max_bytes:
-        return {
-            "error": "file_too_large",
-            "detail": f"El archivo excede {max_bytes} bytes",
-        }
+    allowed_ext = ALLOWED_EXTENSIONS
+    max_bytes = max_upload_bytes()
+    # streaming mode: the body is never loaded whole; chunks go straight to SAIA
+    streaming = _env_flag("STREAM_UPLOADS")
+    if streaming:
+        contents = None
+        file_size = file.size
+        if file_size is not None and file_size > max_bytes:
+            return {
+                "error": "file_too_large",
+                "detail": f"El archivo excede {max_bytes} bytes",
+            }
+    else:
+        contents = await file.read()
+        file_size = len(contents)
+        if file_size > max_bytes:
+            return {
+                "error": "file_too_large",
+                "detail": f"El archivo excede {max_bytes} bytes",
+            }
 
     _, ext = os.path.splitext(file.filename or "")
     if ext.lower() not in allowed_ext:
@@ -84,230 +266,174 @@ async def upload_pdf(
             "detail": f"Extensión no soportada: {ext}",
         }
 
-    # Keep uploaded bytes in-memory and avoid disk I/O unless needed.
-    tmp_dir = "/tmp/saia_demo"
-    os.makedirs(tmp_dir, exist_ok=True)
-    tmp_path = None
-
     upload_resp = None
     try:
-        # If PDF, check number of pages before uploading to avoid SAIA error 8024
+        # If PDF, check number of pages before uploading to avoid SAIA error 8024.
+        # The check runs off the event loop with a time budget; see app.services.preflight
+        preflight = None
         if ext.lower() == ".pdf":
-            # Prefer using module-level PdfReader if available (imported at module load).
-            if PdfReader is not None:
-                try:
-                    # parse PDF from in-memory bytes to avoid disk writes
-                    reader = PdfReader(io.BytesIO(contents))
-                    num_pages = len(reader.pages)
-                    if num_pages == 0:
-                        return {
-                            "error": "document_no_pages",
-                            "detail": "El PDF no contiene páginas.",
-                        }
-                except Exception:
-                    logger.debug(
-                        "PdfReader falló al analizar el PDF en memoria; se usará heurístico de bytes como fallback."
-                    )
-
-            # Fallback heuristics when PyPDF2 is not available or fails.
-            try:
-                # 'contents' was read earlier from UploadFile
-                if not contents or len(contents) < 200:
-                    return {
-                        "error": "document_no_pages",
-                        "detail": "El PDF parece vacío o demasiado pequeño.",
-                    }
-                # basic PDF header/footer check
-                if not contents.startswith(b"%PDF"):
-                    return {
-                        "error": "document_no_pages",
-                        "detail": "El archivo no parece un PDF válido (sin encabezado %PDF).",
-                    }
-                if b"%%EOF" not in contents[-2048:]:
-                    # EOF marker may be near the end; if missing, consider invalid
-                    logger.debug(
-                        "PDF parece no tener marcador EOF, pero se continuará (heurístico)."
-                    )
-                # look for page objects heuristically
-                if (
-                    contents.count(b"/Type /Page") == 0
-                    and contents.count(b"/Page") == 0
-                ):
-                    # no obvious page markers found
-                    return {
-                        "error": "document_no_pages",
-                        "detail": "No se detectaron páginas en el PDF (comprobación heurística).",
-                    }
-            except Exception:
-                logger.debug(
-                    "Fallback heurístico de PDF falló; se intentará subir y dejar que SAIA lo valide."
-                )
+            # streaming mode: map the spooled temp file instead of reading it into memory
+            source = file.file.fileno() if streaming else contents
+            preflight = await pdf_preflight.check(source)
+            if not preflight.get("ok"):
+                return {
+                    "error": preflight.get("error") or "document_no_pages",
+                    "detail": preflight.get("detail"),
+                }
 
         # Orchestrate upload->chat. Use a unique alias per upload to avoid reusing previous files.
-        # Alias format: <filename-stem>-<shortid>
         prompt_text = prompt or ""
-        try:
-            stem = os.path.splitext(file.filename or "file")[0]
-            stem = (
-                re.sub(r"[^A-Za-z0-9_\-]", "_", stem)[:STEM_TRUNCATION_LENGTH] or "file"
-            )
-            unique_alias = f"{stem}-{uuid.uuid4().hex[:6]}"
-        except Exception:
-            unique_alias = os.path.splitext(file.filename or "file")[0] or "file"
+        unique_alias = _unique_alias(file.filename)
 
         # In-process background task to avoid Heroku 30s timeouts without Redis
-        # use in-memory bytes for payload to avoid disk I/O and extra reads
-        b = contents
         payload = {
-            "file_b64": base64.b64encode(b).decode("ascii"),
             "filename": file.filename,
             "prompt": prompt_text,
             "folder": folder or "test1",
             "alias": alias or unique_alias,
             "assistant": assistant or os.environ.get("ASSISTANT_ID", "test_read"),
+            "no_cache": bool(no_cache),
         }
+        client = _get_saia_client(request)
+        file_hash = preflight.get("sha256") if preflight else None
+        # Result cache (opt-in): a stored answer for the same bytes, prompt and
+        # assistant finishes the job right away, without any call to SAIA;
+        # no_cache skips the lookup but the fresh answer still refreshes the entry
+        if getattr(client, "result_cache", None) is not None:
+            if file_hash is None:
+                file_hash = (
+                    hashlib.sha256(contents).hexdigest()
+                    if contents is not None
+                    else await _hash_upload_file(file)
+                )
+            cached = (
+                None
+                if no_cache
+                else await client.cached_result(file_hash, prompt_text, payload["assistant"])
+            )
+            if cached is not None:
+                job_id = await job_store.acreate(payload)
+                await job_store.aset_result(job_id, cached)
+                return {"status": "finished", "job_id": job_id, "result": cached}
+            # already looked up (and missed): the job must not count a second miss
+            payload["cache_checked"] = True
+        payload["sha256"] = file_hash
+
+        # Inline-text mode (opt-in): text-extractable documents skip the files API
+        inline_text = None
+        if inline_text_enabled() and supports_inline(ext):
+            max_chars = inline_max_chars()
+            data = contents
+            if data is None and file_size is not None and file_size <= max_chars * 4:
+                data = await file.read()
+                await file.seek(0)
+            if data is not None:
+                inline_text = await extract_inline_text(data, ext, max_chars)
+            data = None
+
+        if inline_text is not None:
+            payload["inline_text"] = inline_text
+        elif streaming:
+            # upload now, while the request body is still available; the job only chats
+            # hashing first (the body is spooled by starlette) lets duplicates skip the upload
+            if file_hash is None and getattr(client, "upload_index", None) is not None:
+                file_hash = await _hash_upload_file(file)
+            upload_resp = await client.upload_chunks(
+                _iter_upload_file(file),
+                file.filename or "file",
+                folder=payload["folder"],
+                alias=payload["alias"],
+                size=file_size,
+                max_bytes=max_bytes,
+                sha256=file_hash,
+            )
+            if upload_resp.get("error") or upload_resp.get("status_code", 0) >= 400:
+                return {
+                    "error": upload_resp.get("error") or "upload_failed",
+                    "detail": upload_resp.get("detail")
+                    or f"SAIA respondió {upload_resp.get('status_code')}",
+                    "upload_response": upload_resp,
+                }
+            payload["upload"] = upload_resp
+        else:
+            # keep the uploaded bytes once; the job only carries the blob key
+            blob = blob_store.put(contents, sha256=file_hash)
+            payload["blob_id"] = blob.key
+            payload["sha256"] = blob.sha256
+            contents = None
 
-        job_id = job_store.create(payload)
+        job_id = await job_store.acreate(payload)
 
         # Fast synchronous attempt (opt-in) to reduce latency for quick cases.
         try:
             fast_timeout = float(os.environ.get("FAST_CHAT_TIMEOUT", "0"))
         except Exception:
             fast_timeout = 0.0
-        if fast_timeout and fast_timeout > 0:
-            # get client (shared or temp)
+
+        # REDIS_URL configured: the job runs on an RQ worker and its state is
+        # mirrored back into job_store by the dispatcher
+        if job_dispatcher.mode == "rq":
+            blob = blob_store.get(payload.get("blob_id"))
             try:
-                client = getattr(request.app.state, "saia_client", None)
-                if client is None:
-                    client = SAIAConsoleClient(
-                        os.environ.get("GEAI_API_TOKEN"),
-                        os.environ.get("ORGANIZATION_ID"),
-                        os.environ.get("PROJECT_ID"),
-                        os.environ.get("ASSISTANT_ID", "test_read"),
-                    )
-            except Exception:
-                client = None
-
-            if client is not None and hasattr(client, "send_bytes_and_query"):
-                try:
-                    # attempt a fast in-memory chat referencing the uploaded bytes
-                    try:
-                        t = float(os.environ.get("FAST_CHAT_TIMEOUT", fast_timeout))
-                    except Exception:
-                        t = fast_timeout
-                    try:
-                        fast_resp = await asyncio.wait_for(
-                            client.send_bytes_and_query(
-                                base64.b64decode(payload["file_b64"]),
-                                payload.get("filename") or "file",
-                                payload["prompt"],
-                                folder=payload["folder"],
-                                alias=payload["alias"],
-                                assistant_id=payload["assistant"],
-                                stream=False,
-                            ),
-                            timeout=t,
-                        )
-                    except Exception:
-                        fast_resp = None
-
-                    if fast_resp is not None and not (
-                        isinstance(fast_resp, dict)
-                        and (
-                            fast_resp.get("error") == "document_no_pages"
-                            or str(
-                                fast_resp.get("code")
-                                or fast_resp.get("status_code")
-                                or ""
-                            )
-                            == "8024"
-                        )
-                    ):
-                        # success: mark job result and return immediately
-                        try:
-                            if hasattr(client, "metrics"):
-                                client.metrics["fast_path_hits"] += 1
-                        except Exception:
-                            pass
-                        job_store.set_result(job_id, fast_resp)
-                        return {
-                            "status": "finished",
-                            "job_id": job_id,
-                            "result": fast_resp,
-                        }
-                    else:
-                        try:
-                            if hasattr(client, "metrics"):
-                                client.metrics["fast_path_misses"] += 1
-                        except Exception:
-                            pass
-                except Exception:
-                    # ignore and proceed to enqueue worker
-                    pass
+                await job_dispatcher.enqueue(job_id, payload, blob)
+            except Exception as e:
+                logger.exception("No se pudo encolar el job en RQ")
+                await job_store.aset_error(job_id, "enqueue_failed")
+                return {"error": "enqueue_failed", "detail": str(e)}
+            finally:
+                blob_store.release(payload.get("blob_id"))
+            if fast_timeout > 0:
+                j = await job_store.wait(job_id, fast_timeout) or {}
+                if j.get("status") == "finished":
+                    return {"status": "finished", "job_id": job_id, "result": j["result"]}
+                if j.get("status") == "failed":
+                    return {"status": "failed", "job_id": job_id, "error": j.get("error")}
+            return {"status": "queued", "job_id": job_id}
 
         async def _worker():
+            await job_store.aset_status(job_id, "running")
+            # stage transitions reported by the client go to the job (and its SSE listeners)
+            token = job_stage.set(lambda stage: job_store.report_stage(job_id, stage))
             try:
                 # Prefer shared instance from app.state created at startup; fallback to per-call client
-                client = getattr(request.app.state, "saia_client", None)
-                if client is None:
-                    client = SAIAConsoleClient(
-                        os.environ.get("GEAI_API_TOKEN"),
-                        os.environ.get("ORGANIZATION_ID"),
-                        os.environ.get("PROJECT_ID"),
-                        os.environ.get("ASSISTANT_ID", "test_read"),
-                    )
-                # Prefer in-memory upload when client supports it to avoid disk I/O
-                data = base64.b64decode(payload["file_b64"])
-                # call in-memory path if available
-                if hasattr(client, "send_bytes_and_query"):
-                    res = await client.send_bytes_and_query(
-                        data,
-                        payload.get("filename") or "file",
-                        payload["prompt"],
-                        folder=payload["folder"],
-                        alias=payload["alias"],
-                        assistant_id=payload["assistant"],
-                        stream=False,
-                    )
-                else:
-                    # fallback to temp file on disk
-                    tmp_dir = "/tmp/saia_demo"
-                    os.makedirs(tmp_dir, exist_ok=True)
-                    p = os.path.join(tmp_dir, payload["filename"])
-                    try:
-                        await write_bytes(p, data)
-                    except Exception:
-                        with open(p, "wb") as fw:
-                            fw.write(data)
-                    try:
-                        # record that we had to use disk fallback
-                        try:
-                            if hasattr(client, "metrics"):
-                                client.metrics["fallback_disk_used"] += 1
-                        except Exception:
-                            pass
-                        res = await client.send_pdf_and_query(
-                            p,
-                            payload["prompt"],
-                            folder=payload["folder"],
-                            alias=payload["alias"],
-                            assistant_id=payload["assistant"],
-                        )
-                    finally:
-                        try:
-                            os.remove(p)
-                        except Exception:
-                            pass
-                job_store.set_result(job_id, res)
+                client = _get_saia_client(request)
+                res = await run_job(client, payload)
+                await job_store.aset_result(job_id, res)
+                return res
             except Exception as e:
-                job_store.set_error(job_id, str(e))
+                await job_store.aset_error(job_id, str(e))
+                return None
+            finally:
+                job_stage.reset(token)
+                blob_store.release(payload.get("blob_id"))
 
-        if background_tasks is not None:
-            background_tasks.add_task(_worker)
-        else:
-            import asyncio
+        # bounded worker pool; callers waiting on the fast path go ahead of queued-only jobs
+        try:
+            task = job_scheduler.submit(
+                _worker, client=_client_key(request), priority=0 if fast_timeout > 0 else 1
+            )
+        except QueueFull as e:
+            await job_store.aset_error(job_id, "queue_full")
+            blob_store.release(payload.get("blob_id"))
+            return _queue_full_response(e.retry_after)
 
-            asyncio.create_task(_worker())
+        if fast_timeout and fast_timeout > 0:
+            # Hedged: the job starts now and the request only waits for it up to the
+            # timeout. The wait is shielded, so a slow job is handed over to the
+            # background as-is instead of being cancelled and run again from scratch.
+            metrics = getattr(client, "metrics", None)
+            try:
+                fast_resp = await asyncio.wait_for(asyncio.shield(task), timeout=fast_timeout)
+            except asyncio.TimeoutError:
+                if metrics is not None:
+                    metrics["fast_path_misses"] += 1
+                return {"status": "queued", "job_id": job_id}
+            j = await job_store.aget(job_id) or {}
+            if metrics is not None:
+                metrics["fast_path_hits" if j.get("status") == "finished" else "fast_path_misses"] += 1
+            if j.get("status") == "failed":
+                return {"status": "failed", "job_id": job_id, "error": j.get("error")}
+            return {"status": "finished", "job_id": job_id, "result": fast_resp}
 
         return {"status": "queued", "job_id": job_id}
 
@@ -319,13 +445,117 @@ async def upload_pdf(
             "upload_response": upload_resp,
         }
 
-    finally:
-        # cleanup temp file if exists
-        try:
-            if tmp_path and os.path.exists(tmp_path):
-                os.remove(tmp_path)
-        except Exception:
-            logger.warning(f"No se pudo borrar tmp file: {tmp_path}")
+
+@router.post("/upload_batch")
+async def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    prompt: str = Form(None),
+    folder: str = Form(None),
+    assistant: str = Form(None),
+):
+    """Upload several files concurrently and ask a single question referencing all of them."""
+    started = time.monotonic()
+    max_files = _env_int("BATCH_MAX_FILES", 20)
+    if len(files) > max_files:
+        return {
+            "error": "too_many_files",
+            "detail": f"Máximo {max_files} archivos por lote",
+        }
+    max_bytes = max_upload_bytes()
+    streaming = _env_flag("STREAM_UPLOADS")
+    folder_used = folder or "test1"
+    client = _get_saia_client(request)
+    # bound concurrent POSTs to /v1/files so a batch can't drain the connection pool
+    sem = asyncio.Semaphore(max(_env_int("BATCH_UPLOAD_CONCURRENCY", 4), 1))
+
+    def rejected(entry: dict, error: str, detail: str):
+        entry.update({"status": "rejected", "error": error, "detail": detail})
+        return entry, None
+
+    async def upload_one(f: UploadFile):
+        name = f.filename or "file"
+        entry = {"filename": name, "alias": _unique_alias(name)}
+        _, ext = os.path.splitext(name)
+        if ext.lower() not in ALLOWED_EXTENSIONS:
+            return rejected(entry, "invalid_file_type", f"Extensión no soportada: {ext}")
+        async with sem:
+            t0 = time.monotonic()
+            try:
+                if streaming:
+                    if f.size is not None and f.size > max_bytes:
+                        return rejected(
+                            entry, "file_too_large", f"El archivo excede {max_bytes} bytes"
+                        )
+                    pre = None
+                    if ext.lower() == ".pdf":
+                        pre = await pdf_preflight.check(f.file.fileno())
+                        if not pre.get("ok"):
+                            return rejected(entry, pre.get("error"), pre.get("detail"))
+                    up = await client.upload_chunks(
+                        _iter_upload_file(f),
+                        name,
+                        folder=folder_used,
+                        alias=entry["alias"],
+                        size=f.size,
+                        max_bytes=max_bytes,
+                        sha256=pre.get("sha256") if pre else None,
+                    )
+                else:
+                    data = await f.read()
+                    if len(data) > max_bytes:
+                        return rejected(
+                            entry, "file_too_large", f"El archivo excede {max_bytes} bytes"
+                        )
+                    if ext.lower() == ".pdf":
+                        pre = await pdf_preflight.check(data)
+                        if not pre.get("ok"):
+                            return rejected(entry, pre.get("error"), pre.get("detail"))
+                    up = await client.upload_bytes(
+                        data, name, folder=folder_used, alias=entry["alias"]
+                    )
+            except Exception as e:
+                logger.warning("Batch upload failed for %s: %s", name, e)
+                up = {"error": "upload_failed", "detail": str(e)}
+            entry["upload_seconds"] = round(time.monotonic() - t0, 3)
+        if up.get("error") or up.get("status_code", 0) >= 400:
+            entry.update(
+                {
+                    "status": "failed",
+                    "error": up.get("error") or "upload_failed",
+                    "detail": up.get("detail") or f"SAIA respondió {up.get('status_code')}",
+                }
+            )
+            return entry, None
+        entry.update(
+            {
+                "status": "reused" if up.get("reused") else "uploaded",
+                "alias": up.get("file_alias_used") or entry["alias"],
+                "size": up.get("file_size"),
+            }
+        )
+        return entry, up
+
+    outcomes = await asyncio.gather(*(upload_one(f) for f in files))
+    entries = [e for e, _ in outcomes]
+    ups = [up for _, up in outcomes if up is not None]
+    if not ups:
+        return {
+            "error": "no_files_uploaded",
+            "files": entries,
+            "wall_time": round(time.monotonic() - started, 3),
+        }
+    result = await client.query_uploaded_many(
+        ups,
+        prompt or "",
+        assistant_id=assistant or os.environ.get("ASSISTANT_ID", "test_read"),
+    )
+    return {
+        "status": "finished",
+        "files": entries,
+        "result": result,
+        "wall_time": round(time.monotonic() - started, 3),
+    }
 
 
 @router.post("/upload_stream")
@@ -383,6 +613,17 @@ async def upload_stream(
     return resp
 
 
+def _item_text(item) -> str:
+    """Text of one /stream item: a TextDelta, a dict fragment or the whole non-streaming result."""
+    if isinstance(item, TextDelta):
+        return item.text
+    text = answer_text(item)
+    if text is not None:
+        return text
+    # unknown shape (errors included): forwarded as JSON so nothing is lost
+    return dumps_text(item, default=str)
+
+
 @router.get("/stream/{alias}")
 async def stream_alias(request: Request, alias: str):
     """Stream assistant response for a previously uploaded file alias using SSE."""
@@ -406,173 +647,45 @@ async def stream_alias(request: Request, alias: str):
         except Exception:
             return {"error": "server_misconfigured"}
 
-    async def event_gen() -> AsyncGenerator[bytes, None]:
-        # read minimal prompt referencing the file by alias
-        prompt = f"Lee este archivo y resume: {{file:{alias}}}"
-        ag = None
+    assistant_id = os.environ.get("ASSISTANT_ID", "test_read")
+    # read minimal prompt referencing the file by alias
+    prompt = f"Lee este archivo y resume: {{file:{alias}}}"
+
+    truncated = False
+
+    async def deltas() -> AsyncGenerator[str, None]:
+        nonlocal truncated
+        # hedged: the streaming call starts now; if no fragment arrives within
+        # STREAM_HEDGE_DELAY a non-streaming call races it and the loser is cancelled
+        race = hedged_stream(
+            processor.process_stream(assistant_id, prompt),
+            lambda: processor.process(assistant_id, prompt, stream=False),
+        )
+        chunks = total = 0
         try:
-            # try to use streaming endpoint first, but guard with a short timeout for first fragment
-            try:
-                ag = processor.process_stream(
-                    os.environ.get("ASSISTANT_ID", "test_read"), prompt
-                )
-                first = await asyncio.wait_for(anext(ag), timeout=0.8)
-
-                # helper to split large text into smaller chunks and emit them with tiny pauses
-                async def emit_text_pieces(
-                    text: str, piece_size: int = 120, pause: float = None
-                ):
-                    # pause can be configured via STREAM_PAUSE env (seconds). If not set, default to 0.02
-                    try:
-                        if pause is None:
-                            pause = float(os.environ.get("STREAM_PAUSE", "0.02"))
-                    except Exception:
-                        pause = 0.02
-                    try:
-                        i = 0
-                        L = len(text)
-                        while i < L:
-                            part = text[i:i + piece_size]
-                            i += piece_size
-                            try:
-                                yield f"data: {json.dumps({'text': part}, ensure_ascii=False)}\n\n".encode(
-                                    "utf-8"
-                                )
-                            except Exception as e:
-                                logger.exception(
-                                    "emit_text_pieces: fallo al emitir trozo: %s", e
-                                )
-                                continue
-                            try:
-                                await asyncio.sleep(pause)
-                            except Exception:
-                                pass
-                    except Exception:
-                        return
-
-                # send the first chunk and subsequent chunks, normalizing to {'text': ...}
-                try:
-                    if isinstance(first, dict):
-                        txt = (
-                            first.get("text")
-                            or first.get("message")
-                            or first.get("content")
-                            or json.dumps(first, ensure_ascii=False)
-                        )
-                    else:
-                        txt = str(first)
-                    async for piece in emit_text_pieces(txt):
-                        yield piece
-                except Exception:
-                    pass
-
-                # continue streaming remaining chunks
-                async for chunk in ag:
-                    try:
-                        if isinstance(chunk, dict):
-                            txt = (
-                                chunk.get("text")
-                                or chunk.get("message")
-                                or chunk.get("content")
-                                or json.dumps(chunk, ensure_ascii=False)
-                            )
-                        else:
-                            txt = str(chunk)
-                        async for piece in emit_text_pieces(txt):
-                            yield piece
-                    except Exception:
-                        continue
-
-                # signal completion to client
-                try:
-                    yield f"data: {json.dumps({'done': True}, ensure_ascii=False)}\n\n".encode(
-                        "utf-8"
+            async for _source, item in race:
+                # upstream deltas are forwarded as they arrive; the
+                # non-streaming answer goes out as one frame
+                text = _item_text(item)
+                chunks += 1
+                total += len(text.encode())
+                if chunks > MAX_STREAM_CHUNKS or total > MAX_STREAM_TOTAL_BYTES:
+                    # runaway answer: stop here and close the upstream request
+                    logger.warning(
+                        "Stream %s cortado tras %d fragmentos / %d bytes", alias, chunks, total
                     )
-                except Exception:
-                    pass
-                return
-            except (asyncio.TimeoutError, StopAsyncIteration):
-                # upstream didn't stream quickly; fallback to non-streaming call
-                pass
-
-            # Fallback: call the non-streaming processor and emit the textual result in small chunks
-            try:
-                resp = await processor.process(
-                    os.environ.get("ASSISTANT_ID", "test_read"), prompt, stream=False
-                )
-            except Exception as e:
-                resp = {"error": "processing_failed", "detail": str(e)}
-
-            # Try to extract main text from common fields
-            def extract_text(o):
-                if not o:
-                    return ""
-                if isinstance(o, str):
-                    return o
-                if isinstance(o, dict):
-                    for k in (
-                        "message",
-                        "content",
-                        "text",
-                        "output",
-                        "answer",
-                        "result",
-                    ):
-                        v = o.get(k)
-                        if isinstance(v, str) and v.strip():
-                            return v
-                    # choices shape
-                    ch = o.get("choices")
-                    if isinstance(ch, list) and ch:
-                        first = ch[0]
-                        if isinstance(first, dict):
-                            msg = first.get("message") or first.get("delta") or first
-                            if isinstance(msg, dict):
-                                c = msg.get("content") or msg.get("text")
-                                if isinstance(c, str):
-                                    return c
-                            elif isinstance(msg, str):
-                                return msg
-                if isinstance(o, list):
-                    return "\n".join(
-                        [extract_text(i) for i in o if isinstance(i, (str, dict))]
-                    )
-                return ""
-
-            text = extract_text(resp) or json.dumps(resp, ensure_ascii=False)
-            # split into small chunks (by sentence-ish) to simulate streaming
-            max_chunk = 240
-            i = 0
-            while i < len(text):
-                part = text[i:i + max_chunk]
-                i += max_chunk
-                try:
-                    yield f"data: {json.dumps({'text': part}, ensure_ascii=False)}\n\n".encode(
-                        "utf-8"
-                    )
-                except Exception:
-                    continue
-                # small pause to allow client to render progressively; controlled by STREAM_PAUSE
-                try:
-                    try:
-                        sp = float(os.environ.get("STREAM_PAUSE", "0.02"))
-                    except Exception:
-                        sp = 0.02
-                    if sp and sp > 0:
-                        await asyncio.sleep(sp)
-                    else:
-                        # yield control briefly to event loop
-                        await asyncio.sleep(0)
-                except Exception:
-                    pass
-            # final marker
-            try:
-                yield f"data: {json.dumps({'done': True}, ensure_ascii=False)}\n\n".encode(
-                    "utf-8"
-                )
-            except Exception:
-                pass
+                    truncated = True
+                    return
+                yield text
+        finally:
+            await race.aclose()
 
+    async def event_gen() -> AsyncGenerator[bytes, None]:
+        try:
+            async for frame in coalesced_sse(deltas()):
+                yield frame
+            # signal completion to client
+            yield sse_data({"done": True, "truncated": True} if truncated else {"done": True})
         finally:
             # cleanup temp file after streaming
             try:
@@ -581,4 +694,8 @@ async def stream_alias(request: Request, alias: str):
             except Exception:
                 pass
 
-    return StreamingResponse(event_gen(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,245 @@
+# Server-sent events writer shared by the streaming endpoints
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Tuple,
+)
+
+from app.codec import dumps
+
+logger = logging.getLogger("app.api.streaming")
+
+# end-of-source marker for the pump queue
+_END = object()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def sse_data(obj) -> bytes:
+    return b"data: " + dumps(obj) + b"\n\n"
+
+
+async def coalesced_sse(
+    source: AsyncIterator[str],
+    max_delay: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    heartbeat: Optional[float] = None,
+) -> AsyncGenerator[bytes, None]:
+    """Forward text deltas from ``source`` as ``data: {"text": ...}`` SSE frames.
+
+    A delta that arrives after an idle gap is sent at once; deltas arriving
+    in a burst are merged into one frame until ``max_delay`` seconds
+    (STREAM_COALESCE_MS, 15 ms) have passed or ``max_bytes``
+    (STREAM_COALESCE_BYTES, 1 KB) are buffered. While the source is silent
+    a ``: keep-alive`` comment goes out every ``heartbeat`` seconds
+    (SSE_HEARTBEAT_SECONDS) so proxies such as the Heroku router don't
+    close the connection. The source is closed when the client goes away.
+    """
+    if max_delay is None:
+        max_delay = _env_float("STREAM_COALESCE_MS", 15.0) / 1000.0
+    if max_bytes is None:
+        max_bytes = int(_env_float("STREAM_COALESCE_BYTES", 1024))
+    if heartbeat is None:
+        heartbeat = _env_float("SSE_HEARTBEAT_SECONDS", 15.0)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async for text in source:
+                if text:
+                    queue.put_nowait(text)
+            queue.put_nowait(_END)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+    task = asyncio.create_task(pump())
+    buf: list = []
+    size = 0
+    deadline = 0.0
+    last_sent = 0.0
+    try:
+        while True:
+            timeout = heartbeat if not buf else max(deadline - time.monotonic(), 0.0)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if buf:
+                    yield sse_data({"text": "".join(buf)})
+                    buf, size, last_sent = [], 0, time.monotonic()
+                else:
+                    yield b": keep-alive\n\n"
+                continue
+            if item is _END or isinstance(item, Exception):
+                if buf:
+                    yield sse_data({"text": "".join(buf)})
+                if isinstance(item, Exception):
+                    raise item
+                return
+            now = time.monotonic()
+            if not buf and now - last_sent >= max_delay:
+                # first delta after a pause: no reason to hold it back
+                yield sse_data({"text": item})
+                last_sent = now
+                continue
+            if not buf:
+                deadline = now + max_delay
+            buf.append(item)
+            # UTF-8 bytes, not characters: accented text is up to 2-4 bytes per char
+            size += len(item.encode())
+            if size >= max_bytes:
+                yield sse_data({"text": "".join(buf)})
+                buf, size, last_sent = [], 0, time.monotonic()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+
+
+class RaceStats:
+    """Contadores de la carrera streaming / no-streaming de /stream: quién gana y con qué TTFB."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, int] = {
+            "stream_wins": 0,
+            "fallback_wins": 0,
+            "hedges_started": 0,
+            "both_failed": 0,
+        }
+        self._ttfb: Dict[str, Deque[float]] = {
+            "stream": deque(maxlen=500),
+            "fallback": deque(maxlen=500),
+        }
+
+    def record(self, winner: Optional[str], ttfb: float) -> None:
+        if winner is None:
+            self.metrics["both_failed"] += 1
+            return
+        self.metrics[f"{winner}_wins"] += 1
+        self._ttfb[winner].append(ttfb)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.metrics)
+        for name, values in self._ttfb.items():
+            vals = sorted(values)
+            out[f"{name}_ttfb_p50"] = round(vals[len(vals) // 2], 4) if vals else None
+            out[f"{name}_ttfb_p95"] = (
+                round(vals[min(int(0.95 * len(vals)), len(vals) - 1)], 4) if vals else None
+            )
+        return out
+
+
+stream_race = RaceStats()
+
+
+def _useful(item: Any) -> bool:
+    return item is not None and not (isinstance(item, dict) and item.get("error"))
+
+
+async def hedged_stream(
+    stream: AsyncGenerator[Any, None],
+    fallback: Callable[[], Awaitable[Any]],
+    hedge_delay: Optional[float] = None,
+    useful: Callable[[Any], bool] = _useful,
+    stats: RaceStats = stream_race,
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """Race a streaming call against a non-streaming one and keep whichever answers first.
+
+    Yields ``("stream", chunk)`` items, or a single ``("fallback", response)``.
+    The fallback starts ``hedge_delay`` seconds (STREAM_HEDGE_DELAY, 0.8)
+    after the stream if no fragment has arrived, or right away if the stream
+    fails. Once one side produces useful output the other is cancelled and
+    the streaming generator is closed, so its upstream request and pooled
+    connection are released instead of running on unobserved. If both fail,
+    the last error is yielded as the fallback response.
+    """
+    if hedge_delay is None:
+        hedge_delay = _env_float("STREAM_HEDGE_DELAY", 0.8)
+
+    async def next_chunk():
+        return await anext(stream)
+
+    t0 = time.monotonic()
+    first = asyncio.create_task(next_chunk())
+    fb: Optional[asyncio.Task] = None
+    pending = {first}
+    winner: Optional[str] = None
+    item: Any = None
+    last_error: Any = None
+
+    def start_fallback() -> None:
+        nonlocal fb
+        fb = asyncio.create_task(fallback())
+        pending.add(fb)
+        stats.metrics["hedges_started"] += 1
+
+    try:
+        while pending and winner is None:
+            timeout = None if fb is not None else max(hedge_delay - (time.monotonic() - t0), 0.0)
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                start_fallback()
+                continue
+            for t in done:
+                pending.discard(t)
+                try:
+                    res = t.result()
+                except StopAsyncIteration:
+                    res = None
+                except Exception as e:
+                    res = {"error": "processing_failed", "detail": str(e)}
+                if useful(res):
+                    winner, item = ("stream" if t is first else "fallback"), res
+                    break
+                last_error = res if res is not None else last_error
+                if t is first and fb is None:
+                    # the stream ended or failed before the hedge: no point waiting
+                    start_fallback()
+        stats.record(winner, time.monotonic() - t0)
+    finally:
+        # cancel the loser (or everything, if the client went away)
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if winner != "stream":
+            await stream.aclose()
+
+    if winner is None:
+        yield "fallback", last_error
+        return
+    try:
+        yield winner, item
+        if winner == "stream":
+            async for chunk in stream:
+                yield "stream", chunk
+    finally:
+        # also when the consumer stops early (client disconnect)
+        await stream.aclose()
@@ -1,25 +1,253 @@
+import abc
+import asyncio
+import logging
+import os
+import sqlite3
 import threading
 import time
 import uuid
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from app.codec import dumps, loads
+from app.services.ai.cache import approx_size
+from app.services.sqlite_store import SQLiteStore
 
-class JobStore:
-    def __init__(self) -> None:
+logger = logging.getLogger("app.background")
+
+TERMINAL_STATUSES = ("finished", "failed")
+DEFAULT_JOB_STORE_PATH = "/tmp/saia_demo/jobs.sqlite3"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+class JobStore(abc.ABC):
+    """Interfaz común de los almacenes de estado de jobs.
+
+    The payload is dropped as soon as a job finishes or fails. Finished and
+    failed jobs expire ``ttl`` seconds after their last update; when the
+    count or byte budget is exceeded the oldest finished jobs are evicted
+    first. Queued and running jobs are never evicted, but one still
+    unfinished ``max_age`` seconds after its creation (its worker died, the
+    dyno restarted) is marked failed with ``job_abandoned`` by sweep() and
+    then expires like any other failed job.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.ttl = ttl if ttl is not None else _env_float("JOB_TTL", 3600.0)
+        self.max_age = max_age if max_age is not None else _env_float("JOB_MAX_AGE", 3600.0)
+        self.max_jobs = max_jobs or int(_env_float("JOB_STORE_MAX_JOBS", 10_000))
+        self.max_bytes = max_bytes or int(_env_float("JOB_STORE_MAX_BYTES", 50 * 1024 * 1024))
+        self.metrics: Dict[str, int] = {"expired": 0, "evicted": 0, "abandoned": 0}
+        # job id -> queues of async waiters (long-poll / SSE) in this process
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._sub_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def create(self, payload: Optional[Dict[str, Any]] = None) -> str:
+        ...
+
+    @abc.abstractmethod
+    def set_status(self, job_id: str, status: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def set_stage(self, job_id: str, stage: str) -> None:
+        """Record progress inside a running job (uploading, ingesting, chatting)."""
+
+    @abc.abstractmethod
+    def _finish(self, job_id: str, status: str, field: str, value: Any) -> None:
+        ...
+
+    def set_result(self, job_id: str, result: Any) -> None:
+        self._finish(job_id, "finished", "result", result)
+
+    def set_error(self, job_id: str, error: str) -> None:
+        self._finish(job_id, "failed", "error", error)
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """get() for callers on the event loop; backends doing blocking I/O run it in a thread."""
+        return self.get(job_id)
+
+    # writes from the event loop, same idea as aget
+    async def acreate(self, payload: Optional[Dict[str, Any]] = None) -> str:
+        return self.create(payload)
+
+    async def aset_status(self, job_id: str, status: str) -> None:
+        self.set_status(job_id, status)
+
+    async def aset_result(self, job_id: str, result: Any) -> None:
+        self.set_result(job_id, result)
+
+    async def aset_error(self, job_id: str, error: str) -> None:
+        self.set_error(job_id, error)
+
+    def report_stage(self, job_id: str, stage: str) -> None:
+        """set_stage() for synchronous callbacks on the event loop; may return before the write."""
+        self.set_stage(job_id, stage)
+
+    @abc.abstractmethod
+    def sweep(self) -> int:
+        """Fail jobs unfinished after ``max_age``, remove finished/failed jobs older than the TTL.
+
+        Returns how many jobs were removed or failed.
+        """
+
+    @abc.abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def _notify(self, job_id: str) -> None:
+        # safe from any thread: wake-ups are scheduled on each waiter's own loop
+        with self._sub_lock:
+            subs = list(self._subscribers.get(job_id, ()))
+        for loop, q in subs:
+            try:
+                loop.call_soon_threadsafe(q.put_nowait, None)
+            except RuntimeError:
+                pass  # waiter's loop already closed
+
+    async def events(
+        self, job_id: str, heartbeat: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the job each time its status or stage changes, ending after it finishes or fails.
+
+        Changes made in this process wake the iterator immediately; the store is also
+        re-read every JOB_EVENTS_POLL seconds to see changes made by other workers.
+        With ``heartbeat``, None is yielded after that many idle seconds.
+        """
+        q: asyncio.Queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), q)
+        with self._sub_lock:
+            self._subscribers.setdefault(job_id, []).append(entry)
+        poll = _env_float("JOB_EVENTS_POLL", 1.0)
+        try:
+            last = None
+            idle = 0.0
+            while True:
+                j = await self.aget(job_id)
+                if j is None:
+                    return
+                snap = (j["status"], j.get("stage"))
+                if snap != last:
+                    last, idle = snap, 0.0
+                    yield j
+                    if j["status"] in TERMINAL_STATUSES:
+                        return
+                elif heartbeat is not None and idle >= heartbeat:
+                    idle = 0.0
+                    yield None
+                wait = poll if heartbeat is None else min(poll, heartbeat)
+                t0 = time.monotonic()
+                try:
+                    await asyncio.wait_for(q.get(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                idle += time.monotonic() - t0
+        finally:
+            with self._sub_lock:
+                subs = self._subscribers.get(job_id, [])
+                if entry in subs:
+                    subs.remove(entry)
+                if not subs:
+                    self._subscribers.pop(job_id, None)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once it finishes or fails, or as it is after ``timeout``."""
+        j = await self.aget(job_id)
+        if j is None or j["status"] in TERMINAL_STATUSES or timeout <= 0:
+            return j
+
+        async def until_done() -> None:
+            async for snap in self.events(job_id):
+                if snap is not None and snap["status"] in TERMINAL_STATUSES:
+                    return
+
+        try:
+            await asyncio.wait_for(until_done(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self.aget(job_id)
+
+    async def run_sweeper(self, interval: Optional[float] = None) -> None:
+        """Background loop calling sweep() every ``interval`` seconds (JOB_SWEEP_INTERVAL)."""
+        interval = interval or _env_float("JOB_SWEEP_INTERVAL", 60.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                n = await asyncio.to_thread(self.sweep)
+                if n:
+                    logger.debug("JobStore: %d jobs expirados eliminados", n)
+            except Exception as e:
+                logger.warning("JobStore sweep falló: %s", e)
+
+
+class MemoryJobStore(JobStore):
+    """Jobs en un dict del proceso: rápido, pero visible solo para el worker que creó el job."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        super().__init__(ttl, max_jobs, max_bytes, max_age)
         self._lock = threading.Lock()
-        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # insertion order == creation order, so the oldest jobs come first
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+
+    def _resize(self, job_id: str) -> None:
+        j = self._jobs[job_id]
+        size = approx_size(j["payload"]) + approx_size(j["result"]) + approx_size(j["error"])
+        self._bytes += size - self._sizes.get(job_id, 0)
+        self._sizes[job_id] = size
+
+    def _drop(self, job_id: str) -> None:
+        self._jobs.pop(job_id, None)
+        self._bytes -= self._sizes.pop(job_id, 0)
+
+    def _enforce_caps(self) -> None:
+        if len(self._jobs) <= self.max_jobs and self._bytes <= self.max_bytes:
+            return
+        for job_id in [k for k, j in self._jobs.items() if j["status"] in TERMINAL_STATUSES]:
+            if len(self._jobs) <= self.max_jobs and self._bytes <= self.max_bytes:
+                break
+            self._drop(job_id)
+            self.metrics["evicted"] += 1
 
     def create(self, payload: Optional[Dict[str, Any]] = None) -> str:
         job_id = uuid.uuid4().hex
         with self._lock:
             self._jobs[job_id] = {
                 "status": "queued",
+                "stage": "queued",
                 "created_at": time.time(),
                 "updated_at": time.time(),
                 "result": None,
                 "error": None,
                 "payload": payload or {},
             }
+            self._resize(job_id)
+            self._enforce_caps()
         return job_id
 
     def set_status(self, job_id: str, status: str) -> None:
@@ -27,27 +255,310 @@ class JobStore:
             if job_id in self._jobs:
                 self._jobs[job_id]["status"] = status
                 self._jobs[job_id]["updated_at"] = time.time()
+        self._notify(job_id)
 
-    def set_result(self, job_id: str, result: Any) -> None:
+    def set_stage(self, job_id: str, stage: str) -> None:
         with self._lock:
             if job_id in self._jobs:
-                self._jobs[job_id]["result"] = result
-                self._jobs[job_id]["status"] = "finished"
+                self._jobs[job_id]["stage"] = stage
                 self._jobs[job_id]["updated_at"] = time.time()
+        self._notify(job_id)
 
-    def set_error(self, job_id: str, error: str) -> None:
+    def _finish(self, job_id: str, status: str, field: str, value: Any) -> None:
         with self._lock:
             if job_id in self._jobs:
-                self._jobs[job_id]["error"] = error
-                self._jobs[job_id]["status"] = "failed"
-                self._jobs[job_id]["updated_at"] = time.time()
+                j = self._jobs[job_id]
+                j[field] = value
+                j["status"] = j["stage"] = status
+                j["updated_at"] = time.time()
+                # the payload (file reference, inline text...) is no longer needed
+                j["payload"] = {}
+                self._resize(job_id)
+                self._enforce_caps()
+        self._notify(job_id)
 
     def get(self, job_id: str) -> Optional[Dict[str, Any]]:
         with self._lock:
-            return self._jobs.get(job_id)
+            j = self._jobs.get(job_id)
+            if (
+                j is not None
+                and j["status"] in TERMINAL_STATUSES
+                and j["updated_at"] < time.time() - self.ttl
+            ):
+                self._drop(job_id)
+                self.metrics["expired"] += 1
+                return None
+            return j
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            abandoned = [
+                k
+                for k, j in self._jobs.items()
+                if j["status"] not in TERMINAL_STATUSES and j["created_at"] < now - self.max_age
+            ]
+            expired = [
+                k
+                for k, j in self._jobs.items()
+                if j["status"] in TERMINAL_STATUSES and j["updated_at"] < now - self.ttl
+            ]
+            for job_id in expired:
+                self._drop(job_id)
+            self.metrics["expired"] += len(expired)
+        for job_id in abandoned:
+            self._finish(job_id, "failed", "error", "job_abandoned")
+        self.metrics["abandoned"] += len(abandoned)
+        return len(expired) + len(abandoned)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for j in self._jobs.values():
+                by_status[j["status"]] = by_status.get(j["status"], 0) + 1
+            return {
+                "jobs": len(self._jobs),
+                "bytes": self._bytes,
+                "by_status": by_status,
+                "max_jobs": self.max_jobs,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "backend": "memory",
+                **self.metrics,
+            }
+
+
+class SQLiteJobStore(SQLiteStore, JobStore):
+    """Jobs en SQLite (WAL) compartido por todos los workers de la máquina.
+
+    Lets gunicorn run several workers: a status request can land on any of
+    them. The payload stays in the process that runs the job (it holds blob
+    keys and other process-local references) and is dropped when it finishes.
+    Reads from the event loop (``aget``, long-poll, SSE) run in a thread;
+    writes from the loop (``acreate``, ``aset_*``, ``report_stage``) go
+    through one writer thread, so a job's updates land in order. Stage
+    updates give up after JOB_STAGE_WRITE_TIMEOUT seconds (0.05) of lock
+    contention instead of the 5 s busy timeout: a stage is only progress
+    information and the next one overwrites it. Triggers keep the job count
+    and byte total in ``job_totals``, so enforcing the caps reads one row.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        stage TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        result TEXT,
+        error TEXT,
+        size INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status_updated ON jobs (status, updated_at);
+    CREATE TABLE IF NOT EXISTS job_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        jobs INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO job_totals (id, jobs, bytes)
+        SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM jobs;
+    CREATE TRIGGER IF NOT EXISTS jobs_totals_insert AFTER INSERT ON jobs BEGIN
+        UPDATE job_totals SET jobs = jobs + 1, bytes = bytes + NEW.size WHERE id = 0;
+    END;
+    CREATE TRIGGER IF NOT EXISTS jobs_totals_delete AFTER DELETE ON jobs BEGIN
+        UPDATE job_totals SET jobs = jobs - 1, bytes = bytes - OLD.size WHERE id = 0;
+    END;
+    CREATE TRIGGER IF NOT EXISTS jobs_totals_size AFTER UPDATE OF size ON jobs BEGIN
+        UPDATE job_totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0;
+    END;
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        SQLiteStore.__init__(
+            self, path or os.environ.get("JOB_STORE_PATH") or DEFAULT_JOB_STORE_PATH
+        )
+        JobStore.__init__(self, ttl, max_jobs, max_bytes, max_age)
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self.stage_timeout = _env_float("JOB_STAGE_WRITE_TIMEOUT", 0.05)
+        self.metrics["stage_writes_skipped"] = 0
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # not the connection lock: a statement waiting out a busy database holds that one
+        self._writer_lock = threading.Lock()
+
+    def _writer_pool(self) -> ThreadPoolExecutor:
+        # created on first use, i.e. after gunicorn has forked the worker
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+            return self._writer
+
+    async def _write(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer_pool(), fn, *args)
+
+    async def acreate(self, payload: Optional[Dict[str, Any]] = None) -> str:
+        return await self._write(self.create, payload)
+
+    async def aset_status(self, job_id: str, status: str) -> None:
+        await self._write(self.set_status, job_id, status)
+
+    async def aset_result(self, job_id: str, result: Any) -> None:
+        await self._write(self.set_result, job_id, result)
+
+    async def aset_error(self, job_id: str, error: str) -> None:
+        await self._write(self.set_error, job_id, error)
+
+    def report_stage(self, job_id: str, stage: str) -> None:
+        self._writer_pool().submit(self.set_stage, job_id, stage)
+
+    def create(self, payload: Optional[Dict[str, Any]] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.execute(
+            "INSERT INTO jobs (id, status, stage, created_at, updated_at) "
+            "VALUES (?, 'queued', 'queued', ?, ?)",
+            (job_id, now, now),
+        )
+        self._payloads[job_id] = payload or {}
+        return job_id
+
+    def set_status(self, job_id: str, status: str) -> None:
+        self.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+            (status, time.time(), job_id),
+        )
+        self._notify(job_id)
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        try:
+            self.execute(
+                "UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?",
+                (stage, time.time(), job_id),
+                timeout=self.stage_timeout,
+            )
+        except sqlite3.OperationalError as e:
+            # database locked by another process: skip this stage rather than block the loop
+            self.metrics["stage_writes_skipped"] += 1
+            logger.debug("Etapa %s del job %s no guardada: %s", stage, job_id, e)
+        self._notify(job_id)
+
+    def _finish(self, job_id: str, status: str, field: str, value: Any) -> None:
+        self._payloads.pop(job_id, None)
+        try:
+            body = dumps(value, default=str)
+        except (TypeError, ValueError):
+            body = dumps(str(value))
+        self.execute(
+            f"UPDATE jobs SET status = ?, stage = ?, {field} = ?, size = ?, updated_at = ? "
+            "WHERE id = ?",
+            (status, status, body, len(body), time.time(), job_id),
+        )
+        self._enforce_caps()
+        self._notify(job_id)
+
+    def _enforce_caps(self) -> None:
+        count, total = self.execute("SELECT jobs, bytes FROM job_totals WHERE id = 0")[0]
+        if count <= self.max_jobs and total <= self.max_bytes:
+            return
+        excess_jobs = count - self.max_jobs
+        excess_bytes = total - self.max_bytes
+        for job_id, size in self.execute(
+            "SELECT id, size FROM jobs WHERE status IN ('finished', 'failed') "
+            "ORDER BY updated_at ASC"
+        ):
+            if excess_jobs <= 0 and excess_bytes <= 0:
+                break
+            self.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.metrics["evicted"] += 1
+            excess_jobs -= 1
+            excess_bytes -= size
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.execute(
+            "SELECT status, stage, created_at, updated_at, result, error FROM jobs WHERE id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        status, stage, created_at, updated_at, result, error = rows[0]
+        if status in TERMINAL_STATUSES and updated_at < time.time() - self.ttl:
+            self.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.metrics["expired"] += 1
+            return None
+        return {
+            "status": status,
+            "stage": stage,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "result": loads(result) if result is not None else None,
+            "error": loads(error) if error is not None else None,
+            "payload": self._payloads.get(job_id, {}),
+        }
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    def sweep(self) -> int:
+        now = time.time()
+        abandoned = [
+            row[0]
+            for row in self.execute(
+                "SELECT id FROM jobs WHERE status NOT IN ('finished', 'failed') AND created_at < ?",
+                (now - self.max_age,),
+            )
+        ]
+        for job_id in abandoned:
+            self._finish(job_id, "failed", "error", "job_abandoned")
+        self.metrics["abandoned"] += len(abandoned)
+        cutoff = now - self.ttl
+        n = self.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('finished', 'failed') AND updated_at < ?",
+            (cutoff,),
+        )[0][0]
+        if n:
+            self.execute(
+                "DELETE FROM jobs WHERE status IN ('finished', 'failed') AND updated_at < ?",
+                (cutoff,),
+            )
+            self.metrics["expired"] += n
+        return n + len(abandoned)
+
+    def stats(self) -> Dict[str, Any]:
+        by_status = dict(self.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        total = self.execute("SELECT bytes FROM job_totals WHERE id = 0")[0][0]
+        return {
+            "jobs": sum(by_status.values()),
+            "bytes": total,
+            "by_status": by_status,
+            "max_jobs": self.max_jobs,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "backend": "sqlite",
+            "path": self.path,
+            **self.metrics,
+        }
+
+
+def job_store_from_env() -> JobStore:
+    """JOB_STORE=sqlite shares job state between workers; anything else keeps it in memory."""
+    backend = os.environ.get("JOB_STORE", "memory").strip().lower()
+    if backend == "sqlite":
+        try:
+            store = SQLiteJobStore()
+            store.stats()  # open the database now so misconfiguration shows at startup
+            return store
+        except Exception as e:
+            logger.warning("No se pudo abrir el JobStore SQLite (%s); se usará memoria", e)
+    return MemoryJobStore()
 
 
-job_store = JobStore()
+job_store = job_store_from_env()
 
 
 async def run_async(coro):
@@ -0,0 +1,264 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import AsyncGenerator, BinaryIO, Dict, Optional
+
+logger = logging.getLogger("app.blobs")
+
+# Blobs bigger than this are written to a temp file instead of staying in memory
+DEFAULT_SPILL_BYTES = 1024 * 1024  # 1 MB
+DEFAULT_BLOB_DIR = "/tmp/saia_demo/blobs"
+
+
+class Blob:
+    """Bytes de un archivo subido, guardados una sola vez (en memoria o en disco).
+
+    Jobs only carry ``blob.key``; readers get a memoryview, a file object or
+    chunks without copying the whole buffer.
+    """
+
+    __slots__ = ("key", "size", "sha256", "path", "_data")
+
+    def __init__(
+        self,
+        key: str,
+        size: int,
+        sha256: str,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None,
+    ) -> None:
+        self.key = key
+        self.size = size
+        self.sha256 = sha256
+        self.path = path
+        self._data = data
+
+    @property
+    def in_memory(self) -> bool:
+        return self._data is not None
+
+    def view(self) -> memoryview:
+        """Zero-copy view for in-memory blobs; spilled blobs are read from disk."""
+        if self._data is not None:
+            return memoryview(self._data)
+        with open(self.path, "rb") as fh:
+            return memoryview(fh.read())
+
+    def open(self) -> BinaryIO:
+        """File object over the blob (BytesIO shares the bytes buffer until written)."""
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self.path, "rb")
+
+    async def iter_chunks(
+        self, chunk_size: int = 64 * 1024
+    ) -> AsyncGenerator[bytes, None]:
+        if self._data is not None:
+            mv = memoryview(self._data)
+            for i in range(0, self.size, chunk_size):
+                yield mv[i:i + chunk_size]
+            return
+        # small sequential reads from the page cache; not worth a thread hop per chunk
+        with open(self.path, "rb") as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class BlobStore:
+    """Almacén de blobs por proceso referenciados por clave desde los jobs."""
+
+    def __init__(
+        self,
+        spill_bytes: Optional[int] = None,
+        blob_dir: Optional[str] = None,
+    ) -> None:
+        if spill_bytes is None:
+            try:
+                spill_bytes = int(os.environ.get("BLOB_SPILL_BYTES", DEFAULT_SPILL_BYTES))
+            except Exception:
+                spill_bytes = DEFAULT_SPILL_BYTES
+        self.spill_bytes = spill_bytes
+        self.blob_dir = blob_dir or os.environ.get("BLOB_DIR", DEFAULT_BLOB_DIR)
+        self._lock = threading.Lock()
+        self._blobs: Dict[str, Blob] = {}
+
+    def put(self, data: bytes, sha256: Optional[str] = None) -> Blob:
+        """Store ``data`` without copying it; spill to a temp file above the threshold."""
+        key = uuid.uuid4().hex
+        size = len(data)
+        digest = sha256 or hashlib.sha256(data).hexdigest()
+        if size > self.spill_bytes:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            path = os.path.join(self.blob_dir, key)
+            with open(path, "wb") as fh:
+                fh.write(data)
+            blob = Blob(key, size, digest, path=path)
+        else:
+            # keep a reference to the caller's bytes object; only other buffers are copied
+            blob = Blob(
+                key, size, digest, data=data if isinstance(data, bytes) else bytes(data)
+            )
+        with self._lock:
+            self._blobs[key] = blob
+        return blob
+
+    def get(self, key: Optional[str]) -> Optional[Blob]:
+        if not key:
+            return None
+        with self._lock:
+            return self._blobs.get(key)
+
+    def release(self, key: Optional[str]) -> None:
+        """Drop the blob and delete its temp file, if any."""
+        if not key:
+            return
+        with self._lock:
+            blob = self._blobs.pop(key, None)
+        if blob is not None and blob.path:
+            try:
+                os.remove(blob.path)
+            except Exception:
+                logger.debug("No se pudo borrar blob en disco: %s", blob.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            blobs = list(self._blobs.values())
+        return {
+            "count": len(blobs),
+            "bytes_in_memory": sum(b.size for b in blobs if b.in_memory),
+            "bytes_on_disk": sum(b.size for b in blobs if not b.in_memory),
+        }
+
+
+blob_store = BlobStore()
+
+
+DEFAULT_SHARED_BLOB_DIR = "/tmp/saia_demo/shared_blobs"
+
+
+class SharedBlobStore:
+    """Blobs direccionados por sha256, compartidos entre el proceso web y los workers RQ.
+
+    Jobs carry a reference such as ``file:<sha256>`` or ``redis:<sha256>``
+    instead of the file bytes. The same content is written only once; the
+    ``file`` backend needs web and worker on the same machine (shared
+    directory), the ``redis`` backend stores the raw bytes under a key with a
+    TTL. With a Redis connection the default is ``redis``, since the worker
+    usually runs on another dyno. Files older than ``ttl`` are swept from the
+    directory on later writes.
+    """
+
+    def __init__(
+        self,
+        blob_dir: Optional[str] = None,
+        redis_conn=None,
+        backend: Optional[str] = None,
+        ttl: Optional[int] = None,
+    ) -> None:
+        self.blob_dir = blob_dir or os.environ.get("SHARED_BLOB_DIR") or DEFAULT_SHARED_BLOB_DIR
+        self.redis = redis_conn
+        default = "redis" if redis_conn is not None else "file"
+        backend = (backend or os.environ.get("SHARED_BLOB_BACKEND") or default).strip().lower()
+        if backend == "redis" and redis_conn is None:
+            logger.warning("SHARED_BLOB_BACKEND=redis sin conexión a Redis; se usa el directorio local")
+            backend = "file"
+        self.backend = backend if backend in ("file", "redis") else "file"
+        if ttl is None:
+            try:
+                ttl = int(os.environ.get("SHARED_BLOB_TTL", 3600))
+            except Exception:
+                ttl = 3600
+        self.ttl = ttl
+        self._last_sweep = 0.0
+        self.metrics: Dict[str, int] = {"writes": 0, "dedup_hits": 0, "reads": 0, "swept": 0}
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def _redis_key(self, sha256: str) -> str:
+        return f"blob:{sha256}"
+
+    def put(self, data, sha256: Optional[str] = None) -> str:
+        """Store ``data`` once under its sha256 and return the reference for the job payload."""
+        digest = sha256 or hashlib.sha256(data).hexdigest()
+        if self.backend == "redis":
+            key = self._redis_key(digest)
+            # NX: identical content already stored, only its TTL is refreshed
+            if self.redis.set(key, bytes(data), ex=self.ttl, nx=True):
+                self.metrics["writes"] += 1
+            else:
+                self.redis.expire(key, self.ttl)
+                self.metrics["dedup_hits"] += 1
+            return f"redis:{digest}"
+        path = self._path(digest)
+        if os.path.exists(path):
+            # keep it from being swept while this job needs it
+            os.utime(path)
+            self.metrics["dedup_hits"] += 1
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            # atomic: a concurrent reader sees the whole file or none
+            os.replace(tmp, path)
+            self.metrics["writes"] += 1
+        self._maybe_sweep()
+        return f"file:{digest}"
+
+    def get(self, ref: Optional[str]) -> Optional[Blob]:
+        """Blob for a reference made by ``put`` (file-backed, or bytes read from Redis)."""
+        if not ref or ":" not in ref:
+            return None
+        kind, digest = ref.split(":", 1)
+        if kind == "redis":
+            if self.redis is None:
+                return None
+            data = self.redis.get(self._redis_key(digest))
+            if data is None:
+                return None
+            self.metrics["reads"] += 1
+            return Blob(digest, len(data), digest, data=data)
+        path = self._path(digest)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        self.metrics["reads"] += 1
+        return Blob(digest, size, digest, path=path)
+
+    def sweep(self) -> int:
+        """Delete shared files not written or reused for ``ttl`` seconds."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for root, _dirs, files in os.walk(self.blob_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        self.metrics["swept"] += removed
+        return removed
+
+    def _maybe_sweep(self) -> None:
+        now = time.monotonic()
+        if now - self._last_sweep < max(self.ttl / 10, 1):
+            return
+        self._last_sweep = now
+        try:
+            self.sweep()
+        except Exception as e:
+            logger.debug("No se pudo limpiar el directorio de blobs compartidos: %s", e)
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.backend, **self.metrics}
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger("app.codec")
+
+# Optional fast JSON backends; the stdlib json module is always there as fallback
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgspec
+except Exception:
+    msgspec = None
+
+# built once: json.dumps with non-default options makes a new encoder per call
+_std_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_std_decoder = json.JSONDecoder()
+
+
+def available_backends():
+    return [
+        name
+        for name, mod in (("orjson", orjson), ("msgspec", msgspec), ("json", json))
+        if mod is not None
+    ]
+
+
+class JSONCodec:
+    """Serialización JSON para los caminos calientes (SSE, websocket, payloads de SAIA).
+
+    ``dumps`` returns UTF-8 bytes (non-ASCII kept as is, compact separators),
+    ready to go into an SSE frame or request body without another encode.
+    With ``backend`` None the first installed of orjson, msgspec and json is
+    used (JSON_CODEC forces one). Values a fast backend can't encode
+    (integers beyond 64 bits, non-string keys...) fall back to stdlib json.
+    """
+
+    def __init__(self, backend: Optional[str] = None) -> None:
+        available = available_backends()
+        if backend is None:
+            backend = os.environ.get("JSON_CODEC", "auto").strip().lower()
+        if backend not in available:
+            if backend not in ("", "auto"):
+                logger.warning("Codec JSON %s no disponible; se usa %s", backend, available[0])
+            backend = available[0]
+        self.backend = backend
+        if backend == "orjson":
+            self._dumps = self._orjson_dumps
+            self._loads = orjson.loads
+        elif backend == "msgspec":
+            self._encoder = msgspec.json.Encoder()
+            self._dumps = self._msgspec_dumps
+            self._loads = msgspec.json.decode
+        else:
+            self._dumps = self._std_dumps
+            self._loads = self._std_loads
+
+    @staticmethod
+    def _std_text(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+        if default is None:
+            return _std_encoder.encode(obj)
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default)
+
+    @classmethod
+    def _std_dumps(cls, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        return cls._std_text(obj, default).encode("utf-8")
+
+    @staticmethod
+    def _std_loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        if not isinstance(data, str):
+            # decoding up front skips json's encoding sniffing of bytes input
+            data = bytes(data).decode("utf-8")
+        return _std_decoder.decode(data)
+
+    @staticmethod
+    def _orjson_dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        return orjson.dumps(obj, default=default)
+
+    def _msgspec_dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        if default is not None:
+            return msgspec.json.encode(obj, enc_hook=default)
+        return self._encoder.encode(obj)
+
+    def dumps(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+        try:
+            return self._dumps(obj, default)
+        except (TypeError, ValueError, OverflowError):
+            if self.backend == "json":
+                raise
+            return self._std_dumps(obj, default)
+
+    def dumps_text(self, obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+        """Same as dumps, as str (websocket text frames, log lines)."""
+        if self.backend == "json":
+            return self._std_text(obj, default)
+        return self.dumps(obj, default).decode("utf-8")
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parse JSON from bytes or str; raises ValueError on invalid input."""
+        try:
+            return self._loads(data)
+        except ValueError:
+            raise
+        except Exception as e:
+            # msgspec.DecodeError is a ValueError subclass; anything else is normalised
+            raise ValueError(str(e)) from e
+
+
+codec = JSONCodec()
+dumps = codec.dumps
+dumps_text = codec.dumps_text
+loads = codec.loads
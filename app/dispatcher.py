@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional, Set
+
+from app.background import TERMINAL_STATUSES, JobStore, job_store
+from app.blobs import Blob
+from app.tasks import process_upload, q as rq_queue, shared_blobs
+
+logger = logging.getLogger("app.dispatcher")
+
+# RQ job states -> JobStore states
+_RQ_STATUS = {
+    "queued": "queued",
+    "deferred": "queued",
+    "scheduled": "queued",
+    "started": "running",
+    "finished": "finished",
+    "failed": "failed",
+    "stopped": "failed",
+    "canceled": "failed",
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def rq_snapshot(rq_job) -> Dict[str, Any]:
+    """JobStore-shaped view (status, stage, result, error) of an RQ job."""
+    status = getattr(rq_job.get_status(), "value", None) or str(rq_job.get_status())
+    status = _RQ_STATUS.get(status, "queued")
+    meta = rq_job.meta or {}
+    snap: Dict[str, Any] = {
+        "status": status,
+        "stage": status if status in TERMINAL_STATUSES else meta.get("stage", status),
+        "result": None,
+        "error": None,
+    }
+    if status == "finished":
+        # return_value() on newer RQ; .result on older releases
+        getter = getattr(rq_job, "return_value", None)
+        snap["result"] = getter() if callable(getter) else rq_job.result
+    elif status == "failed":
+        latest = getattr(rq_job, "latest_result", None)
+        res = latest() if callable(latest) else None
+        exc = getattr(res, "exc_string", None) or getattr(rq_job, "exc_info", None) or ""
+        # last line of the traceback ("RuntimeError: ...") is enough for the client
+        snap["error"] = (exc.strip().splitlines() or ["rq_job_failed"])[-1]
+    return snap
+
+
+class JobDispatcher:
+    """Envía los jobs a la cola RQ si hay REDIS_URL; si no, se ejecutan en el proceso web.
+
+    In queue mode the web process keeps the job in its JobStore and a single
+    watcher task mirrors the RQ state (status, stage from ``job.meta``, result
+    or error) into it, so /status/{job_id}, long-polls and SSE work the same
+    in both modes. Jobs enqueued by another web process are read straight
+    from Redis by ``lookup``.
+    """
+
+    def __init__(
+        self,
+        queue=None,
+        store: Optional[JobStore] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        self.queue = queue
+        self.store = store or job_store
+        self.poll_interval = poll_interval or _env_float("RQ_POLL_INTERVAL", 0.5)
+        self.job_timeout = int(_env_float("RQ_JOB_TIMEOUT", 600))
+        self._pending: Set[str] = set()
+        self._watcher: Optional[asyncio.Task] = None
+        # queue length as of the last enqueue or sync; stats() never goes to Redis
+        self._queue_depth: Optional[int] = None
+        self.metrics: Dict[str, int] = {"enqueued": 0, "enqueue_errors": 0, "synced": 0}
+
+    @property
+    def mode(self) -> str:
+        return "rq" if self.queue is not None else "local"
+
+    def _enqueue_sync(self, job_id: str, payload: Dict[str, Any], blob: Optional[Blob]) -> None:
+        # the worker can't see this process' blob store: the bytes go to the shared
+        # blob store once and the job only carries their content-addressed reference
+        job_payload = {k: v for k, v in payload.items() if k != "blob_id"}
+        if blob is not None:
+            job_payload["blob_ref"] = shared_blobs.put(blob.view(), sha256=blob.sha256)
+        self.queue.enqueue(
+            process_upload,
+            job_payload,
+            job_id=job_id,
+            job_timeout=self.job_timeout,
+            result_ttl=int(self.store.ttl),
+            failure_ttl=int(self.store.ttl),
+        )
+        self._refresh_depth()
+
+    def _refresh_depth(self) -> None:
+        # blocking Redis call: only from the threads that already talk to Redis
+        try:
+            self._queue_depth = self.queue.count
+        except Exception as e:
+            logger.debug("No se pudo leer la profundidad de la cola RQ: %s", e)
+
+    async def enqueue(
+        self, job_id: str, payload: Dict[str, Any], blob: Optional[Blob] = None
+    ) -> None:
+        """Put the job on the RQ queue under the same id as the JobStore entry."""
+        try:
+            # redis-py and the blob write are blocking: keep them off the event loop
+            await asyncio.to_thread(self._enqueue_sync, job_id, payload, blob)
+        except Exception:
+            self.metrics["enqueue_errors"] += 1
+            raise
+        self.metrics["enqueued"] += 1
+        self._pending.add(job_id)
+        self._ensure_watcher()
+
+    def _ensure_watcher(self) -> None:
+        loop = asyncio.get_running_loop()
+        # a watcher bound to another (closed) loop never runs again: start a new one
+        if self._watcher is None or self._watcher.done() or self._watcher.get_loop() is not loop:
+            self._watcher = loop.create_task(self._watch())
+
+    def _fetch(self, job_ids):
+        from rq.job import Job
+
+        return Job.fetch_many(list(job_ids), connection=self.queue.connection)
+
+    def _apply(self, job_id: str, snap: Dict[str, Any]) -> None:
+        cur = self.store.get(job_id)
+        if cur is None:
+            return
+        if snap["status"] == "finished":
+            self.store.set_result(job_id, snap["result"])
+        elif snap["status"] == "failed":
+            self.store.set_error(job_id, snap["error"])
+        else:
+            if cur["status"] != snap["status"]:
+                self.store.set_status(job_id, snap["status"])
+            if cur.get("stage") != snap["stage"]:
+                self.store.set_stage(job_id, snap["stage"])
+
+    async def sync_once(self) -> int:
+        """Mirror the RQ state of pending jobs into the store; returns how many ended."""
+        ids = list(self._pending)
+        if not ids:
+            return 0
+        rq_jobs = await asyncio.to_thread(self._fetch, ids)
+        # store writes (SQLite with JOB_STORE=sqlite) stay off the event loop too
+        done = await asyncio.to_thread(self._mirror, ids, rq_jobs)
+        self.metrics["synced"] += done
+        return done
+
+    def _mirror(self, ids, rq_jobs) -> int:
+        self._refresh_depth()
+        done = 0
+        for job_id, rq_job in zip(ids, rq_jobs):
+            if rq_job is None:
+                # expired or deleted in Redis: nothing more will come
+                self.store.set_error(job_id, "rq_job_missing")
+                snap_status = "failed"
+            else:
+                snap = rq_snapshot(rq_job)
+                self._apply(job_id, snap)
+                snap_status = snap["status"]
+            if snap_status in TERMINAL_STATUSES:
+                self._pending.discard(job_id)
+                done += 1
+        return done
+
+    async def _watch(self) -> None:
+        while self._pending:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.warning("No se pudo leer el estado de los jobs RQ: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job state straight from Redis, for jobs this process' store doesn't know."""
+        if self.queue is None:
+            return None
+        try:
+            rq_job = (await asyncio.to_thread(self._fetch, [job_id]))[0]
+        except Exception as e:
+            logger.debug("Lookup RQ falló para %s: %s", job_id, e)
+            return None
+        return rq_snapshot(rq_job) if rq_job is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"mode": self.mode, "pending": len(self._pending), **self.metrics}
+        if self.queue is not None:
+            out["shared_blobs"] = shared_blobs.stats()
+            out["queue_depth"] = self._queue_depth
+        return out
+
+    async def stop(self) -> None:
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.cancel()
+            try:
+                await watcher
+            except BaseException:
+                pass
+
+
+job_dispatcher = JobDispatcher(rq_queue)
@@ -1,21 +1,72 @@
+import asyncio
+import logging
+import os
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
-from app.api.endpoints import router
+from app.api.endpoints import max_upload_bytes, router
+from app.background import job_store
+from app.dispatcher import job_dispatcher
+from app.scheduler import job_scheduler
 from app.whiteboard import register_whiteboard
 
 # Import shared clients at module level as requested (keeps imports visible and predictable)
 from app.services.ai.processor import AIProcessor
 from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.services.http_transport import transport_manager
+from app.services.preflight import pdf_preflight
+
+logger = logging.getLogger("app.main")
 
 app = FastAPI()
 app.include_router(router)
 register_whiteboard(app)
 
 
+async def _warm_up_http(app: FastAPI, client: SAIAConsoleClient) -> None:
+    """Open HTTP_WARMUP_CONNECTIONS pooled connections to the chat and files hosts and
+    start the keepalive task; failures only cost the warm-up, never the startup."""
+    try:
+        connections = int(os.environ.get("HTTP_WARMUP_CONNECTIONS", 2))
+    except Exception:
+        connections = 2
+    try:
+        interval = float(os.environ.get("HTTP_KEEPALIVE_INTERVAL", 20.0))
+    except Exception:
+        interval = 20.0
+    if connections <= 0:
+        return
+    urls = [client.processor.url, f"{client.base_url}/v1/files"]
+    try:
+        t0 = time.perf_counter()
+        report = await asyncio.wait_for(
+            transport_manager.warm_up(urls, connections),
+            timeout=transport_manager.timeout.connect or 10.0,
+        )
+        for origin, r in report.items():
+            saved = r.get("connect_time_avg")
+            logger.info(
+                "Warm-up HTTP %s: %d/%d conexiones abiertas en %.3fs; "
+                "la primera petición se ahorra ~%s ms de DNS/TCP/TLS",
+                origin,
+                r["connections_opened"],
+                connections,
+                r["seconds"],
+                f"{saved * 1000:.0f}" if saved is not None else "?",
+            )
+        logger.info("Warm-up HTTP completo en %.3fs", time.perf_counter() - t0)
+    except Exception as e:
+        logger.warning("Warm-up HTTP falló; las conexiones se abrirán bajo demanda: %s", e)
+    if interval > 0:
+        app.state.http_keepalive = asyncio.create_task(
+            transport_manager.keepalive(urls, interval)
+        )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup: create shared service instances and store on app.state for DI
@@ -35,22 +86,40 @@ async def lifespan(app: FastAPI):
         app.state.ai_processor = None
         app.state.saia_client = None
 
+    # pre-open pooled connections so the first user after a restart skips DNS/TCP/TLS
+    app.state.http_keepalive = None
+    client = getattr(app.state, "saia_client", None)
+    if client is not None:
+        await _warm_up_http(app, client)
+
     # mapping for uploads prepared for streaming: alias -> file_path
     try:
         app.state.stream_uploads = {}
     except Exception:
         app.state.stream_uploads = {}
 
+    # expire finished jobs periodically so the in-memory job store stays bounded
+    app.state.job_sweeper = asyncio.create_task(job_store.run_sweeper())
+
     yield
 
-    # shutdown: close shared http clients used by services and instance clients
+    # shutdown: stop everything that can still run jobs first, so no job in flight
+    # meets a closed HTTP client; then close the shared http clients
+    for name in ("http_keepalive", "job_sweeper"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
     try:
-        # class-level shared httpx client used by AIProcessor
-        await AIProcessor.close_client()
+        # in-process job workers
+        await job_scheduler.stop()
+    except Exception:
+        pass
+    try:
+        # RQ status watcher (queue mode only)
+        await job_dispatcher.stop()
     except Exception:
         pass
     try:
-        # close instance-level httpx client if created
         if getattr(app.state, "saia_client", None) is not None:
             try:
                 await app.state.saia_client.aclose()
@@ -59,6 +128,16 @@ async def lifespan(app: FastAPI):
             app.state.saia_client = None
     except Exception:
         pass
+    try:
+        # process-wide connection pools shared by AIProcessor and SAIAConsoleClient
+        await transport_manager.aclose()
+    except Exception:
+        pass
+    try:
+        # PDF preflight thread pool
+        pdf_preflight.shutdown()
+    except Exception:
+        pass
 
 
 app.router.lifespan_context = lifespan
@@ -68,4 +147,6 @@ templates = Jinja2Templates(directory="app/templates")
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(
+        request, "index.html", {"max_upload_kb": max_upload_bytes() // 1024}
+    )
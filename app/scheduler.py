@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger("app.scheduler")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when the queue is at capacity."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"job queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Item:
+    __slots__ = ("fn", "future", "client", "enqueued_at")
+
+    def __init__(self, fn: Callable[[], Awaitable[Any]], future: "asyncio.Future", client: str) -> None:
+        self.fn = fn
+        self.future = future
+        self.client = client
+        self.enqueued_at = time.monotonic()
+
+
+class JobScheduler:
+    """Planificador de jobs en proceso: workers fijos, cola acotada con prioridad y reparto justo por cliente.
+
+    Lower ``priority`` values run first. Within a priority level, clients are
+    served round-robin so one client's burst can't starve the others. When
+    ``max_queue`` jobs are waiting, ``submit`` raises QueueFull with a
+    Retry-After estimate derived from recent run times.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None) -> None:
+        self.workers = max(workers or _env_int("JOB_WORKERS", 4), 1)
+        self.max_queue = max(max_queue or _env_int("JOB_QUEUE_MAX", 100), 1)
+        # priority -> client -> pending items
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Item]]"] = {}
+        self._depth = 0
+        self._running = 0
+        self._tasks: list = []
+        self._wakeup: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waits: Deque[float] = deque(maxlen=500)
+        self._run_times: Deque[float] = deque(maxlen=500)
+        self.metrics: Dict[str, int] = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        if self._loop is not None and self._loop is not loop:
+            # a new event loop (tests, asyncio.run): pending work of the old one is lost
+            self._queues.clear()
+            self._depth = 0
+            self._running = 0
+        self._loop = loop
+        self._wakeup = asyncio.Semaphore(0)
+        self._tasks = [
+            loop.create_task(self._worker_loop(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    def is_full(self) -> bool:
+        return self._depth >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely free, from recent run times."""
+        avg = (sum(self._run_times) / len(self._run_times)) if self._run_times else 1.0
+        return max(1, math.ceil(avg * max(self._depth - self.max_queue + 1, 1) / self.workers))
+
+    def submit(
+        self, fn: Callable[[], Awaitable[Any]], client: str = "anonymous", priority: int = 1
+    ) -> "asyncio.Future":
+        """Queue ``fn`` and return a future with its result; raises QueueFull at capacity."""
+        self._ensure_started()
+        if self.is_full():
+            self.metrics["rejected"] += 1
+            raise QueueFull(self.retry_after())
+        fut = self._loop.create_future()
+        level = self._queues.setdefault(priority, OrderedDict())
+        level.setdefault(client, deque()).append(_Item(fn, fut, client))
+        self._depth += 1
+        self.metrics["submitted"] += 1
+        self._wakeup.release()
+        return fut
+
+    def _next(self) -> Optional[_Item]:
+        for priority in sorted(self._queues):
+            level = self._queues[priority]
+            if not level:
+                continue
+            # round-robin: take the head client's oldest job, then move that client to the back
+            client, items = next(iter(level.items()))
+            item = items.popleft()
+            if items:
+                level.move_to_end(client)
+            else:
+                del level[client]
+            self._depth -= 1
+            return item
+        return None
+
+    async def _worker_loop(self) -> None:
+        while True:
+            await self._wakeup.acquire()
+            item = self._next()
+            if item is None:
+                continue
+            self._waits.append(time.monotonic() - item.enqueued_at)
+            self._running += 1
+            started = time.monotonic()
+            try:
+                res = await item.fn()
+                if not item.future.done():
+                    item.future.set_result(res)
+                self.metrics["completed"] += 1
+            except asyncio.CancelledError:
+                if not item.future.done():
+                    item.future.cancel()
+                raise
+            except Exception as e:
+                logger.warning("Job falló en el scheduler: %s", e)
+                self.metrics["failed"] += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+            finally:
+                self._running -= 1
+                self._run_times.append(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def q(p: float) -> Optional[float]:
+            return round(waits[min(int(p * len(waits)), len(waits) - 1)], 4) if waits else None
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._depth,
+            "running": self._running,
+            "clients_waiting": sum(len(level) for level in self._queues.values()),
+            "wait_p50": q(0.5),
+            "wait_p95": q(0.95),
+            "wait_max": round(waits[-1], 4) if waits else None,
+            **self.metrics,
+        }
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except BaseException:
+                pass
+        self._loop = None
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def approx_size(value: Any) -> int:
+    """Cheap byte estimate for cached dicts/lists of primitives (not exact, but monotonic)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(k)) + approx_size(v) for k, v in value.items()) + 16
+    if isinstance(value, (list, tuple)):
+        return sum(approx_size(v) for v in value) + 8
+    return 8
+
+
+class LRUCache:
+    """Caché LRU en memoria con TTL por entrada y presupuesto total de bytes.
+
+    Counters are written into an external ``metrics`` dict (e.g. the client's)
+    as ``<prefix>_hits``, ``<prefix>_misses``, ``<prefix>_evictions``,
+    ``<prefix>_expirations``, ``<prefix>_bytes`` and ``<prefix>_entries``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 1024 * 1024,
+        ttl: Optional[float] = 3600.0,
+        metrics: Optional[Dict[str, Any]] = None,
+        prefix: str = "cache",
+        sizeof: Callable[[Any], int] = approx_size,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.metrics = metrics if metrics is not None else {}
+        self.prefix = prefix
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        # key -> (value, size, expires_at)
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        for name in ("hits", "misses", "evictions", "expirations", "bytes", "entries"):
+            self.metrics.setdefault(f"{prefix}_{name}", 0)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self.metrics[f"{self.prefix}_{name}"] += n
+
+    def _sync_gauges(self) -> None:
+        self.metrics[f"{self.prefix}_bytes"] = self._bytes
+        self.metrics[f"{self.prefix}_entries"] = len(self._data)
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._count("misses")
+                return None
+            value, _, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(key)
+                self._count("expirations")
+                self._count("misses")
+                self._sync_gauges()
+                return None
+            self._data.move_to_end(key)
+            self._count("hits")
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self._count("evictions")
+            self._sync_gauges()
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+                self._sync_gauges()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self._sync_gauges()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
@@ -0,0 +1,213 @@
+import logging
+from typing import Any, Optional
+
+from app.codec import loads
+
+logger = logging.getLogger("app.services.ai.decoder")
+
+# fields holding the text inside a message / delta, in order of preference
+MESSAGE_TEXT_KEYS = ("content", "text", "payload")
+# top-level fields of the non-OpenAI shapes we've seen (and of our own results)
+ANSWER_TEXT_KEYS = ("message", "content", "text", "output", "answer", "result")
+
+NO_TEXT_FOUND = {
+    "error": "no_text_found",
+    "user_message": "No se detectó texto en el archivo o imagen.",
+}
+
+_FENCE = "```"
+_WS = " \t\r\n"
+# first characters a JSON value can start with
+_JSON_START = frozenset('{["-0123456789tfn')
+
+
+def _as_text(v: Any) -> Optional[str]:
+    if isinstance(v, str):
+        return v
+    if isinstance(v, list):
+        # content parts: [{"type": "text", "text": "..."}, ...]
+        parts = [
+            p if isinstance(p, str) else p.get("text")
+            for p in v
+            if isinstance(p, str) or isinstance(p, dict)
+        ]
+        return "".join([p for p in parts if isinstance(p, str)])
+    return None
+
+
+def choice_text(choice: Any) -> Optional[str]:
+    """Text of one ``choices[i]`` entry: message (non-streaming), delta (streaming) or the choice itself."""
+    if isinstance(choice, str):
+        return choice
+    if not isinstance(choice, dict):
+        return None
+    msg = choice.get("message") or choice.get("delta") or choice
+    if isinstance(msg, str):
+        return msg
+    if not isinstance(msg, dict):
+        return None
+    for key in MESSAGE_TEXT_KEYS:
+        text = _as_text(msg.get(key))
+        if text:
+            return text
+    return None
+
+
+def answer_text(obj: Any) -> Optional[str]:
+    """Text of a response object or streaming fragment, or None when the shape isn't recognised.
+
+    The one extraction routine behind both paths: the non-streaming result
+    of ``AIProcessor.process``, dict fragments on /stream and the slow path
+    of ``DeltaAssembler``. Only the known fields are looked at, nothing is
+    walked.
+    """
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, dict):
+        choices = obj.get("choices")
+        if isinstance(choices, list) and choices:
+            # a choice without text (role-only / finish delta, empty content) is still
+            # a known shape: "" here, not a fallback to something else
+            text = choice_text(choices[0])
+            return text if text is not None else ""
+        for key in ANSWER_TEXT_KEYS:
+            v = obj.get(key)
+            if isinstance(v, str) and v:
+                return v
+        return None
+    if isinstance(obj, list):
+        texts = [answer_text(i) for i in obj]
+        texts = [t for t in texts if t is not None]
+        return "\n".join(texts) if texts else None
+    return None
+
+
+def first_string(obj: Any) -> Optional[str]:
+    """First non-empty string in document order; iterative, so deep or odd responses cost no recursion."""
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, dict):
+        stack = [iter(obj.values())]
+    elif isinstance(obj, list):
+        stack = [iter(obj)]
+    else:
+        return None
+    while stack:
+        for v in stack[-1]:
+            if isinstance(v, str):
+                if v:
+                    return v
+            elif isinstance(v, dict):
+                stack.append(iter(v.values()))
+                break
+            elif isinstance(v, list):
+                stack.append(iter(v))
+                break
+        else:
+            stack.pop()
+    return None
+
+
+def completion_text(data: Any) -> Optional[str]:
+    """Assistant text of a non-streaming response; None if there's no text at all."""
+    try:
+        # fast path: choices[0].message.content
+        text = data["choices"][0]["message"]["content"]
+        if isinstance(text, str):
+            return text
+    except (KeyError, IndexError, TypeError):
+        pass
+    text = answer_text(data)
+    if text is None:
+        text = first_string(data)
+    return text
+
+
+def _first_char(text: str, start: int = 0) -> int:
+    n = len(text)
+    while start < n and text[start] in _WS:
+        start += 1
+    return start
+
+
+def _fence_open(text: str) -> int:
+    # a fence only counts at the start of a line (``` inside a JSON string doesn't)
+    i = text.find(_FENCE)
+    while i != -1:
+        j = i
+        while j and text[j - 1] in " \t":
+            j -= 1
+        if j == 0 or text[j - 1] == "\n":
+            return i
+        i = text.find(_FENCE, i + 3)
+    return -1
+
+
+def unfence(text: str) -> str:
+    """Body of the first fenced code block (```json ... ```), or the text itself when there's none.
+
+    Two ``find`` calls and one slice instead of a regex pass over the whole
+    answer; an unterminated fence (cut-off answer) runs to the end.
+    """
+    start = _fence_open(text)
+    if start == -1:
+        return text
+    body = start + 3
+    # skip the language tag (json, JSON, ...) when one follows the fence
+    n = len(text)
+    k = body
+    while k < n and text[k].isalnum():
+        k += 1
+    if k == n or text[k] in _WS or text[k] in "{[":
+        body = k
+    end = text.rfind(_FENCE, body)
+    return text[body:end if end != -1 else len(text)]
+
+
+def parse_answer(text: str) -> Any:
+    """Assistant text to a result: its JSON (fenced or not) or ``{"message": text}``."""
+    i = _first_char(text)
+    looks_json = i < len(text) and text[i] in "{["
+    if looks_json:
+        # plain JSON answer, the usual case: no fence scan at all
+        try:
+            return loads(text)
+        except ValueError:
+            pass
+    body = unfence(text)
+    if body is not text:
+        try:
+            return loads(body)
+        except ValueError:
+            pass
+    elif not looks_json and i < len(text) and text[i] in _JSON_START:
+        # bare scalars ("42", "true") parse as before; prose never reaches loads
+        try:
+            return loads(body)
+        except ValueError:
+            pass
+    logger.debug("Respuesta no es JSON válido, devolviendo como mensaje de texto")
+    return {"message": text}
+
+
+def _blank(text: str) -> bool:
+    return not text or text.isspace()
+
+
+def decode_completion(data: Any) -> Any:
+    """Result of a non-streaming SAIA response, as returned by ``AIProcessor.process``.
+
+    The raw response when it carries no text, NO_TEXT_FOUND when the text
+    (or the message it parses to) is blank, else the parsed answer.
+    """
+    raw = completion_text(data)
+    if raw is None:
+        return data
+    if _blank(raw):
+        return dict(NO_TEXT_FOUND)
+    result = parse_answer(raw)
+    if isinstance(result, dict):
+        m = result.get("message")
+        if isinstance(m, str) and _blank(m):
+            return dict(NO_TEXT_FOUND)
+    return result
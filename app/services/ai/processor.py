@@ -1,6 +1,4 @@
-import json
 import logging
-import re
 import time
 import uuid
 from typing import Any, AsyncGenerator, Dict, Optional, Union
@@ -9,6 +7,11 @@ import httpx
 from dotenv import load_dotenv
 from httpx import HTTPStatusError, RequestError
 
+from app.codec import dumps, dumps_text, loads
+from app.services.ai.decoder import decode_completion
+from app.services.ai.sse import DeltaAssembler, TextDelta, iter_text_deltas
+from app.services.http_transport import transport_manager
+
 # Configure a proper hierarchical logger
 logger = logging.getLogger("app.services.ai.processor")
 
@@ -48,32 +51,16 @@ class AIProcessor:
         except Exception:
             pass
 
-    # Shared async client (HTTP/2 + connection pooling) per-process to cut handshake/setup costs
-    _shared_client: Optional[httpx.AsyncClient] = None
+    # chat calls fail fast on connect; the pool itself is shared (see app.services.http_transport)
+    timeout = httpx.Timeout(connect=1.0, read=30.0, write=15.0, pool=5.0)
 
-    @classmethod
-    def _get_client(cls, timeout: int) -> httpx.AsyncClient:
-        if cls._shared_client is None:
-            # conservative limits for Heroku dynos and faster connection failures
-            limits = httpx.Limits(max_connections=50, max_keepalive_connections=20)
-            timeout = httpx.Timeout(connect=1.0, read=30.0, write=15.0, pool=5.0)
-            # Don't trust env (avoid proxy auto-detection on Heroku dynos)
-            cls._shared_client = httpx.AsyncClient(
-                timeout=timeout,
-                limits=limits,
-                trust_env=False,
-                follow_redirects=True,
-            )
-        return cls._shared_client
+    def _get_client(self) -> httpx.AsyncClient:
+        return transport_manager.get(self.url)
 
     @classmethod
     async def close_client(cls) -> None:
-        if cls._shared_client is not None:
-            try:
-                await cls._shared_client.aclose()
-            except Exception:
-                pass
-            cls._shared_client = None
+        """Close the process-wide HTTP pools (kept for callers of the old per-class client)."""
+        await transport_manager.aclose()
 
     def _prepare_payload(
         self,
@@ -84,7 +71,7 @@ class AIProcessor:
         # Ensure content is a string (SAIA chat expects string content in messages)
         if not isinstance(content, str):
             try:
-                content_str = json.dumps(content, ensure_ascii=False)
+                content_str = dumps_text(content)
             except Exception:
                 content_str = str(content)
         else:
@@ -96,16 +83,6 @@ class AIProcessor:
             "stream": stream,
         }
 
-    def _parse_ai_response(self, response_text: str) -> Dict[str, Any]:
-        clean = re.sub(r"```json\s*|\s*```", "", response_text, flags=re.DOTALL).strip()
-        try:
-            return json.loads(clean)
-        except json.JSONDecodeError:
-            logger.debug(
-                "Respuesta no es JSON válido, devolviendo como mensaje de texto"
-            )
-            return {"message": response_text}
-
     async def process(
         self,
         assistant_id: str,
@@ -130,76 +107,17 @@ class AIProcessor:
                     except Exception:
                         headers[str(hk)] = repr(hv)
 
-            client = self._get_client(self.request_timeout)
+            client = self._get_client()
             logger.debug(f"[{request_id}] Enviando solicitud a {self.url}")
             res = await client.post(
                 self.url,
                 headers=headers,
-                json=payload,
+                content=dumps(payload),
+                timeout=self.timeout,
             )
             res.raise_for_status()
-            data = res.json()
-            # Robust extraction of assistant textual content from common response shapes
-            raw = None
-            try:
-                if isinstance(data, dict) and "choices" in data and data["choices"]:
-                    choice0 = data["choices"][0]
-                    # common: { choices: [{ message: { content: '...' } }] }
-                    if isinstance(choice0, dict):
-                        msg = choice0.get("message") or choice0.get("delta") or choice0
-                        if isinstance(msg, dict):
-                            raw = (
-                                msg.get("content")
-                                or msg.get("text")
-                                or msg.get("payload")
-                            )
-                        elif isinstance(msg, str):
-                            raw = msg
-                    elif isinstance(choice0, str):
-                        raw = choice0
-                # Fallback: if no 'raw' found, try to find a first-long string in the response
-                if raw is None:
-
-                    def find_string(o):
-                        if isinstance(o, str):
-                            return o
-                        if isinstance(o, list):
-                            for v in o:
-                                s = find_string(v)
-                                if s and len(s) > 0:
-                                    return s
-                            return None
-                        if isinstance(o, dict):
-                            for k, v in o.items():
-                                s = find_string(v)
-                                if s and len(s) > 0:
-                                    return s
-                        return None
-
-                    raw = find_string(data)
-
-                # If we still don't have any textual payload, return the full JSON as fallback
-                if raw is None:
-                    result = data
-                else:
-                    # If the assistant returned an empty/whitespace-only string, treat as "no text found"
-                    if isinstance(raw, str) and raw.strip() == "":
-                        return {
-                            "error": "no_text_found",
-                            "user_message": "No se detectó texto en el archivo o imagen.",
-                        }
-                    result = self._parse_ai_response(raw)
-                    # If parsing yields an object whose 'message' is empty, treat similarly
-                    if isinstance(result, dict):
-                        m = result.get("message")
-                        if isinstance(m, str) and m.strip() == "":
-                            return {
-                                "error": "no_text_found",
-                                "user_message": "No se detectó texto en el archivo o imagen.",
-                            }
-            except KeyError:
-                # Defensive: if response shape is unexpected, return the raw data instead of raising
-                result = data
+            data = loads(res.content)
+            result = decode_completion(data)
             elapsed = time.time() - start_time
             logger.debug(f"[{request_id}] Procesamiento completado en {elapsed:.2f}s")
             return result
@@ -214,7 +132,7 @@ class AIProcessor:
             # try parse JSON error body to detect known SAIA errors
             detected = None
             try:
-                j = resp.json()
+                j = loads(resp.content)
                 # SAIA doc-empty error example: {"error":{"message":"The document has no pages.","code":"8024"}}
                 if (
                     isinstance(j, dict)
@@ -272,35 +190,36 @@ class AIProcessor:
 
     async def process_stream(
         self, assistant_id: str, content: Any
-    ) -> AsyncGenerator[Dict[str, Any], None]:
+    ) -> AsyncGenerator[Union[TextDelta, Dict[str, Any]], None]:
+        """Yield TextDelta items as the answer streams in; failures are yielded as {"error": ...} dicts."""
         request_id = uuid.uuid4().hex[:8]
         logger.info(
             f"[{request_id}] Iniciando streaming para assistant_id={assistant_id}"
         )
         payload = self._prepare_payload(assistant_id, content, stream=True)
         try:
-            client = self._get_client(self.request_timeout)
+            client = self._get_client()
             async with client.stream(
                 "POST",
                 self.url,
                 headers=self.headers,
-                json=payload,
+                content=dumps(payload),
+                timeout=self.timeout,
             ) as response:
                 response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        json_data = line[len("data: "):]
-                        if json_data.strip() == "[DONE]":
-                            logger.debug(f"[{request_id}] Streaming completado")
-                            break
-                        try:
-                            chunk = json.loads(json_data)
-                            yield chunk
-                        except json.JSONDecodeError:
-                            logger.warning(
-                                f"[{request_id}] No se pudo parsear fragmento: {json_data[:50]}..."
-                            )
-                            continue
+                # bytes go straight to the SSE parser: no per-line str decoding, and
+                # only the delta text of each chunk is kept
+                asm = DeltaAssembler()
+                async for delta in iter_text_deltas(response.aiter_bytes(), asm):
+                    yield delta
+                if asm.bad_events:
+                    logger.warning(
+                        f"[{request_id}] {asm.bad_events} fragmentos no se pudieron parsear"
+                    )
+                if asm.error is not None:
+                    yield {"error": "Error en streaming", "detail": str(asm.error.get("error"))}
+                else:
+                    logger.debug(f"[{request_id}] Streaming completado")
         except HTTPStatusError as e:
             logger.error(
                 f"[{request_id}] Error de estado HTTP en streaming {e.response.status_code}: {e}"
@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import os
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+from app.codec import dumps, loads
+from app.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger("app.services.ai.result_cache")
+
+DEFAULT_CACHE_PATH = "/tmp/saia_demo/chat_results.sqlite3"
+DEFAULT_CACHE_TTL = 24 * 3600
+DEFAULT_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    """Case/whitespace-insensitive form of a prompt, so trivial variants share a cache entry."""
+    text = unicodedata.normalize("NFKC", prompt or "")
+    return " ".join(text.split()).casefold()
+
+
+def is_cacheable(result: Any) -> bool:
+    """Only successful chat answers are cached; errors and 8024 responses are retried next time."""
+    if not isinstance(result, dict) or not result:
+        return False
+    if result.get("error"):
+        return False
+    try:
+        if int(result.get("status_code") or 0) >= 400:
+            return False
+    except (TypeError, ValueError):
+        pass
+    return str(result.get("code") or "") != "8024"
+
+
+class ChatResultCache(SQLiteStore):
+    """Caché persistente de respuestas de chat por (sha256 del documento, prompt normalizado, asistente).
+
+    Entries expire after ``ttl`` seconds and the table is trimmed to
+    ``max_bytes`` of stored answers, least recently used first.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS chat_results (
+        key TEXT PRIMARY KEY,
+        sha256 TEXT NOT NULL,
+        assistant TEXT NOT NULL,
+        result TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        used_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS chat_results_used_at ON chat_results (used_at);
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__(
+            path or os.environ.get("CHAT_RESULT_CACHE_PATH") or DEFAULT_CACHE_PATH
+        )
+        if ttl is None:
+            try:
+                ttl = float(os.environ.get("CHAT_RESULT_CACHE_TTL", DEFAULT_CACHE_TTL))
+            except Exception:
+                ttl = DEFAULT_CACHE_TTL
+        if max_bytes is None:
+            try:
+                max_bytes = int(
+                    os.environ.get("CHAT_RESULT_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)
+                )
+            except Exception:
+                max_bytes = DEFAULT_CACHE_MAX_BYTES
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls) -> Optional["ChatResultCache"]:
+        """Build the cache only when enabled with CHAT_RESULT_CACHE=1 (opt-in)."""
+        flag = os.environ.get("CHAT_RESULT_CACHE", "0").strip().lower()
+        if flag not in ("1", "true", "yes", "on"):
+            return None
+        return cls()
+
+    @staticmethod
+    def make_key(sha256: str, prompt: Optional[str], assistant: str) -> str:
+        raw = "\0".join((sha256, normalize_prompt(prompt), assistant or ""))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(
+        self, sha256: str, prompt: Optional[str], assistant: str
+    ) -> Optional[Dict[str, Any]]:
+        key = self.make_key(sha256, prompt, assistant)
+        now = time.time()
+        try:
+            rows = self.execute(
+                "SELECT result FROM chat_results WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            )
+            if not rows:
+                return None
+            self.execute("UPDATE chat_results SET used_at = ? WHERE key = ?", (now, key))
+            return loads(rows[0][0])
+        except Exception as e:
+            logger.warning("Chat result cache lookup failed: %s", e)
+            return None
+
+    def put(
+        self, sha256: str, prompt: Optional[str], assistant: str, result: Dict[str, Any]
+    ) -> bool:
+        if not is_cacheable(result):
+            return False
+        try:
+            body = dumps(result)
+        except (TypeError, ValueError):
+            return False
+        size = len(body)
+        if size > self.max_bytes:
+            return False
+        now = time.time()
+        try:
+            self.execute(
+                "INSERT OR REPLACE INTO chat_results "
+                "(key, sha256, assistant, result, size, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(sha256, prompt, assistant), sha256, assistant or "",
+                 body, size, now, now),
+            )
+            self._trim(now)
+            return True
+        except Exception as e:
+            logger.warning("Chat result cache store failed: %s", e)
+            return False
+
+    def _trim(self, now: float) -> None:
+        self.execute("DELETE FROM chat_results WHERE created_at < ?", (now - self.ttl,))
+        total = self.execute("SELECT COALESCE(SUM(size), 0) FROM chat_results")[0][0]
+        if total <= self.max_bytes:
+            return
+        # drop least recently used answers until the table fits the budget
+        excess = total - self.max_bytes
+        for key, size in self.execute(
+            "SELECT key, size FROM chat_results ORDER BY used_at ASC, rowid ASC"
+        ):
+            self.execute("DELETE FROM chat_results WHERE key = ?", (key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            entries, total = self.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chat_results"
+            )[0]
+        except Exception:
+            entries, total = None, None
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,167 @@
+import os
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# size bucket upper bounds (bytes) -> label
+_SIZE_BUCKETS = (
+    (100 * 1024, "<100KB"),
+    (1024 * 1024, "<1MB"),
+    (10 * 1024 * 1024, "<10MB"),
+)
+# quantiles (of observed ingestion latency) at which we retry, in order
+_TARGET_QUANTILES = (0.5, 0.75, 0.9, 0.99)
+
+# legacy schedule used until a bucket has enough samples
+DEFAULT_FIRST_DELAY = 0.2
+DEFAULT_BACKOFF = 1.7
+MIN_DELAY = 0.05
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def size_bucket(size: Optional[int]) -> str:
+    if size is None:
+        return "unknown"
+    for limit, label in _SIZE_BUCKETS:
+        if size < limit:
+            return label
+    return ">=10MB"
+
+
+def _quantile(sorted_samples: List[float], q: float) -> float:
+    idx = min(int(q * len(sorted_samples)), len(sorted_samples) - 1)
+    return sorted_samples[idx]
+
+
+class RetryPlan:
+    """Delays for one upload->chat sequence, measured from the end of the upload."""
+
+    def __init__(self, targets: List[float], deadline: float, max_attempts: int) -> None:
+        self._targets = list(targets)
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self._last_delay = DEFAULT_FIRST_DELAY / DEFAULT_BACKOFF
+
+    def next_delay(self, elapsed: float) -> Optional[float]:
+        """Seconds to wait before the next chat attempt, or None to give up."""
+        self.attempts += 1
+        if self.attempts >= self.max_attempts:
+            return None
+        delay = None
+        # skip quantile targets we already passed
+        while self._targets:
+            t = self._targets.pop(0)
+            if t - elapsed >= MIN_DELAY:
+                delay = t - elapsed
+                break
+        if delay is None:
+            delay = max(self._last_delay * DEFAULT_BACKOFF, MIN_DELAY)
+        remaining = self.deadline - elapsed
+        if remaining < MIN_DELAY:
+            return None
+        delay = min(delay, remaining)
+        self._last_delay = delay
+        return delay
+
+
+class IngestionRetryScheduler:
+    """Planificador de reintentos frente a 8024 según la latencia de ingestión observada.
+
+    Latency samples (time from upload completion to the first chat that did
+    not return 8024) are kept per (file type, size bucket); retries are
+    scheduled at the p50/p75/p90/p99 of that history, then back off, all
+    within an overall deadline.
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        window: int = 200,
+        min_samples: int = 5,
+    ) -> None:
+        self.deadline = deadline if deadline is not None else _env_float(
+            "INGESTION_RETRY_DEADLINE", 20.0
+        )
+        self.max_attempts = max_attempts or int(_env_float("INGESTION_RETRY_MAX_ATTEMPTS", 12))
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counters: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    @staticmethod
+    def _key(file_type: Optional[str], size: Optional[int]) -> Tuple[str, str]:
+        return ((file_type or "").lower().lstrip(".") or "unknown", size_bucket(size))
+
+    def _counter(self, key: Tuple[str, str]) -> Dict[str, int]:
+        return self._counters.setdefault(
+            key, {"sequences": 0, "retries": 0, "exhausted": 0}
+        )
+
+    def plan(self, file_type: Optional[str], size: Optional[int]) -> RetryPlan:
+        key = self._key(file_type, size)
+        with self._lock:
+            self._counter(key)["sequences"] += 1
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) >= self.min_samples:
+            targets = [_quantile(samples, q) for q in _TARGET_QUANTILES]
+        else:
+            # legacy 0.2s * 1.7^n schedule expressed as cumulative times since upload
+            targets, t, d = [], 0.0, DEFAULT_FIRST_DELAY
+            for _ in range(4):
+                t += d
+                targets.append(t)
+                d *= DEFAULT_BACKOFF
+        return RetryPlan(targets, self.deadline, self.max_attempts)
+
+    def record(
+        self,
+        file_type: Optional[str],
+        size: Optional[int],
+        latency: float,
+        retries: int,
+        exhausted: bool = False,
+    ) -> None:
+        key = self._key(file_type, size)
+        with self._lock:
+            c = self._counter(key)
+            c["retries"] += retries
+            if exhausted:
+                c["exhausted"] += 1
+                return
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "deadline": self.deadline,
+            "max_attempts": self.max_attempts,
+            "buckets": {},
+        }
+        with self._lock:
+            keys = set(self._samples) | set(self._counters)
+            for key in sorted(keys):
+                samples = sorted(self._samples.get(key, ()))
+                entry: Dict[str, Any] = dict(self._counters.get(key, {}))
+                entry["samples"] = len(samples)
+                if samples:
+                    entry.update(
+                        {
+                            "p50": round(_quantile(samples, 0.5), 3),
+                            "p90": round(_quantile(samples, 0.9), 3),
+                            "p99": round(_quantile(samples, 0.99), 3),
+                        }
+                    )
+                out["buckets"][f"{key[0]}:{key[1]}"] = entry
+        return out
+
+
+# shared per process so every client (including temporary ones) learns from the same history
+ingestion_scheduler = IngestionRetryScheduler()
@@ -1,18 +1,72 @@
 import asyncio
+import contextvars
 import hashlib
 import logging
 import mimetypes
 import os
+import time
 import unicodedata
-from typing import Any, Dict, Optional
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Union
 
 import httpx
 
+from app.blobs import Blob
+from app.codec import loads
+from app.services.ai.cache import LRUCache
 from app.services.ai.processor import AIProcessor
+from app.services.ai.result_cache import ChatResultCache
+from app.services.ai.retry import IngestionRetryScheduler, ingestion_scheduler
+from app.services.ai.singleflight import SingleFlight
+from app.services.ai.upload_index import UploadIndex
+from app.services.http_transport import transport_manager
 
 logger = logging.getLogger("app.services.ai.saia_console_client")
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+# Upload result fields worth caching; upstream headers and raw bodies are dropped
+_CACHED_UPLOAD_FIELDS = (
+    "status_code",
+    "file_name_used",
+    "file_alias_used",
+    "file_size",
+    "file_sha256",
+    "id",
+    "fileId",
+    "file_id",
+    "dataFileId",
+    "data_file_id",
+    "uploaded_at",
+)
+
+
+# Progress callback of the job running in the current context (set by the job runner).
+# Receives "uploading", "ingesting" or "chatting" as the upload->chat flow advances.
+job_stage: "contextvars.ContextVar[Optional[Callable[[str], None]]]" = contextvars.ContextVar(
+    "job_stage", default=None
+)
+
+
+def report_stage(stage: str) -> None:
+    cb = job_stage.get()
+    if cb is not None:
+        try:
+            cb(stage)
+        except Exception as e:
+            logger.debug("No se pudo reportar la etapa %s: %s", stage, e)
+
+
+class UploadTooLarge(Exception):
+    """Raised while streaming an upload body that exceeds the allowed size."""
+
+
 class SAIAConsoleClient:
     """Cliente simple para interactuar con SAIA Console: subir archivos y enviar mensajes al chat."""
 
@@ -24,6 +78,9 @@ class SAIAConsoleClient:
         assistant_id: str,
         base_url: str = "https://api.saia.ai",
         timeout: int = 60,
+        upload_index: Optional[UploadIndex] = None,
+        retry_scheduler: Optional[IngestionRetryScheduler] = None,
+        result_cache: Optional[ChatResultCache] = None,
     ):
         self.api_token = api_token
         self.organization_id = organization_id
@@ -43,9 +100,13 @@ class SAIAConsoleClient:
             base_url=f"{self.base_url}/chat",
             request_timeout=timeout,
         )
-        # Simple in-memory caches per-process
-        self._client: Optional[httpx.AsyncClient] = None
-        self._upload_cache: Dict[str, Dict] = {}
+        # uploads may take long on slow links: generous read/write, short connect
+        self._timeout = httpx.Timeout(
+            connect=float(os.environ.get("HTTPX_CONNECT_TIMEOUT", 10.0)),
+            read=float(os.environ.get("HTTPX_READ_TIMEOUT", max(60.0, float(self.timeout)))),
+            write=float(os.environ.get("HTTPX_WRITE_TIMEOUT", max(60.0, float(self.timeout)))),
+            pool=float(os.environ.get("HTTPX_POOL_TIMEOUT", 5.0)),
+        )
         # simple runtime counters for observability (in-process)
         self.metrics = {
             "upload_cache_hits": 0,
@@ -53,22 +114,35 @@ class SAIAConsoleClient:
             "fast_path_hits": 0,
             "fast_path_misses": 0,
             "fallback_disk_used": 0,
+            "upload_dedup_hits": 0,
+            "inline_text_used": 0,
+            "result_cache_hits": 0,
+            "result_cache_misses": 0,
         }
+        # In-memory LRU of recent uploads per-process, keyed by folder + sha256
+        self._upload_cache = LRUCache(
+            max_entries=_env_int("UPLOAD_CACHE_MAX_ENTRIES", 256),
+            max_bytes=_env_int("UPLOAD_CACHE_MAX_BYTES", 256 * 1024),
+            ttl=_env_int("UPLOAD_CACHE_TTL", 3600),
+            metrics=self.metrics,
+            prefix="upload_cache",
+        )
+        # content-addressed index shared by workers on this machine (None disables it)
+        self.upload_index = upload_index if upload_index is not None else UploadIndex.from_env()
+        # 8024 retry delays learned from observed ingestion latency (shared per process)
+        self.retry_scheduler = retry_scheduler or ingestion_scheduler
+        # persisted answers per (document sha256, prompt, assistant); opt-in, None disables it
+        self.result_cache = result_cache if result_cache is not None else ChatResultCache.from_env()
+        # identical concurrent upload+chat requests share one upstream call
+        self._single_flight = (
+            SingleFlight(self.metrics, prefix="singleflight")
+            if os.environ.get("SINGLE_FLIGHT", "1") != "0"
+            else None
+        )
 
     def _get_client(self) -> httpx.AsyncClient:
-        if self._client is None:
-            limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
-            # Use HTTP/1.1 by default to avoid requiring the 'h2' package on Heroku
-            # Use a structured Timeout object so we control connect/read/write separately.
-            # Keep connect short, but allow longer read/write for large uploads when running in a worker.
-            to = httpx.Timeout(
-                connect=float(os.environ.get("HTTPX_CONNECT_TIMEOUT", 10.0)),
-                read=float(os.environ.get("HTTPX_READ_TIMEOUT", max(60.0, float(self.timeout)))),
-                write=float(os.environ.get("HTTPX_WRITE_TIMEOUT", max(60.0, float(self.timeout)))),
-                pool=float(os.environ.get("HTTPX_POOL_TIMEOUT", 5.0)),
-            )
-            self._client = httpx.AsyncClient(http2=False, timeout=to, limits=limits)
-        return self._client
+        # borrowed from the process-wide pool; temporary clients hold no sockets of their own
+        return transport_manager.get(self.base_url)
 
     @staticmethod
     def _sanitize_header_value(v: Optional[str]) -> Optional[str]:
@@ -91,6 +165,100 @@ class SAIAConsoleClient:
     def _sha256(data: bytes) -> str:
         return hashlib.sha256(data).hexdigest()
 
+    async def cached_result(
+        self, file_hash: Optional[str], prompt: str, assistant_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Answer stored for this document, prompt and assistant, if the result cache is on."""
+        if self.result_cache is None or not file_hash:
+            return None
+        # SQLite: off the event loop
+        hit = await asyncio.to_thread(
+            self.result_cache.get, file_hash, prompt, assistant_id or self.assistant_id
+        )
+        self.metrics["result_cache_hits" if hit is not None else "result_cache_misses"] += 1
+        return hit
+
+    async def _store_result(
+        self,
+        file_hash: Optional[str],
+        prompt: str,
+        assistant_id: Optional[str],
+        result: Any,
+    ) -> None:
+        if self.result_cache is not None and file_hash:
+            await asyncio.to_thread(
+                self.result_cache.put, file_hash, prompt, assistant_id or self.assistant_id, result
+            )
+
+    async def _lookup_upload(
+        self, file_hash: str, folder: Optional[str], file_name: str
+    ) -> Optional[Dict[str, Any]]:
+        """Return a previous upload of the same bytes: in-process LRU first, then the shared index."""
+        cache_key = f"{folder or 'test1'}:{file_hash}"
+        cached = self._upload_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Using cached upload result for %s", cache_key)
+            result = dict(cached)
+            result["file_name_used"] = file_name
+            result["reused"] = True
+            return result
+        if self.upload_index is None:
+            return None
+        # SQLite (shared between workers): off the event loop
+        entry = await asyncio.to_thread(self.upload_index.lookup, file_hash, folder or "test1")
+        if entry is None:
+            return None
+        logger.debug("Reusing uploaded file %s for sha256 %s", entry["alias"], file_hash)
+        try:
+            self.metrics["upload_dedup_hits"] += 1
+        except Exception:
+            pass
+        result: Dict[str, Any] = {
+            "status_code": 200,
+            "file_name_used": file_name,
+            "file_alias_used": entry["alias"],
+            "file_size": entry["size"],
+            "file_sha256": file_hash,
+            "uploaded_at": entry["uploaded_at"],
+        }
+        if entry["file_id"]:
+            result["id"] = entry["file_id"]
+        self._upload_cache.set(cache_key, result)
+        result = dict(result)
+        result["reused"] = True
+        return result
+
+    async def _remember_upload(self, result: Dict[str, Any]) -> None:
+        """Record an ingested upload in the in-process LRU and the shared index.
+
+        Called after the first chat that found the file ingested: an upload SAIA
+        never ingests must not be handed out for reuse.
+        """
+        folder = result.get("upload_folder")
+        if not result.get("file_sha256") or not folder:
+            return
+        slim = {k: result[k] for k in _CACHED_UPLOAD_FIELDS if k in result}
+        try:
+            self._upload_cache.set(f"{folder}:{result['file_sha256']}", slim)
+        except Exception:
+            pass
+        if self.upload_index is None:
+            return
+        fid = (
+            result.get("id")
+            or result.get("fileId")
+            or result.get("file_id")
+            or result.get("dataFileId")
+        )
+        await asyncio.to_thread(
+            self.upload_index.record,
+            result["file_sha256"],
+            folder,
+            result["file_alias_used"],
+            file_id=str(fid) if fid else None,
+            size=result.get("file_size"),
+        )
+
     async def upload_file(
         self,
         file_path: str,
@@ -135,21 +303,12 @@ class SAIAConsoleClient:
         headers["fileName"] = self._sanitize_header_value(alias_used)
         headers["folder"] = self._sanitize_header_value(folder or "test1")
 
-        # Cache: if we already uploaded an identical file (by sha256), skip re-upload
-        cache_key = f"{alias_used}:{file_hash}"
-        cached = self._upload_cache.get(cache_key)
-        if cached:
-            logger.debug("Using cached upload result for %s", cache_key)
-            try:
-                self.metrics["upload_cache_hits"] += 1
-            except Exception:
-                pass
-            return dict(cached)
-        else:
-            try:
-                self.metrics["upload_cache_misses"] += 1
-            except Exception:
-                pass
+        # Cache: if we already uploaded an identical file (by sha256), skip re-upload,
+        # even when it was ingested under another alias
+        reused = await self._lookup_upload(file_hash, folder, multipart_filename)
+        if reused is not None:
+            return reused
+        report_stage("uploading")
 
         try:
             client = self._get_client()
@@ -160,7 +319,9 @@ class SAIAConsoleClient:
                 }
             )
             try:
-                resp = await client.post(url, headers=headers, files=files)
+                resp = await client.post(
+                    url, headers=headers, files=files, timeout=self._timeout
+                )
             except Exception as exc:
                 # Log detailed info to diagnose network/timeouts
                 logger.exception("Error de red en solicitud: %s", exc)
@@ -168,7 +329,7 @@ class SAIAConsoleClient:
             status = resp.status_code
             text = resp.text
             try:
-                j = resp.json()
+                j = loads(resp.content)
             except Exception:
                 j = None
 
@@ -179,6 +340,7 @@ class SAIAConsoleClient:
                 "file_alias_used": alias_used,
                 "file_size": file_size,
                 "file_sha256": file_hash,
+                "uploaded_at": time.time(),
             }
             if j is not None:
                 if isinstance(j, dict):
@@ -192,15 +354,8 @@ class SAIAConsoleClient:
             if status >= 400:
                 logger.warning("Upload returned status %s: %s", status, text[:400])
             else:
-                # store success in cache to avoid repeating
-                try:
-                    self._upload_cache[cache_key] = dict(result)
-                    # Bound the cache size roughly
-                    if len(self._upload_cache) > 256:
-                        # drop an arbitrary first item
-                        self._upload_cache.pop(next(iter(self._upload_cache)))
-                except Exception:
-                    pass
+                # remembered for reuse once a chat finds it ingested
+                result["upload_folder"] = folder or "test1"
             return result
         except UnicodeEncodeError as ue:
             logger.warning(
@@ -233,16 +388,24 @@ class SAIAConsoleClient:
     async def chat_with_file(
         self,
         prompt: str,
-        file_id: str,
+        file_id: Union[str, Sequence[str]],
         stream: bool = False,
         assistant_id: Optional[str] = None,
         file_name_used: Optional[str] = None,
     ) -> Dict[str, Any]:
-        content = (
-            prompt.replace("{file}", f"{{file:{file_id}}}")
-            if "{file}" in prompt
-            else f"{prompt} Referencia a archivo:{{file:{file_id}}}"
-        )
+        """Chat referencing one file id/alias, or several in a single message.
+
+        Each file becomes a ``{file:<id>}`` placeholder; a ``{file}`` marker in
+        the prompt is replaced by all of them.
+        """
+        file_ids = [file_id] if isinstance(file_id, str) else list(file_id)
+        refs = " ".join(f"{{file:{fid}}}" for fid in file_ids)
+        if "{file}" in prompt:
+            content = prompt.replace("{file}", refs)
+        elif len(file_ids) == 1:
+            content = f"{prompt} Referencia a archivo:{refs}"
+        else:
+            content = f"{prompt} Referencias a archivos: {refs}"
         aid = assistant_id or self.assistant_id
         extra_headers = {"fileName": file_name_used} if file_name_used else None
         try:
@@ -274,18 +437,68 @@ class SAIAConsoleClient:
             logger.warning("Chat exception: %s", e)
             return {"error": "chat_failed", "detail": str(e)}
 
+    async def send_text_and_query(
+        self,
+        text: str,
+        file_name: str,
+        prompt: str,
+        stream: bool = False,
+        assistant_id: Optional[str] = None,
+        sha256: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Send locally extracted document text inline in the chat message.
+
+        Skips the files API entirely: no upload, no ingestion wait and no 8024 retries.
+        With ``sha256`` (of the source document) the answer goes through the result cache.
+        """
+        if use_cache and not stream:
+            hit = await self.cached_result(sha256, prompt, assistant_id)
+            if hit is not None:
+                return hit
+        block = f"Contenido del archivo {file_name}:\n```\n{text}\n```"
+        content = (
+            prompt.replace("{file}", block)
+            if "{file}" in prompt
+            else f"{prompt}\n\n{block}"
+        )
+        aid = assistant_id or self.assistant_id
+        try:
+            self.metrics["inline_text_used"] += 1
+        except Exception:
+            pass
+        report_stage("chatting")
+        try:
+            resp = await self.processor.process(aid, content, stream=stream)
+            if isinstance(resp, dict):
+                resp.setdefault("inline_text", True)
+            if not stream:
+                await self._store_result(sha256, prompt, aid, resp)
+            return resp
+        except Exception as e:
+            logger.warning("Chat exception (inline text): %s", e)
+            return {"error": "chat_failed", "detail": str(e)}
+
     async def upload_bytes(
         self,
-        data: bytes,
+        data: Union[bytes, Blob],
         file_name: str,
         folder: Optional[str] = None,
         alias: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Upload in-memory bytes to SAIA files endpoint (same semantics as upload_file)."""
+        """Upload in-memory bytes (or a job Blob) to SAIA files endpoint (same semantics as upload_file).
+
+        Blobs are sent through a file object so httpx streams them without copying
+        the buffer, and their precomputed sha256 is reused.
+        """
         # create a temporary path-like name for content-type guess
         fake_path = file_name or "file"
-        file_size = len(data)
-        file_hash = self._sha256(data)
+        if isinstance(data, Blob):
+            file_size = data.size
+            file_hash = data.sha256
+        else:
+            file_size = len(data)
+            file_hash = self._sha256(data)
         content_type = self._guess_content_type(fake_path)
 
         headers = dict(self.default_headers)
@@ -294,15 +507,15 @@ class SAIAConsoleClient:
         headers["fileName"] = self._sanitize_header_value(alias_used)
         headers["folder"] = self._sanitize_header_value(folder or "test1")
 
-        cache_key = f"{alias_used}:{file_hash}"
-        cached = self._upload_cache.get(cache_key)
-        if cached:
-            logger.debug("Using cached upload result for %s", cache_key)
-            return dict(cached)
+        reused = await self._lookup_upload(file_hash, folder, file_name)
+        if reused is not None:
+            return reused
+        report_stage("uploading")
 
+        body = data.open() if isinstance(data, Blob) else data
         try:
             client = self._get_client()
-            files = {"file": (file_name, data, content_type)}
+            files = {"file": (file_name, body, content_type)}
             logger.debug(
                 "Uploading bytes to %s size=%d headers=%s",
                 f"{self.base_url}/v1/files",
@@ -311,7 +524,10 @@ class SAIAConsoleClient:
             )
             try:
                 resp = await client.post(
-                    f"{self.base_url}/v1/files", headers=headers, files=files
+                    f"{self.base_url}/v1/files",
+                    headers=headers,
+                    files=files,
+                    timeout=self._timeout,
                 )
             except Exception as exc:
                 logger.exception("Error de red en solicitud (bytes): %s", exc)
@@ -319,7 +535,7 @@ class SAIAConsoleClient:
             status = resp.status_code
             text = resp.text
             try:
-                j = resp.json()
+                j = loads(resp.content)
             except Exception:
                 j = None
 
@@ -330,6 +546,7 @@ class SAIAConsoleClient:
                 "file_alias_used": alias_used,
                 "file_size": file_size,
                 "file_sha256": file_hash,
+                "uploaded_at": time.time(),
             }
             if j is not None:
                 if isinstance(j, dict):
@@ -344,15 +561,155 @@ class SAIAConsoleClient:
                     "Upload (bytes) returned status %s: %s", status, text[:400]
                 )
             else:
+                # remembered for reuse once a chat finds it ingested
+                result["upload_folder"] = folder or "test1"
+            return result
+        except (httpx.RequestError,) as re:
+            logger.warning("Upload (bytes) request error: %s", re)
+            return {
+                "error": "request_error",
+                "detail": str(re),
+                "file_name_used": file_name,
+                "file_alias_used": alias_used,
+            }
+        except Exception as e:
+            logger.exception("Unexpected error during upload (bytes): %s", e)
+            return {
+                "error": "upload_failed",
+                "detail": str(e),
+                "file_name_used": file_name,
+                "file_alias_used": alias_used,
+            }
+        finally:
+            if body is not data:
                 try:
-                    self._upload_cache[cache_key] = dict(result)
-                    if len(self._upload_cache) > 256:
-                        self._upload_cache.pop(next(iter(self._upload_cache)))
+                    body.close()
                 except Exception:
                     pass
+
+    @staticmethod
+    def _multipart_parts(file_name: str, content_type: str) -> tuple:
+        """Return (boundary, head, tail) framing a single 'file' multipart field."""
+        boundary = uuid.uuid4().hex
+        # same escaping httpx applies to filenames in Content-Disposition
+        quoted = file_name.replace("\\", "\\\\").replace('"', "%22")
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+        return boundary, head, tail
+
+    async def upload_chunks(
+        self,
+        chunks: AsyncIterator[bytes],
+        file_name: str,
+        folder: Optional[str] = None,
+        alias: Optional[str] = None,
+        size: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sha256: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Stream an upload to SAIA files endpoint chunk by chunk.
+
+        The multipart body is generated on the fly and the sha256 is updated as
+        each chunk goes out, so memory stays flat regardless of the file size.
+        When ``size`` is known the request carries an exact Content-Length,
+        otherwise it is sent with chunked transfer encoding. Passing a known
+        ``sha256`` lets the upload be skipped when the same bytes were already
+        ingested (the chunks are then never consumed).
+        """
+        fake_path = file_name or "file"
+        content_type = self._guess_content_type(fake_path)
+        alias_used = alias or os.path.splitext(fake_path)[0]
+
+        if sha256:
+            reused = await self._lookup_upload(sha256, folder, file_name)
+            if reused is not None:
+                return reused
+        report_stage("uploading")
+
+        headers = dict(self.default_headers)
+        headers["Accept"] = "application/json"
+        headers["fileName"] = self._sanitize_header_value(alias_used)
+        headers["folder"] = self._sanitize_header_value(folder or "test1")
+
+        boundary, head, tail = self._multipart_parts(fake_path, content_type)
+        headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+        if size is not None:
+            headers["Content-Length"] = str(len(head) + size + len(tail))
+
+        hasher = hashlib.sha256()
+        sent = {"bytes": 0}
+
+        async def body() -> AsyncIterator[bytes]:
+            yield head
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                sent["bytes"] += len(chunk)
+                if max_bytes is not None and sent["bytes"] > max_bytes:
+                    raise UploadTooLarge(f"El archivo excede {max_bytes} bytes")
+                hasher.update(chunk)
+                yield chunk
+            yield tail
+
+        try:
+            client = self._get_client()
+            logger.debug(
+                "Streaming upload to %s size=%s headers=%s",
+                f"{self.base_url}/v1/files",
+                size,
+                {k: (v if k != "Authorization" else "Bearer *****") for k, v in headers.items()},
+            )
+            resp = await client.post(
+                f"{self.base_url}/v1/files",
+                headers=headers,
+                content=body(),
+                timeout=self._timeout,
+            )
+            status = resp.status_code
+            text = resp.text
+            try:
+                j = loads(resp.content)
+            except Exception:
+                j = None
+
+            result: Dict[str, Any] = {
+                "status_code": status,
+                "headers": dict(resp.headers),
+                "file_name_used": file_name,
+                "file_alias_used": alias_used,
+                "file_size": sent["bytes"],
+                "file_sha256": hasher.hexdigest(),
+                "uploaded_at": time.time(),
+            }
+            if j is not None:
+                if isinstance(j, dict):
+                    result.update(j)
+                else:
+                    result["json"] = j
+            else:
+                result["text"] = text
+
+            if status >= 400:
+                logger.warning(
+                    "Upload (stream) returned status %s: %s", status, text[:400]
+                )
+            else:
+                # remembered for reuse once a chat finds it ingested
+                result["upload_folder"] = folder or "test1"
             return result
+        except UploadTooLarge as e:
+            return {
+                "error": "file_too_large",
+                "detail": str(e),
+                "file_name_used": file_name,
+                "file_alias_used": alias_used,
+            }
         except (httpx.RequestError,) as re:
-            logger.warning("Upload (bytes) request error: %s", re)
+            logger.warning("Upload (stream) request error: %s", re)
             return {
                 "error": "request_error",
                 "detail": str(re),
@@ -360,7 +717,7 @@ class SAIAConsoleClient:
                 "file_alias_used": alias_used,
             }
         except Exception as e:
-            logger.exception("Unexpected error during upload (bytes): %s", e)
+            logger.exception("Unexpected error during upload (stream): %s", e)
             return {
                 "error": "upload_failed",
                 "detail": str(e),
@@ -370,26 +727,109 @@ class SAIAConsoleClient:
 
     async def send_bytes_and_query(
         self,
-        data: bytes,
+        data: Union[bytes, Blob],
         file_name: str,
         prompt: str,
         folder: Optional[str] = None,
         stream: bool = False,
         alias: Optional[str] = None,
         assistant_id: Optional[str] = None,
+        use_cache: bool = True,
     ) -> Dict[str, Any]:
-        """Upload in-memory bytes then call chat referencing that uploaded
-        alias/file id. Mirrors send_pdf_and_query semantics.
+        """Upload in-memory bytes (or a job Blob, without copying it) then call
+        chat referencing that uploaded alias/file id. Mirrors send_pdf_and_query semantics.
+
+        A cached answer for the same bytes, prompt and assistant is returned without
+        any network call; ``use_cache=False`` skips the lookup and refreshes the entry.
         """
         alias_used = alias or os.path.splitext(os.path.basename(file_name))[0]
-        up = await self.upload_bytes(
-            data, file_name=file_name, folder=folder, alias=alias_used
+        file_hash = data.sha256 if isinstance(data, Blob) else self._sha256(data)
+        if use_cache and not stream:
+            hit = await self.cached_result(file_hash, prompt, assistant_id)
+            if hit is not None:
+                return hit
+
+        async def run() -> Dict[str, Any]:
+            up = await self.upload_bytes(
+                data, file_name=file_name, folder=folder, alias=alias_used
+            )
+            res = await self._query_uploaded(
+                up, prompt, alias=alias_used, stream=stream, assistant_id=assistant_id
+            )
+            if not stream:
+                await self._store_result(file_hash, prompt, assistant_id, res)
+            return res
+
+        return await self._coalesce(
+            ("upload+chat", file_hash, prompt, assistant_id or self.assistant_id,
+             folder or "test1", stream),
+            run,
+        )
+
+    async def _coalesce(self, key: tuple, fn) -> Dict[str, Any]:
+        """Run ``fn`` through the single-flight layer; each caller gets its own copy of a dict result."""
+        if self._single_flight is None:
+            return await fn()
+        res = await self._single_flight.do(key, fn)
+        return dict(res) if isinstance(res, dict) else res
+
+    async def query_uploaded(
+        self,
+        up: Any,
+        prompt: str,
+        alias: str,
+        stream: bool = False,
+        assistant_id: Optional[str] = None,
+        use_cache: bool = True,
+        folder: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Call chat referencing an already uploaded file (result of an upload_* call),
+        retrying while SAIA reports 8024 (see IngestionRetryScheduler).
+
+        ``folder`` is the one the file was uploaded to; it is part of the
+        single-flight key and defaults to the one recorded in ``up``.
+        """
+        file_hash = up.get("file_sha256") if isinstance(up, dict) else None
+        if folder is None and isinstance(up, dict):
+            folder = up.get("upload_folder")
+        if not file_hash:
+            return await self._query_uploaded(
+                up, prompt, alias=alias, stream=stream, assistant_id=assistant_id
+            )
+        if use_cache and not stream:
+            hit = await self.cached_result(file_hash, prompt, assistant_id)
+            if hit is not None:
+                return hit
+
+        async def run() -> Dict[str, Any]:
+            res = await self._query_uploaded(
+                up, prompt, alias=alias, stream=stream, assistant_id=assistant_id
+            )
+            if not stream:
+                await self._store_result(file_hash, prompt, assistant_id, res)
+            return res
+
+        return await self._coalesce(
+            ("chat", file_hash, prompt, assistant_id or self.assistant_id,
+             folder or "test1", stream),
+            run,
         )
 
+    async def _query_uploaded(
+        self,
+        up: Any,
+        prompt: str,
+        alias: str,
+        stream: bool = False,
+        assistant_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        alias_used = alias
         file_id = alias_used
         file_name_used = alias_used
         if isinstance(up, dict):
             file_name_used = up.get("file_alias_used") or file_name_used
+            # deduplicated uploads are referenced by the alias they were first ingested with
+            file_id = file_name_used
 
         if isinstance(up, dict):
             fid = up.get("id") or up.get("fileId") or up.get("file_id")
@@ -399,9 +839,63 @@ class SAIAConsoleClient:
             if not file_id and (fid or dfid):
                 file_id = fid or dfid
 
-        max_retries = 5
-        delay = 0.2
-        for attempt in range(1, max_retries + 1):
+        return await self._chat_with_retries(
+            prompt,
+            file_id,
+            [up] if isinstance(up, dict) else [],
+            stream=stream,
+            assistant_id=assistant_id,
+            file_name_used=file_name_used,
+        )
+
+    async def query_uploaded_many(
+        self,
+        ups: List[Dict[str, Any]],
+        prompt: str,
+        stream: bool = False,
+        assistant_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """One chat call referencing every uploaded file (results of upload_* calls)."""
+        file_ids = [
+            up.get("file_alias_used") or up.get("id") or up.get("fileId") for up in ups
+        ]
+        return await self._chat_with_retries(
+            prompt,
+            [fid for fid in file_ids if fid],
+            ups,
+            stream=stream,
+            assistant_id=assistant_id,
+        )
+
+    async def _chat_with_retries(
+        self,
+        prompt: str,
+        file_id: Union[str, Sequence[str]],
+        ups: List[Dict[str, Any]],
+        stream: bool = False,
+        assistant_id: Optional[str] = None,
+        file_name_used: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        # Retry 8024 (ingestion still running) on a schedule learned per file type/size.
+        # With several files, ingestion time is driven by the largest and the last uploaded.
+        file_type = None
+        file_size = None
+        uploaded_at = time.time()
+        fresh = True
+        if ups:
+            largest = max(ups, key=lambda u: u.get("file_size") or 0)
+            file_type = os.path.splitext(str(largest.get("file_name_used") or ""))[1]
+            file_size = largest.get("file_size")
+            uploaded_at = max(u.get("uploaded_at") or 0 for u in ups) or uploaded_at
+            # reused uploads were ingested long ago: their timing says nothing about ingestion
+            fresh = not all(u.get("reused") for u in ups)
+        plan = self.retry_scheduler.plan(file_type, file_size)
+        retries = 0
+        while True:
+            report_stage("chatting")
+            # ingestion latency ends when the accepted attempt is sent, not when the
+            # answer is back: the generation time says nothing about ingestion
+            sent_after = max(time.time() - uploaded_at, 0.0)
             resp = await self.chat_with_file(
                 prompt,
                 file_id,
@@ -409,25 +903,34 @@ class SAIAConsoleClient:
                 assistant_id=assistant_id,
                 file_name_used=file_name_used,
             )
+            elapsed = max(time.time() - uploaded_at, 0.0)
             if isinstance(resp, dict) and (
                 resp.get("error") == "document_no_pages"
                 or str(resp.get("code") or resp.get("status_code") or "") == "8024"
             ):
-                if attempt == max_retries:
-                    # final attempt exhausted: wait briefly to allow ingestion to finish, then return
-                    try:
-                        await asyncio.sleep(delay)
-                    except Exception:
-                        pass
+                delay = plan.next_delay(elapsed)
+                if delay is None:
+                    if fresh:
+                        self.retry_scheduler.record(
+                            file_type, file_size, sent_after, retries, exhausted=True
+                        )
                     return resp
+                retries += 1
+                # SAIA is still ingesting the file: wait for the next scheduled attempt
+                report_stage("ingesting")
                 try:
                     await asyncio.sleep(delay)
                 except Exception:
                     pass
-                delay *= 1.7
                 continue
+            if fresh:
+                self.retry_scheduler.record(file_type, file_size, sent_after, retries)
+                if not (isinstance(resp, dict) and resp.get("error")):
+                    # SAIA answered about the files: they are ingested and safe to reuse
+                    for up in ups:
+                        if not up.get("reused"):
+                            await self._remember_upload(up)
             return resp
-        return {"error": "chat_failed", "detail": "Retries exhausted"}
 
     async def send_pdf_and_query(
         self,
@@ -449,54 +952,19 @@ class SAIAConsoleClient:
             file_path, file_name=None, folder=folder, alias=alias_used
         )
 
-        # Prefer referencing by alias to match Postman behavior strictly
-        file_id = alias_used
-        file_name_used = alias_used
-        if isinstance(up, dict):
-            file_name_used = up.get("file_alias_used") or file_name_used
-
-        # Optional: if the server returned an explicit id, keep it as a fallback only
-        if isinstance(up, dict):
-            fid = up.get("id") or up.get("fileId") or up.get("file_id")
-            dfid = (
-                up.get("dataFileId") or up.get("data_file_id") or up.get("datafileid")
-            )
-            if not file_id and (fid or dfid):
-                file_id = fid or dfid
-
-        # Skip pre-ingestion polling: attempt chat immediately; handle 8024 with quick retries
-        max_retries = 5
-        delay = 0.2
-        for attempt in range(1, max_retries + 1):
-            resp = await self.chat_with_file(
-                prompt,
-                file_id,
-                stream=stream,
-                assistant_id=assistant_id,
-                file_name_used=file_name_used,
-            )
-            if isinstance(resp, dict) and (
-                resp.get("error") == "document_no_pages"
-                or str(resp.get("code") or resp.get("status_code") or "") == "8024"
-            ):
-                if attempt == max_retries:
-                    return resp
-                import asyncio
-
-                await asyncio.sleep(delay)
-                delay *= 1.7
-                continue
-            return resp
-        return {"error": "chat_failed", "detail": "Retries exhausted"}
+        # Prefer referencing by alias to match Postman behavior strictly;
+        # skip pre-ingestion polling and handle 8024 with scheduled retries
+        return await self.query_uploaded(
+            up,
+            prompt,
+            alias=alias_used,
+            stream=stream,
+            assistant_id=assistant_id,
+            folder=folder,
+        )
 
     async def aclose(self) -> None:
-        """Close the instance httpx client if created."""
-        try:
-            if hasattr(self, "_client") and self._client is not None:
-                try:
-                    await self._client.aclose()
-                except Exception:
-                    pass
-                self._client = None
-        except Exception:
-            pass
+        """Release the client; connections belong to the shared transport_manager,
+        which is closed once at shutdown.
+        """
+        return None
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una única tarea compartida.
+
+    Every caller awaits the shared task through ``asyncio.shield``: a caller
+    that is cancelled only stops waiting, and the upstream work is cancelled
+    once the last interested caller has gone. Counters go to ``metrics`` as
+    ``<prefix>_leaders``, ``<prefix>_coalesced`` and ``<prefix>_coalesce_rate``.
+    """
+
+    def __init__(
+        self, metrics: Optional[Dict[str, Any]] = None, prefix: str = "singleflight"
+    ) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self.metrics = metrics if metrics is not None else {}
+        self.prefix = prefix
+        for name in ("leaders", "coalesced", "coalesce_rate"):
+            self.metrics.setdefault(f"{prefix}_{name}", 0)
+
+    def _count(self, name: str) -> None:
+        self.metrics[f"{self.prefix}_{name}"] += 1
+        leaders = self.metrics[f"{self.prefix}_leaders"]
+        coalesced = self.metrics[f"{self.prefix}_coalesced"]
+        self.metrics[f"{self.prefix}_coalesce_rate"] = round(
+            coalesced / max(leaders + coalesced, 1), 4
+        )
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        # a call being cancelled can't be joined: start a fresh one
+        if call is None or call.task.done() or call.abandoned:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+
+            def _forget(_task, key=key, call=call):
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+            call.task.add_done_callback(_forget)
+            self._count("leaders")
+        else:
+            self._count("coalesced")
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # every caller went away: stop the upstream work
+                call.abandoned = True
+                call.task.cancel()
@@ -0,0 +1,230 @@
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional
+
+from app.codec import loads
+from app.services.ai.decoder import answer_text
+
+logger = logging.getLogger("app.services.ai.sse")
+
+_LF = 0x0A
+_CR = 0x0D
+_COLON = 0x3A
+
+
+class SSEEvent:
+    """Un evento SSE completo; ``data`` son los bytes tal cual (líneas unidas con \\n)."""
+
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event: str, data: bytes, id: Optional[str] = None) -> None:
+        self.event = event
+        self.data = data
+        self.id = id
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data[:60]!r}, id={self.id!r})"
+
+
+class TextDelta:
+    """Fragmento de texto de la respuesta del asistente."""
+
+    __slots__ = ("text", "index")
+
+    def __init__(self, text: str, index: int = 0) -> None:
+        self.text = text
+        self.index = index
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, TextDelta)
+            and self.text == other.text
+            and self.index == other.index
+        )
+
+    def __repr__(self) -> str:
+        return f"TextDelta({self.text!r}, index={self.index})"
+
+
+class SSEParser:
+    """Parser SSE incremental a nivel de bytes.
+
+    Works on raw bytes as they come off the socket: splits lines (``\\n``,
+    ``\\r\\n`` or ``\\r``, also across chunk boundaries), joins multi-line
+    ``data:`` fields and tracks ``event:`` / ``id:`` without decoding the
+    payload to str; the JSON parser takes the bytes directly.
+    """
+
+    __slots__ = ("_buf", "_data", "_event", "last_id")
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._data: List[bytes] = []
+        self._event: Optional[str] = None
+        self.last_id: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Consume a chunk of bytes and return the events it completed."""
+        buf = self._buf
+        buf += chunk
+        events: List[SSEEvent] = []
+        if _CR in buf:
+            self._feed_cr(events)
+            return events
+        if _LF not in chunk:
+            return events
+        # common case (\n only): one C-level split, then the lines in a tight loop
+        lines = bytes(buf).split(b"\n")
+        self._buf = bytearray(lines.pop())
+        data = self._data
+        for line in lines:
+            if line[:6] == b"data: ":
+                data.append(line[6:])
+            elif not line:
+                if data:
+                    events.append(
+                        SSEEvent(
+                            self._event or "message",
+                            data[0] if len(data) == 1 else b"\n".join(data),
+                            self.last_id,
+                        )
+                    )
+                    data = self._data = []
+                self._event = None
+            else:
+                self._line(line, events)
+                data = self._data
+        return events
+
+    def _feed_cr(self, events: List[SSEEvent]) -> None:
+        # \r\n or bare \r line endings, possibly split between two chunks
+        buf = self._buf
+        start = 0
+        n = len(buf)
+        while start < n:
+            nl = buf.find(b"\n", start)
+            cr = buf.find(b"\r", start, nl if nl != -1 else n)
+            if cr != -1:
+                if cr + 1 == n:
+                    # a lone \r at the end may be the first half of \r\n
+                    break
+                nxt = cr + 2 if buf[cr + 1] == _LF else cr + 1
+                self._line(bytes(buf[start:cr]), events)
+                start = nxt
+                continue
+            if nl == -1:
+                break
+            self._line(bytes(buf[start:nl]), events)
+            start = nl + 1
+        if start:
+            del buf[:start]
+
+    def flush(self) -> List[SSEEvent]:
+        """End of stream: handle a last unterminated line and event (servers often omit them)."""
+        events: List[SSEEvent] = []
+        if self._buf:
+            line = bytes(self._buf.rstrip(b"\r"))
+            self._buf.clear()
+            self._line(line, events)
+        self._line(b"", events)
+        return events
+
+    def _line(self, line: bytes, events: List[SSEEvent]) -> None:
+        if not line:
+            # blank line: dispatch the event being built, if it has data
+            if self._data:
+                data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+                events.append(SSEEvent(self._event or "message", data, self.last_id))
+            self._data = []
+            self._event = None
+            return
+        if line[0] == _COLON:
+            return  # comment / keep-alive
+        colon = line.find(b":")
+        if colon == -1:
+            field, value = line, b""
+        else:
+            field = line[:colon]
+            value = line[colon + 2:] if line[colon + 1:colon + 2] == b" " else line[colon + 1:]
+        if field == b"data":
+            self._data.append(value)
+        elif field == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif field == b"id":
+            if b"\0" not in value:
+                self.last_id = value.decode("utf-8", "replace")
+        # "retry" and unknown fields are ignored
+
+
+class DeltaAssembler:
+    """Convierte eventos de chat en streaming (estilo OpenAI) en TextDelta y acumula el texto."""
+
+    __slots__ = ("parts", "finish_reason", "done", "error", "bad_events")
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.done = False
+        self.error: Any = None
+        self.bad_events = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, ev: SSEEvent) -> Optional[TextDelta]:
+        data = ev.data
+        if data[:1] != b"{" and data.strip() == b"[DONE]":
+            self.done = True
+            return None
+        try:
+            obj = loads(data)
+        except ValueError:
+            self.bad_events += 1
+            logger.debug("Fragmento SSE no es JSON: %r", data[:50])
+            return None
+        index = 0
+        try:
+            # fast path: choices[0].delta.content
+            c0 = obj["choices"][0]
+            text = c0["delta"]["content"]
+            index = c0.get("index") or 0
+            if c0.get("finish_reason"):
+                self.finish_reason = c0["finish_reason"]
+        except (KeyError, IndexError, TypeError):
+            text = self._slow_text(obj)
+        if not text or not isinstance(text, str):
+            # role-only, finish and empty deltas carry no text
+            return None
+        self.parts.append(text)
+        return TextDelta(text, index)
+
+    def _slow_text(self, obj: Any) -> Optional[str]:
+        # other shapes: message / text choices, errors, {"text": ...}-style objects
+        if not isinstance(obj, dict):
+            return None
+        choices = obj.get("choices")
+        if choices and isinstance(choices[0], dict) and choices[0].get("finish_reason"):
+            self.finish_reason = choices[0]["finish_reason"]
+        elif not choices and obj.get("error") is not None:
+            self.error = obj
+            return None
+        return answer_text(obj)
+
+
+async def iter_text_deltas(
+    chunks: AsyncIterable[bytes], assembler: Optional[DeltaAssembler] = None
+) -> AsyncIterator[TextDelta]:
+    """Parse a byte stream of chat SSE events into TextDelta items, stopping at [DONE] or an error."""
+    asm = assembler if assembler is not None else DeltaAssembler()
+    parser = SSEParser()
+    async for chunk in chunks:
+        for ev in parser.feed(chunk):
+            delta = asm.feed(ev)
+            if delta is not None:
+                yield delta
+            elif asm.done or asm.error is not None:
+                return
+    for ev in parser.flush():
+        delta = asm.feed(ev)
+        if delta is not None:
+            yield delta
@@ -0,0 +1,89 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from app.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger("app.services.ai.upload_index")
+
+DEFAULT_INDEX_PATH = "/tmp/saia_demo/upload_index.sqlite3"
+# SAIA keeps uploaded files for a limited time; keep entries no longer than that
+DEFAULT_INDEX_TTL = 24 * 3600
+
+
+class UploadIndex(SQLiteStore):
+    """Índice direccionado por contenido: sha256 -> archivo ya subido e ingerido en SAIA.
+
+    Lets a new upload of identical bytes reuse the earlier alias instead of
+    uploading again and waiting for ingestion.
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS uploads (
+        sha256 TEXT NOT NULL,
+        folder TEXT NOT NULL,
+        alias TEXT NOT NULL,
+        file_id TEXT,
+        size INTEGER,
+        uploaded_at REAL NOT NULL,
+        PRIMARY KEY (sha256, folder)
+    );
+    CREATE INDEX IF NOT EXISTS uploads_uploaded_at ON uploads (uploaded_at);
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        super().__init__(path or os.environ.get("UPLOAD_INDEX_PATH") or DEFAULT_INDEX_PATH)
+        if ttl is None:
+            try:
+                ttl = float(os.environ.get("UPLOAD_INDEX_TTL", DEFAULT_INDEX_TTL))
+            except Exception:
+                ttl = DEFAULT_INDEX_TTL
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls) -> Optional["UploadIndex"]:
+        """Build the index unless disabled with UPLOAD_INDEX_PATH set to an empty value."""
+        if os.environ.get("UPLOAD_INDEX_PATH", None) == "":
+            return None
+        return cls()
+
+    def lookup(self, sha256: str, folder: str) -> Optional[Dict[str, Any]]:
+        try:
+            rows = self.execute(
+                "SELECT alias, file_id, size, uploaded_at FROM uploads "
+                "WHERE sha256 = ? AND folder = ? AND uploaded_at >= ?",
+                (sha256, folder, time.time() - self.ttl),
+            )
+        except Exception as e:
+            logger.warning("Upload index lookup failed: %s", e)
+            return None
+        if not rows:
+            return None
+        alias, file_id, size, uploaded_at = rows[0]
+        return {
+            "alias": alias,
+            "file_id": file_id,
+            "size": size,
+            "uploaded_at": uploaded_at,
+        }
+
+    def record(
+        self,
+        sha256: str,
+        folder: str,
+        alias: str,
+        file_id: Optional[str] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        now = time.time()
+        try:
+            self.execute(
+                "INSERT OR REPLACE INTO uploads "
+                "(sha256, folder, alias, file_id, size, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (sha256, folder, alias, file_id, size, now),
+            )
+            self.execute("DELETE FROM uploads WHERE uploaded_at < ?", (now - self.ttl,))
+        except Exception as e:
+            logger.warning("Upload index record failed: %s", e)
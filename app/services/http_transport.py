@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger("app.services.http_transport")
+
+# Optional HTTP/2 support (httpx needs the 'h2' package for it)
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def _origin(url: Any) -> str:
+    u = httpx.URL(str(url))
+    port = u.port or (443 if u.scheme == "https" else 80)
+    return f"{u.scheme}://{u.host}:{port}"
+
+
+class _PoolStats:
+    __slots__ = ("requests", "connects", "connect_time_total", "connect_time_max")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connects = 0
+        self.connect_time_total = 0.0
+        self.connect_time_max = 0.0
+
+
+class TransportManager:
+    """Pools de conexiones HTTP compartidos por proceso, uno por origen (esquema, host y puerto).
+
+    Every service borrows its ``httpx.AsyncClient`` from here, so one process
+    keeps one warm pool per upstream host instead of one per service or per
+    temporary client. HTTP/2 is used when ``HTTPX_HTTP2=1`` and ``h2`` is
+    installed. Connect time (TCP + TLS) is measured through the httpcore
+    ``trace`` extension.
+
+    Clients are bound to the event loop that created them; when called from a
+    different loop (tests, TestClient) the pools are rebuilt for that loop and
+    the previous ones are closed: on their own loop if it still runs, socket
+    by socket if it is already closed, otherwise in ``aclose``.
+    """
+
+    def __init__(
+        self,
+        http2: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+    ) -> None:
+        if http2 is None:
+            http2 = os.environ.get("HTTPX_HTTP2", "0").strip().lower() in ("1", "true", "yes", "on")
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTPX_HTTP2 activo pero falta el paquete 'h2'; se usará HTTP/1.1")
+            http2 = False
+        self.http2 = bool(http2)
+        self.limits = httpx.Limits(
+            max_connections=max_connections or _env_int("HTTPX_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=max_keepalive_connections
+            or _env_int("HTTPX_MAX_KEEPALIVE", 20),
+            keepalive_expiry=keepalive_expiry
+            if keepalive_expiry is not None
+            else _env_float("HTTPX_KEEPALIVE_EXPIRY", 30.0),
+        )
+        # per-request timeouts override this default where a service needs tighter bounds
+        self.timeout = httpx.Timeout(
+            connect=_env_float("HTTPX_CONNECT_TIMEOUT", 10.0),
+            read=_env_float("HTTPX_READ_TIMEOUT", 60.0),
+            write=_env_float("HTTPX_WRITE_TIMEOUT", 60.0),
+            pool=_env_float("HTTPX_POOL_TIMEOUT", 5.0),
+        )
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, _PoolStats] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # clients left behind by a loop change, waiting to be closed
+        self._retired: List[Tuple[Optional[asyncio.AbstractEventLoop], httpx.AsyncClient]] = []
+        self.loop_changes = 0
+        self._ping_timeout = httpx.Timeout(_env_float("HTTP_WARMUP_TIMEOUT", 5.0))
+        self.warmup: Dict[str, Any] = {}
+        self.keepalive_pings = 0
+
+    def _stat(self, origin: str) -> _PoolStats:
+        st = self._stats.get(origin)
+        if st is None:
+            st = self._stats[origin] = _PoolStats()
+        return st
+
+    def _make_client(self, origin: str) -> httpx.AsyncClient:
+        stats = self._stat(origin)
+
+        async def on_request(request: httpx.Request) -> None:
+            stats.requests += 1
+            started: Dict[str, float] = {}
+
+            async def trace(event: str, info: Dict[str, Any]) -> None:
+                # a new connection is opened: connect_tcp (+ start_tls for https)
+                if event == "connection.connect_tcp.started":
+                    started["t"] = time.perf_counter()
+                elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                    if "t" not in started:
+                        return
+                    if event == "connection.connect_tcp.complete" and request.url.scheme == "https":
+                        return
+                    elapsed = time.perf_counter() - started.pop("t")
+                    stats.connects += 1
+                    stats.connect_time_total += elapsed
+                    stats.connect_time_max = max(stats.connect_time_max, elapsed)
+
+            request.extensions = {**request.extensions, "trace": trace}
+
+        return httpx.AsyncClient(
+            http2=self.http2,
+            timeout=self.timeout,
+            limits=self.limits,
+            # Don't trust env (avoid proxy auto-detection on Heroku dynos)
+            trust_env=False,
+            follow_redirects=True,
+            event_hooks={"request": [on_request]},
+        )
+
+    def get(self, url: Any) -> httpx.AsyncClient:
+        """Shared client for the origin of ``url``; call from inside the event loop that will use it."""
+        origin = _origin(url)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        retired = False
+        with self._lock:
+            if loop is not None and self._loop is not loop:
+                if self._clients:
+                    # clients (and their sockets) belong to the previous loop: start over
+                    logger.debug("Nuevo event loop detectado; se recrean los pools HTTP")
+                    self._retired.extend((self._loop, c) for c in self._clients.values())
+                    self._clients = {}
+                    self.loop_changes += 1
+                    retired = True
+                self._loop = loop
+            client = self._clients.get(origin)
+            if client is None or client.is_closed:
+                client = self._clients[origin] = self._make_client(origin)
+        if retired:
+            self._close_retired()
+        return client
+
+    def _close_retired(self) -> None:
+        with self._lock:
+            retired, self._retired = self._retired, []
+        pending = []
+        for loop, client in retired:
+            if loop is None or loop.is_closed():
+                # aclose() can't run on a closed loop: dropping the last reference
+                # lets the client and its sockets be garbage collected
+                continue
+            if loop.is_running():
+                # its loop is alive in another thread: close it there
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                # idle loop that may run again; aclose() takes care of it
+                pending.append((loop, client))
+        if pending:
+            with self._lock:
+                self._retired.extend(pending)
+
+    @staticmethod
+    def _pool_gauges(client: httpx.AsyncClient) -> Dict[str, Any]:
+        # httpcore internals; defensive so a library upgrade only loses the gauges
+        try:
+            pool = client._transport._pool
+            conns = list(pool.connections)
+            requests = list(getattr(pool, "_requests", []))
+            return {
+                "connections": len(conns),
+                "active": sum(1 for c in conns if not c.is_idle()),
+                "idle": sum(1 for c in conns if c.is_idle()),
+                "waiters": sum(1 for r in requests if r.is_queued()),
+            }
+        except Exception:
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "pools": {},
+            "warmup": self.warmup,
+            "keepalive_pings": self.keepalive_pings,
+            "loop_changes": self.loop_changes,
+        }
+        with self._lock:
+            clients = dict(self._clients)
+            stats = dict(self._stats)
+        for origin, st in stats.items():
+            entry: Dict[str, Any] = {
+                "requests": st.requests,
+                "connects": st.connects,
+                "connect_time_avg": round(st.connect_time_total / st.connects, 4)
+                if st.connects
+                else None,
+                "connect_time_max": round(st.connect_time_max, 4),
+            }
+            if origin in clients:
+                entry.update(self._pool_gauges(clients[origin]))
+            out["pools"][origin] = entry
+        return out
+
+    async def _ping(self, origin: str, count: int) -> int:
+        """Send ``count`` concurrent HEAD requests to the origin; returns how many got a response."""
+        client = self.get(origin)
+
+        async def one() -> bool:
+            try:
+                # any status will do: the point is the connection, not the resource
+                await client.head(origin + "/", timeout=self._ping_timeout)
+                return True
+            except Exception as e:
+                logger.debug("Ping HTTP a %s falló: %s", origin, e)
+                return False
+
+        results = await asyncio.gather(*[one() for _ in range(max(count, 1))])
+        return sum(1 for ok in results if ok)
+
+    async def warm_up(self, urls: Iterable[Any], connections: int) -> Dict[str, Any]:
+        """Open ``connections`` pooled connections to each distinct origin among ``urls``.
+
+        Concurrent requests force the pool to open one connection each; they stay
+        idle in the pool for the first real requests. Returns timings per origin.
+        """
+        origins = sorted({_origin(u) for u in urls})
+        report: Dict[str, Any] = {}
+        for origin in origins:
+            st = self._stat(origin)
+            before_connects, before_time = st.connects, st.connect_time_total
+            t0 = time.perf_counter()
+            ok = await self._ping(origin, connections)
+            opened = st.connects - before_connects
+            report[origin] = {
+                "requested": connections,
+                "responses": ok,
+                "connections_opened": opened,
+                "seconds": round(time.perf_counter() - t0, 4),
+                # what the first user request would have paid without the warm-up
+                "connect_time_avg": round((st.connect_time_total - before_time) / opened, 4)
+                if opened
+                else None,
+            }
+        self.warmup = report
+        return report
+
+    async def keepalive(self, urls: Iterable[Any], interval: float) -> None:
+        """Background loop: ping origins that saw no traffic in the last ``interval`` seconds,
+        so pooled connections are not dropped for idleness (``keepalive_expiry``)."""
+        origins = sorted({_origin(u) for u in urls})
+        seen = {o: self._stat(o).requests for o in origins}
+        while True:
+            await asyncio.sleep(interval)
+            for origin in origins:
+                st = self._stat(origin)
+                if st.requests == seen[origin]:
+                    idle = self._pool_gauges(self.get(origin)).get("idle") or 0
+                    if idle:
+                        await self._ping(origin, idle)
+                        self.keepalive_pings += idle
+                seen[origin] = st.requests
+
+    async def aclose(self) -> None:
+        with self._lock:
+            owned = [(self._loop, c) for c in self._clients.values()] + self._retired
+            self._clients = {}
+            self._retired = []
+            self._loop = None
+        current = asyncio.get_running_loop()
+        for loop, client in owned:
+            if loop is not None and loop.is_closed():
+                continue
+            if loop is None or loop is current or not loop.is_running():
+                coro = client.aclose()
+            else:
+                # transports must be closed from the thread running their loop
+                coro = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            try:
+                await coro
+            except Exception:
+                pass
+
+
+# one set of pools per process, shared by AIProcessor and SAIAConsoleClient
+transport_manager = TransportManager()
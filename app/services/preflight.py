@@ -0,0 +1,255 @@
+import asyncio
+import hashlib
+import io
+import logging
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Union
+
+from app.services.ai.cache import LRUCache
+
+logger = logging.getLogger("app.services.preflight")
+
+# Optional PDF reader
+PdfReader = None
+try:
+    import PyPDF2
+
+    PdfReader = getattr(PyPDF2, "PdfReader", None)
+except Exception:
+    PdfReader = None
+
+_PAGES_RE = re.compile(rb"/Type\s*/Pages\b")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+# how far around a /Type /Pages marker we look for its object boundaries
+_OBJ_WINDOW = 4096
+
+Source = Union[bytes, bytearray, str, int]
+
+
+def _result(ok: bool, method: str, pages: Optional[int] = None, **extra) -> Dict[str, Any]:
+    r: Dict[str, Any] = {"ok": ok, "method": method, "pages": pages}
+    r.update(extra)
+    return r
+
+
+def _no_pages(method: str, detail: str) -> Dict[str, Any]:
+    return _result(False, method, pages=0, error="document_no_pages", detail=detail)
+
+
+def structural_check(buf) -> Optional[Dict[str, Any]]:
+    """Fast check using the header, the xref/trailer pointer and the page tree /Count.
+
+    Returns None when the structure is inconclusive (e.g. page tree inside
+    compressed object streams or a damaged xref) so a full parse is needed.
+    """
+    size = len(buf)
+    if size < 200:
+        return _no_pages("structural", "El PDF parece vacío o demasiado pequeño.")
+    if buf[:4] != b"%PDF":
+        return _no_pages(
+            "structural", "El archivo no parece un PDF válido (sin encabezado %PDF)."
+        )
+    tail = bytes(buf[max(size - 2048, 0):])
+    if b"%%EOF" not in tail:
+        logger.debug("PDF parece no tener marcador EOF, pero se continuará (heurístico).")
+    if b"startxref" not in tail:
+        # no xref pointer: structure can't be trusted without a full parse
+        return None
+
+    best = None
+    for m in _PAGES_RE.finditer(buf):
+        start = max(m.start() - _OBJ_WINDOW, 0)
+        window = bytes(buf[start:m.end() + _OBJ_WINDOW])
+        pos = m.start() - start
+        # restrict to the enclosing object: from the last 'obj' to the next 'endobj'
+        obj_start = window.rfind(b" obj", 0, pos)
+        obj_end = window.find(b"endobj", pos)
+        body = window[obj_start if obj_start >= 0 else 0:obj_end if obj_end >= 0 else len(window)]
+        for c in _COUNT_RE.finditer(body):
+            n = int(c.group(1))
+            # the root of the page tree carries the largest /Count
+            if best is None or n > best:
+                best = n
+    if best is None:
+        return None
+    if best == 0:
+        return _no_pages("structural", "El PDF no contiene páginas.")
+    return _result(True, "structural", pages=best)
+
+
+def full_check(buf) -> Dict[str, Any]:
+    """Full parse with PyPDF2, falling back to byte heuristics when it is unavailable or fails."""
+    if PdfReader is not None:
+        try:
+            reader = PdfReader(io.BytesIO(buf) if not isinstance(buf, mmap.mmap) else buf)
+            num_pages = len(reader.pages)
+            if num_pages == 0:
+                return _no_pages("full", "El PDF no contiene páginas.")
+            return _result(True, "full", pages=num_pages)
+        except Exception:
+            logger.debug(
+                "PdfReader falló al analizar el PDF; se usará heurístico de bytes como fallback."
+            )
+    # '/Page' also matches '/Type /Page', so one search is enough
+    if buf.find(b"/Page") == -1:
+        return _no_pages(
+            "heuristic", "No se detectaron páginas en el PDF (comprobación heurística)."
+        )
+    return _result(True, "heuristic")
+
+
+class PdfPreflight:
+    """Validación previa de PDFs fuera del event loop, con presupuesto de tiempo y caché por sha256.
+
+    Checks run in a small thread pool. When the budget is exceeded the request
+    continues with an inconclusive result and SAIA validates the document;
+    the worker thread finishes on its own and its result is still cached.
+    A thread can't be interrupted, so while timed-out checks hold every
+    worker new documents are rejected instead of passing unchecked. A file
+    descriptor is duplicated for the thread, which closes its copy: the
+    caller may close the original (and the number be reused) before a
+    timed-out check reads it.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache_entries: int = 1024,
+    ) -> None:
+        try:
+            self.max_workers = max_workers or int(os.environ.get("PREFLIGHT_WORKERS", 2))
+        except Exception:
+            self.max_workers = 2
+        try:
+            self.timeout = timeout if timeout is not None else float(
+                os.environ.get("PREFLIGHT_TIMEOUT", 2.0)
+            )
+        except Exception:
+            self.timeout = 2.0
+        self.metrics: Dict[str, Any] = {
+            "preflight_runs": 0,
+            "preflight_structural": 0,
+            "preflight_full": 0,
+            "preflight_timeouts": 0,
+            "preflight_busy_rejects": 0,
+        }
+        self._cache = LRUCache(
+            max_entries=cache_entries,
+            max_bytes=cache_entries * 512,
+            ttl=None,
+            metrics=self.metrics,
+            prefix="preflight_cache",
+        )
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # checks still running after their budget ran out
+        self._stuck = 0
+        self._stuck_lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="pdf-preflight"
+            )
+        return self._pool
+
+    def _run(self, source: Source, sha256: Optional[str]) -> Dict[str, Any]:
+        mm = None
+        try:
+            if isinstance(source, (str, int)):
+                # map files instead of reading them: no copy of the document in memory;
+                # an int is the duplicate made by check(), owned by this thread
+                fd = os.open(source, os.O_RDONLY) if isinstance(source, str) else source
+                try:
+                    if os.fstat(fd).st_size == 0:
+                        return _no_pages("structural", "El PDF parece vacío o demasiado pequeño.")
+                    mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+                finally:
+                    os.close(fd)
+                buf = mm
+            else:
+                buf = source
+            digest = sha256 or hashlib.sha256(buf).hexdigest()
+            cached = self._cache.get(digest)
+            if cached is not None:
+                return dict(cached, sha256=digest, cached=True)
+            self.metrics["preflight_runs"] += 1
+            res = structural_check(buf)
+            if res is not None:
+                self.metrics["preflight_structural"] += 1
+            else:
+                self.metrics["preflight_full"] += 1
+                res = full_check(buf)
+            self._cache.set(digest, res)
+            return dict(res, sha256=digest)
+        finally:
+            if mm is not None:
+                try:
+                    mm.close()
+                except BufferError:
+                    # a parser still holds a view; the map is released with it
+                    pass
+
+    async def check(self, source: Source, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Validate a PDF given its bytes, a path or an open file descriptor.
+
+        The returned dict has ``ok``, ``pages``, ``method`` and, when the document
+        was read, its ``sha256``; rejected documents also carry ``error``/``detail``.
+        """
+        if sha256:
+            cached = self._cache.get(sha256)
+            if cached is not None:
+                return dict(cached, sha256=sha256, cached=True)
+        if self._stuck >= self.max_workers:
+            self.metrics["preflight_busy_rejects"] += 1
+            logger.warning(
+                "PDF preflight saturado por validaciones que excedieron el tiempo; se rechaza el archivo"
+            )
+            return _result(
+                False,
+                "busy",
+                sha256=sha256,
+                error="preflight_unavailable",
+                detail="No se pudo validar el PDF en este momento; inténtalo de nuevo en unos segundos.",
+            )
+        if isinstance(source, int):
+            source = os.dup(source)
+            try:
+                cf = self._get_pool().submit(self._run, source, sha256)
+            except Exception:
+                os.close(source)
+                raise
+            # cancelled before it ran: the duplicate is still open
+            cf.add_done_callback(lambda f, fd=source: f.cancelled() and os.close(fd))
+        else:
+            cf = self._get_pool().submit(self._run, source, sha256)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(cf), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics["preflight_timeouts"] += 1
+            if not cf.cancel():
+                # already running: the thread stays busy until the parse ends
+                with self._stuck_lock:
+                    self._stuck += 1
+                cf.add_done_callback(self._release_stuck)
+            logger.warning("PDF preflight excedió %.2fs; se deja la validación a SAIA", self.timeout)
+            return _result(True, "timeout", sha256=sha256)
+        except Exception as e:
+            logger.debug("PDF preflight falló; se intentará subir y dejar que SAIA lo valide: %s", e)
+            return _result(True, "failed", sha256=sha256)
+
+    def _release_stuck(self, _fut) -> None:
+        with self._stuck_lock:
+            self._stuck -= 1
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+pdf_preflight = PdfPreflight()
@@ -0,0 +1,66 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+logger = logging.getLogger("app.services.sqlite_store")
+
+
+class SQLiteStore:
+    """Base para índices locales en SQLite compartidos entre workers de la misma máquina.
+
+    Uses one connection per process guarded by a lock, WAL journaling so readers
+    in other processes don't block writers, and a busy timeout for contention.
+    """
+
+    schema: str = ""
+    # seconds a statement waits for another process's write lock
+    busy_timeout: float = 5.0
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                isolation_level=None,
+            )
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.DatabaseError:
+                logger.debug("No se pudo activar WAL en %s", self.path)
+            if self.schema:
+                conn.executescript(self.schema)
+            self._conn = conn
+        return self._conn
+
+    def execute(self, sql: str, params: tuple = (), timeout: Optional[float] = None) -> list:
+        """Run one statement; ``timeout`` (seconds) replaces the busy timeout for it only."""
+        with self._lock:
+            conn = self._connect()
+            if timeout is None:
+                return conn.execute(sql, params).fetchall()
+            conn.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import logging
+import os
+from typing import Optional
+
+from app.services.preflight import PdfReader
+
+logger = logging.getLogger("app.services.text_extract")
+
+TEXT_EXTENSIONS = {".txt", ".csv"}
+# below this many characters per page a PDF is treated as scanned (no text layer)
+MIN_CHARS_PER_PAGE = 20
+
+
+def inline_text_enabled() -> bool:
+    return os.environ.get("INLINE_TEXT_MODE", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def inline_max_chars() -> int:
+    try:
+        return int(os.environ.get("INLINE_TEXT_MAX_CHARS", 60_000))
+    except Exception:
+        return 60_000
+
+
+def supports_inline(ext: str) -> bool:
+    return ext.lower() in TEXT_EXTENSIONS or (ext.lower() == ".pdf" and PdfReader is not None)
+
+
+def _decode_text(data: bytes, max_chars: int) -> Optional[str]:
+    # every char is at least one byte: anything longer can't fit the budget
+    if len(data) > max_chars * 4:
+        return None
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    if len(text) > max_chars or not text.strip():
+        return None
+    return text
+
+
+def _pdf_text(data: bytes, max_chars: int) -> Optional[str]:
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = reader.pages
+        parts = []
+        total = 0
+        for page in pages:
+            t = page.extract_text() or ""
+            total += len(t)
+            if total > max_chars:
+                return None
+            parts.append(t)
+    except Exception as e:
+        logger.debug("No se pudo extraer texto del PDF: %s", e)
+        return None
+    text = "\n".join(parts)
+    if len(text.strip()) < MIN_CHARS_PER_PAGE * max(len(pages), 1):
+        # scanned/image-only document: let SAIA run OCR on the uploaded file
+        return None
+    return text
+
+
+def extract_text(data: bytes, ext: str, max_chars: int) -> Optional[str]:
+    """Extract the text of a .txt/.csv/text-layer PDF within ``max_chars``.
+
+    Returns None when the document has no usable text or exceeds the budget,
+    meaning the caller should fall back to the file upload path.
+    """
+    ext = ext.lower()
+    if ext in TEXT_EXTENSIONS:
+        return _decode_text(data, max_chars)
+    if ext == ".pdf" and PdfReader is not None:
+        return _pdf_text(data, max_chars)
+    return None
+
+
+async def extract_inline_text(
+    data: bytes, ext: str, max_chars: Optional[int] = None, timeout: float = 2.0
+) -> Optional[str]:
+    """Run extract_text in a thread with a time budget; None means use the upload path."""
+    if not supports_inline(ext):
+        return None
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(extract_text, data, ext, max_chars or inline_max_chars()),
+            timeout=timeout,
+        )
+    except asyncio.TimeoutError:
+        logger.debug("Extracción de texto excedió %.2fs; se usará la subida de archivo", timeout)
+        return None
+    except Exception as e:
+        logger.debug("Extracción de texto falló: %s", e)
+        return None
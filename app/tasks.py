@@ -2,63 +2,181 @@ import asyncio
 import base64
 import logging
 import os
+import tempfile
+from typing import Callable, Optional
 
-from redis import Redis
-from rq import Queue
-
-from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.api.utils import write_bytes
+from app.blobs import SharedBlobStore, blob_store
+from app.services.ai.saia_console_client import job_stage
+from app.worker_runtime import runtime
 
 logger = logging.getLogger("app.tasks")
 
+# Optional Redis/RQ (only needed when jobs go through a Redis queue)
+Redis = None
+Queue = None
+get_current_job = None
+JobTimeoutException = TimeoutError
+try:
+    from redis import Redis
+    from rq import Queue, get_current_job
+    from rq.timeouts import JobTimeoutException
+except Exception:
+    Redis = None
+    Queue = None
+    get_current_job = None
+    JobTimeoutException = TimeoutError
+
 # Redis connection will be created by the worker using REDIS_URL
 redis_url = os.environ.get("REDIS_URL")
-if redis_url:
+if redis_url and Redis is not None:
     redis_conn = Redis.from_url(redis_url)
 else:
     redis_conn = None
 
-q = Queue(connection=redis_conn) if redis_conn else None
+q = Queue(os.environ.get("RQ_QUEUE", "default"), connection=redis_conn) if redis_conn else None
 
+# file bytes for queued jobs: written once by the web process, read by reference in the worker
+shared_blobs = SharedBlobStore(redis_conn=redis_conn)
 
-def process_upload(job_payload):
-    """Worker function executed inside RQ worker.
-    Job payload contains: file_b64, filename, prompt, folder, alias, assistant
-    """
+
+async def run_job(client, payload: dict):
+    """Run the upload->chat flow described by a job payload."""
+    # no_cache: bypass requested; cache_checked: the endpoint already missed
+    use_cache = not (payload.get("no_cache") or payload.get("cache_checked"))
+    # text extracted locally: chat with it inline, no file upload at all
+    if payload.get("inline_text") is not None:
+        return await client.send_text_and_query(
+            payload["inline_text"],
+            payload.get("filename") or "file",
+            payload["prompt"],
+            assistant_id=payload["assistant"],
+            sha256=payload.get("sha256"),
+            use_cache=use_cache,
+        )
+    # the file was already streamed to SAIA during the request: only chat remains
+    if payload.get("upload") is not None:
+        return await client.query_uploaded(
+            payload["upload"],
+            payload["prompt"],
+            alias=payload["alias"],
+            assistant_id=payload["assistant"],
+            stream=False,
+            use_cache=use_cache,
+            folder=payload.get("folder"),
+        )
+    blob = blob_store.get(payload.get("blob_id"))
+    if blob is None and payload.get("blob_ref"):
+        # queued job: the bytes live in the shared blob store (directory or Redis)
+        blob = await asyncio.to_thread(shared_blobs.get, payload["blob_ref"])
+    if blob is None:
+        raise RuntimeError("blob_not_found")
+    # Prefer in-memory upload when client supports it to avoid disk I/O
+    if hasattr(client, "send_bytes_and_query"):
+        return await client.send_bytes_and_query(
+            blob,
+            payload.get("filename") or "file",
+            payload["prompt"],
+            folder=payload["folder"],
+            alias=payload["alias"],
+            assistant_id=payload["assistant"],
+            stream=False,
+            use_cache=use_cache,
+        )
+    # fallback to temp file on disk; a private directory per job keeps the original
+    # file name without clashing with other jobs uploading the same name
+    tmp_dir = "/tmp/saia_demo"
+    os.makedirs(tmp_dir, exist_ok=True)
+    job_dir = tempfile.mkdtemp(prefix="job-", dir=tmp_dir)
+    p = os.path.join(job_dir, os.path.basename(payload.get("filename") or "file"))
     try:
-        tmp_dir = "/tmp/saia_demo"
-        os.makedirs(tmp_dir, exist_ok=True)
-        filename = job_payload.get("filename")
-        data = job_payload.get("file_b64")
-        path = os.path.join(tmp_dir, filename)
-        with open(path, "wb") as f:
-            f.write(base64.b64decode(data))
-
-        client = SAIAConsoleClient(
-            os.environ.get("GEAI_API_TOKEN"),
-            os.environ.get("ORGANIZATION_ID"),
-            os.environ.get("PROJECT_ID"),
-            os.environ.get("ASSISTANT_ID"),
+        await write_bytes(p, blob.view())
+    except Exception:
+        with open(p, "wb") as fw:
+            fw.write(blob.view())
+    try:
+        # record that we had to use disk fallback
+        try:
+            if hasattr(client, "metrics"):
+                client.metrics["fallback_disk_used"] += 1
+        except Exception:
+            pass
+        return await client.send_pdf_and_query(
+            p,
+            payload["prompt"],
+            folder=payload["folder"],
+            alias=payload["alias"],
+            assistant_id=payload["assistant"],
         )
+    finally:
+        try:
+            os.remove(p)
+            os.rmdir(job_dir)
+        except Exception:
+            pass
 
-        # send_pdf_and_query is async; run it in event loop
-        async def _run():
-            return await client.send_pdf_and_query(
-                path,
-                job_payload.get("prompt", ""),
-                folder=job_payload.get("folder", "test1"),
-                alias=job_payload.get("alias"),
-                assistant_id=job_payload.get("assistant"),
-            )
 
-        res = asyncio.run(_run())
+def _current_rq_job():
+    return get_current_job() if get_current_job is not None else None
 
-        # cleanup
+
+def _rq_stage_reporter(job) -> Optional[Callable[[str], None]]:
+    """Stage callback that stores progress in the RQ job's meta, read back by the web dispatcher."""
+    if job is None:
+        return None
+
+    def report(stage: str) -> None:
         try:
-            os.remove(path)
-        except Exception:
-            logger.debug("No se pudo borrar tmp file en worker")
+            job.meta["stage"] = stage
+            job.save_meta()
+        except Exception as e:
+            logger.debug("No se pudo guardar la etapa del job %s: %s", job.id, e)
+
+    return report
+
+
+async def _run_with_stage(client, payload: dict, report: Optional[Callable[[str], None]]):
+    # set inside the coroutine: the context of the RQ thread doesn't reach the runtime loop
+    token = job_stage.set(report)
+    try:
+        return await run_job(client, payload)
+    finally:
+        job_stage.reset(token)
 
-        return res
+
+def process_upload(job_payload):
+    """Worker function executed inside RQ worker.
+    Job payload is the one built by upload_pdf (see run_job); file bytes are
+    referenced by ``blob_ref`` (shared blob store). ``file_b64`` is still
+    accepted for jobs enqueued by older web processes.
+    """
+    blob = None
+    try:
+        payload = {"prompt": "", "folder": "test1", "alias": None, "assistant": None}
+        payload.update(job_payload)
+        data = payload.pop("file_b64", None)
+        if data is not None:
+            blob = blob_store.put(base64.b64decode(data), sha256=payload.get("sha256"))
+            payload["blob_id"] = blob.key
+
+        # run_job is async: run it on the worker's persistent loop with the shared
+        # client, so connections and caches are reused across jobs
+        job = _current_rq_job()
+        report = _rq_stage_reporter(job)
+        # the wait is bounded by the RQ job timeout: a thread blocked on the loop
+        # can't be interrupted by the worker's timer, and the coroutine gets cancelled
+        timeout = job.timeout if job is not None and job.timeout and job.timeout > 0 else None
+        try:
+            return runtime.run(lambda client: _run_with_stage(client, payload, report), timeout)
+        except TimeoutError:
+            raise JobTimeoutException(f"Job excedió el tiempo máximo ({timeout} s)")
+    except JobTimeoutException:
+        # RQ marks the job as failed; a result dict would report it as finished
+        logger.warning("Job cancelado por exceder su tiempo máximo")
+        raise
     except Exception as e:
         logger.exception("Error procesando job")
         return {"error": "worker_error", "detail": str(e)}
+    finally:
+        if blob is not None:
+            blob_store.release(blob.key)
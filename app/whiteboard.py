@@ -1,6 +1,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
-import json
+
+from app.codec import dumps_text, loads
 
 router = APIRouter()
 
@@ -741,7 +742,7 @@ async def websocket_endpoint(ws: WebSocket):
   # send current state immediately
   try:
     init = {"type": "init", "strokes": strokes, "chat": chat_history, "fills": fills, "actions": actions, "presence": {"count": len(clients) + 1}}
-    await ws.send_text(json.dumps(init))
+    await ws.send_text(dumps_text(init))
   except Exception:
     pass
 
@@ -754,7 +755,7 @@ async def websocket_endpoint(ws: WebSocket):
     while True:
       data = await ws.receive_text()
       try:
-        msg = json.loads(data)
+        msg = loads(data)
       except Exception:
         continue
 
@@ -768,8 +769,9 @@ async def websocket_endpoint(ws: WebSocket):
         # broadcast presence (new connection was already added to clients set earlier)
         try:
           broadcast = {"type": "presence", "count": len(clients)}
+          frame = dumps_text(broadcast)
           for c in list(clients):
-            await c.send_text(json.dumps(broadcast))
+            await c.send_text(frame)
         except Exception:
           pass
 
@@ -788,9 +790,10 @@ async def websocket_endpoint(ws: WebSocket):
         actions.append({"type": "stroke", "obj": stroke})
         # let others know a stroke started
         broadcast = {"type": "stroke_start", **stroke}
+        frame = dumps_text(broadcast)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(broadcast))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
 
@@ -811,9 +814,11 @@ async def websocket_endpoint(ws: WebSocket):
           found.setdefault("points", []).append(pt)
           # broadcast point to others
           out = {"type": "stroke_point", "strokeId": sid, "clientId": cid, "from": msg.get("from"), "to": pt, "color": found.get("color"), "size": found.get("size"), "tool": found.get("tool")}
+          # serialized once for every client (websocket text frames take str)
+          frame = dumps_text(out)
           for c in list(clients):
             try:
-              await c.send_text(json.dumps(out))
+              await c.send_text(frame)
             except Exception:
               clients.discard(c)
 
@@ -827,9 +832,10 @@ async def websocket_endpoint(ws: WebSocket):
         fills.clear()
         actions.clear()
         broadcast = {"type": "clear", "actions": actions, "strokes": strokes, "fills": fills}
+        frame = dumps_text(broadcast)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(broadcast))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
 
@@ -839,9 +845,10 @@ async def websocket_endpoint(ws: WebSocket):
         fills.append(fill)
         actions.append({"type": "fill", "obj": fill})
         out = {"type": "fill", **fill}
+        frame = dumps_text(out)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(out))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
 
@@ -878,9 +885,10 @@ async def websocket_endpoint(ws: WebSocket):
               elif a.get('type') == 'fill':
                 fills.append(a.get('obj'))
         broadcast = {"type": "undo", "actions": actions, "strokes": strokes, "fills": fills}
+        frame = dumps_text(broadcast)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(broadcast))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
 
@@ -891,9 +899,10 @@ async def websocket_endpoint(ws: WebSocket):
         if len(chat_history) > 500:
           chat_history.pop(0)
         # broadcast chat
+        frame = dumps_text(entry)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(entry))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
 
@@ -903,9 +912,10 @@ async def websocket_endpoint(ws: WebSocket):
       # broadcast updated presence
       try:
         broadcast = {"type": "presence", "count": len(clients)}
+        frame = dumps_text(broadcast)
         for c in list(clients):
           try:
-            await c.send_text(json.dumps(broadcast))
+            await c.send_text(frame)
           except Exception:
             clients.discard(c)
       except Exception:
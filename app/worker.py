@@ -0,0 +1,70 @@
+"""RQ worker entry point that keeps one event loop and one SAIA client per process.
+
+    python -m app.worker [--burst]
+
+RQ's default worker forks a new process per job, which would throw away the
+loop, the connection pool and the caches every time. This runs non-forking
+workers instead; with WORKER_CONCURRENCY > 1 several of them share the
+process (one thread each) and their jobs run concurrently on the shared loop.
+"""
+import logging
+import os
+import sys
+import threading
+
+from app.tasks import redis_conn, shared_blobs
+from app.worker_runtime import runtime
+
+logger = logging.getLogger("app.worker")
+
+
+def _make_worker(queues, name=None):
+    from rq import SimpleWorker
+    from rq.timeouts import TimerDeathPenalty
+
+    class ThreadedWorker(SimpleWorker):
+        # job timeouts via SIGALRM only work in the main thread; a timer works in any
+        death_penalty_class = TimerDeathPenalty
+
+        # signal handlers can only be installed from the main thread
+        def _install_signal_handlers(self):
+            if threading.current_thread() is threading.main_thread():
+                super()._install_signal_handlers()
+
+    return ThreadedWorker(queues, connection=redis_conn, name=name)
+
+
+def main(burst: bool = False) -> None:
+    """Run the workers; with ``burst`` (``--burst``) they exit once the queues are empty."""
+    level = os.environ.get("LOG_LEVEL", "INFO")
+    logging.basicConfig(level=level)
+    if redis_conn is None:
+        raise SystemExit("REDIS_URL no está configurado o falta el paquete redis/rq")
+    # a local directory is only visible to this machine: every job would end in
+    # blob_not_found unless the directory is deliberately shared with the web process
+    if shared_blobs.backend == "file" and not os.environ.get("SHARED_BLOB_DIR"):
+        raise SystemExit(
+            "SHARED_BLOB_BACKEND=file requiere un SHARED_BLOB_DIR compartido con el proceso web; "
+            "usa SHARED_BLOB_BACKEND=redis si el worker corre en otra máquina"
+        )
+    # same variable the web process enqueues to; a comma list also drains other queues
+    queues = [q.strip() for q in os.environ.get("RQ_QUEUE", "default").split(",") if q.strip()]
+    work = {"burst": burst, "logging_level": level}
+    threads = []
+    # extra workers in threads; the main thread runs the last one and handles signals
+    for i in range(runtime.concurrency - 1):
+        w = _make_worker(queues, name=f"{os.getpid()}-{i}")
+        t = threading.Thread(target=w.work, kwargs=work, name=f"rq-worker-{i}", daemon=True)
+        t.start()
+        threads.append(t)
+    try:
+        _make_worker(queues, name=f"{os.getpid()}-main").work(**work)
+        if burst:
+            for t in threads:
+                t.join()
+    finally:
+        runtime.close()
+
+
+if __name__ == "__main__":
+    main(burst="--burst" in sys.argv[1:])
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.services.http_transport import transport_manager
+
+logger = logging.getLogger("app.worker_runtime")
+
+T = TypeVar("T")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except Exception:
+        return default
+
+
+def _client_from_env() -> SAIAConsoleClient:
+    return SAIAConsoleClient(
+        os.environ.get("GEAI_API_TOKEN"),
+        os.environ.get("ORGANIZATION_ID"),
+        os.environ.get("PROJECT_ID"),
+        os.environ.get("ASSISTANT_ID", "test_read"),
+    )
+
+
+class WorkerRuntime:
+    """Event loop persistente y cliente SAIA compartido para todos los jobs de un proceso worker.
+
+    The loop runs in a daemon thread, so synchronous job functions (RQ) submit
+    coroutines to it and block on the result, while connections, caches and
+    the retry history survive from one job to the next. Up to ``concurrency``
+    jobs run on the loop at the same time when several threads submit work
+    (see app.worker). After a fork the child starts its own loop.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        client_factory: Callable[[], SAIAConsoleClient] = _client_from_env,
+    ) -> None:
+        self.concurrency = max(concurrency or _env_int("WORKER_CONCURRENCY", 1), 1)
+        self.client_factory = client_factory
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._client: Optional[SAIAConsoleClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return self._loop
+            # first use, or a forked child: the parent's loop thread doesn't exist here
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="worker-runtime-loop", daemon=True
+            )
+            thread.start()
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            self._client = None
+            self._sem = None
+            logger.info(
+                "Worker runtime iniciado (pid=%s, concurrencia=%d)", self._pid, self.concurrency
+            )
+            return loop
+
+    @property
+    def client(self) -> SAIAConsoleClient:
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    async def _guarded(self, fn: Callable[[SAIAConsoleClient], Awaitable[T]]) -> T:
+        # created lazily so it belongs to the runtime loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        async with self._sem:
+            return await fn(self.client)
+
+    def run(
+        self, fn: Callable[[SAIAConsoleClient], Awaitable[T]], timeout: Optional[float] = None
+    ) -> T:
+        """Run ``fn(client)`` on the persistent loop and block until it returns.
+
+        After ``timeout`` seconds this raises ``TimeoutError``. The coroutine is
+        cancelled on the loop whenever the wait ends early (timeout or an
+        exception raised into this thread, such as RQ's job timeout).
+        """
+        loop = self._ensure_started()
+        fut = asyncio.run_coroutine_threadsafe(self._guarded(fn), loop)
+        try:
+            return fut.result(timeout)
+        finally:
+            if not fut.done():
+                fut.cancel()
+
+    def close(self) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+            self._client = None
+        if loop is None or self._pid != os.getpid():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(transport_manager.aclose(), loop).result(5)
+        except Exception as e:
+            logger.debug("Cierre de conexiones del worker falló: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+# one per worker process
+runtime = WorkerRuntime()
+
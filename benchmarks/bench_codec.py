@@ -0,0 +1,75 @@
+"""Messages/sec of each JSON codec on the app's hot paths.
+
+Compares the previous inline stdlib calls (``json.dumps(...)`` into an
+f-string, then ``.encode()``) with ``app.codec`` on every backend installed
+here (orjson, msgspec, json). Backends that aren't installed are skipped.
+
+    python -m benchmarks.bench_codec
+"""
+import json
+import time
+
+from app.codec import JSONCodec, available_backends
+
+SSE_TEXT = {"text": "El documento describe el análisis trimestral de ventas y su evolución. " * 2}
+STROKE_POINT = {
+    "type": "stroke_point", "strokeId": "s-1f3a", "clientId": "c-9b2e",
+    "from": {"x": 412.5, "y": 230.25}, "to": {"x": 415.0, "y": 233.75},
+    "color": "#1e88e5", "size": 4, "tool": "pen",
+}
+UPSTREAM_CHUNK = json.dumps({
+    "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 1700000000,
+    "model": "saia-chat", "choices": [{"index": 0, "delta": {"content": "análisis "},
+                                       "finish_reason": None}],
+}, ensure_ascii=False).encode()
+LARGE_RESPONSE = json.dumps({
+    "id": "chatcmpl-2", "object": "chat.completion",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(
+        {"message": "Resumen", "items": [{"page": i, "summary": "texto " * 40} for i in range(60)]},
+        ensure_ascii=False)}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1200, "completion_tokens": 5400},
+}, ensure_ascii=False).encode()
+
+
+def rate(fn, seconds=0.3):
+    n, t0 = 0, time.perf_counter()
+    while True:
+        for _ in range(200):
+            fn()
+        n += 200
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            return n / elapsed
+
+
+def legacy_cases():
+    return {
+        "SSE frame (encode)": lambda: f"data: {json.dumps(SSE_TEXT, ensure_ascii=False)}\n\n".encode("utf-8"),
+        "stroke_point (encode)": lambda: json.dumps(STROKE_POINT),
+        "upstream chunk (decode)": lambda: json.loads(UPSTREAM_CHUNK.decode("utf-8")),
+        "large response (decode)": lambda: json.loads(LARGE_RESPONSE),
+    }
+
+
+def codec_cases(c: JSONCodec):
+    return {
+        "SSE frame (encode)": lambda: b"data: " + c.dumps(SSE_TEXT) + b"\n\n",
+        "stroke_point (encode)": lambda: c.dumps_text(STROKE_POINT),
+        "upstream chunk (decode)": lambda: c.loads(UPSTREAM_CHUNK),
+        "large response (decode)": lambda: c.loads(LARGE_RESPONSE),
+    }
+
+
+def main() -> None:
+    columns = {"legacy json": legacy_cases()}
+    for backend in available_backends():
+        columns[f"codec:{backend}"] = codec_cases(JSONCodec(backend))
+    print(f"large response: {len(LARGE_RESPONSE) / 1024:.0f} KB; figures in messages/sec\n")
+    print(f"{'':<26}" + "".join(f"{name:>16}" for name in columns))
+    for case in legacy_cases():
+        row = [rate(cases[case]) for cases in columns.values()]
+        print(f"{case:<26}" + "".join(f"{r:>16,.0f}" for r in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Bytes allocated per upload: base64 job payloads vs. BlobStore references.
+
+Runs without network access; it replays the payload handling done by
+``upload_pdf`` (job creation, fast path, background worker) and measures
+allocations with tracemalloc.
+
+    python -m benchmarks.bench_job_payload
+"""
+import asyncio
+import base64
+import io
+import os
+import tracemalloc
+
+from app.blobs import BlobStore
+
+SIZES = (100 * 1024, 800 * 1024, 5 * 1024 * 1024)
+
+
+def legacy_flow(contents: bytes) -> int:
+    # payload kept in job_store + decoded by the fast path and again by _worker
+    payload = {"file_b64": base64.b64encode(contents).decode("ascii")}
+    fast = base64.b64decode(payload["file_b64"])
+    worker = base64.b64decode(payload["file_b64"])
+    # httpx multipart reads bytes through a BytesIO-like view
+    return len(fast) + len(worker) + len(io.BytesIO(worker).getbuffer())
+
+
+def blob_flow(store: BlobStore, contents: bytes) -> int:
+    blob = store.put(contents)
+    payload = {"blob_id": blob.key}
+
+    async def consume():
+        total = 0
+        b = store.get(payload["blob_id"])
+        # fast path and worker both stream the same blob
+        for _ in range(2):
+            async for chunk in b.iter_chunks():
+                total += len(chunk)
+        return total
+
+    total = asyncio.run(consume())
+    store.release(blob.key)
+    return total
+
+
+def measure(fn, *args) -> tuple:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+def main() -> None:
+    store = BlobStore(blob_dir=os.path.join("/tmp", "saia_bench_blobs"))
+    print(f"{'size':>10} {'legacy peak':>14} {'blob peak':>12} {'ratio':>7}")
+    for size in SIZES:
+        contents = os.urandom(size)
+        _, legacy_peak = measure(legacy_flow, contents)
+        _, blob_peak = measure(blob_flow, store, contents)
+        ratio = legacy_peak / max(blob_peak, 1)
+        print(f"{size:>10} {legacy_peak:>14} {blob_peak:>12} {ratio:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
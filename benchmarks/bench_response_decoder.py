@@ -0,0 +1,114 @@
+"""Decoding cost of large non-streaming answers: previous inline code vs. app.services.ai.decoder.
+
+The legacy column is the code ``AIProcessor.process`` used to run: choices
+lookup, recursive ``find_string`` for unknown shapes, then ``re.sub`` over
+the whole answer to drop ```json fences and ``loads``. Both columns get the
+already-parsed response dict, so only the decoding step is measured.
+
+    python -m benchmarks.bench_response_decoder [items]
+"""
+import json
+import re
+import sys
+import time
+import tracemalloc
+
+from app.codec import loads
+from app.services.ai.decoder import decode_completion
+
+
+def legacy_decode(data):
+    raw = None
+    if isinstance(data, dict) and "choices" in data and data["choices"]:
+        choice0 = data["choices"][0]
+        if isinstance(choice0, dict):
+            msg = choice0.get("message") or choice0.get("delta") or choice0
+            if isinstance(msg, dict):
+                raw = msg.get("content") or msg.get("text") or msg.get("payload")
+            elif isinstance(msg, str):
+                raw = msg
+        elif isinstance(choice0, str):
+            raw = choice0
+    if raw is None:
+
+        def find_string(o):
+            if isinstance(o, str):
+                return o
+            if isinstance(o, list):
+                for v in o:
+                    s = find_string(v)
+                    if s and len(s) > 0:
+                        return s
+                return None
+            if isinstance(o, dict):
+                for k, v in o.items():
+                    s = find_string(v)
+                    if s and len(s) > 0:
+                        return s
+            return None
+
+        raw = find_string(data)
+    if raw is None:
+        return data
+    if raw.strip() == "":
+        return {"error": "no_text_found"}
+    clean = re.sub(r"```json\s*|\s*```", "", raw, flags=re.DOTALL).strip()
+    try:
+        return loads(clean)
+    except ValueError:
+        return {"message": raw}
+
+
+def completion(content):
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1200, "completion_tokens": 5400},
+    }
+
+
+def cases(items: int):
+    answer = json.dumps(
+        {"message": "Resumen", "items": [{"page": i, "summary": "texto ` " * 40} for i in range(items)]},
+        ensure_ascii=False, indent=2,
+    )
+    prose = "El documento describe el análisis trimestral de ventas.\n" * (items * 6)
+    # unknown shape: the text sits after a large block of empty / numeric data
+    nested = {"meta": [{"scores": list(range(50)), "tags": ["", ""]} for _ in range(items * 4)],
+              "data": {"result": {"body": answer}}}
+    return {
+        "JSON answer": completion(answer),
+        "```json fenced answer": completion(f"```json\n{answer}\n```"),
+        "prose answer": completion(prose),
+        "unknown shape (walk)": nested,
+    }
+
+
+def measure(fn, data, seconds=0.5):
+    n, t0 = 0, time.perf_counter()
+    while True:
+        fn(data)
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds and n >= 5:
+            break
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / n, peak
+
+
+def main() -> None:
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    print(f"{'':<24}{'legacy ms':>11}{'decoder ms':>12}{'legacy peak':>14}{'decoder peak':>14}")
+    for name, data in cases(items).items():
+        assert legacy_decode(data) == decode_completion(data), name
+        (lt, lp), (dt, dp) = measure(legacy_decode, data), measure(decode_completion, data)
+        print(f"{name:<24}{lt * 1000:>11.3f}{dt * 1000:>12.3f}"
+              f"{lp / 1024:>11.0f} KB{dp / 1024:>11.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Parsing cost of a chat stream: aiter_lines + json.loads per line vs. SSEParser.
+
+Replays a recorded-style OpenAI chat stream (role chunk, N content deltas,
+finish chunk, [DONE]) cut into network-sized pieces, through an
+httpx.Response exactly as ``AIProcessor.process_stream`` reads it. No
+network access.
+
+    python -m benchmarks.bench_sse_parser [deltas]
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+from app.services.ai.sse import iter_text_deltas
+
+WORDS = "el la de que y en un documento resume archivo página texto análisis datos".split()
+
+
+def recorded_stream(deltas: int, seed: int = 7) -> bytes:
+    rnd = random.Random(seed)
+    base = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 1700000000,
+            "model": "saia-chat"}
+
+    def event(delta, finish=None):
+        obj = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish}])
+        return b"data: " + json.dumps(obj, ensure_ascii=False).encode() + b"\n\n"
+
+    parts = [event({"role": "assistant", "content": ""})]
+    for _ in range(deltas):
+        text = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4))) + " "
+        parts.append(event({"content": text}))
+    parts.append(event({}, "stop"))
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def network_chunks(raw: bytes, seed: int = 11):
+    rnd = random.Random(seed)
+    out, i = [], 0
+    while i < len(raw):
+        n = rnd.randint(200, 1400)
+        out.append(raw[i:i + n])
+        i += n
+    return out
+
+
+def response(chunks) -> httpx.Response:
+    async def body():
+        for c in chunks:
+            yield c
+
+    return httpx.Response(200, content=body(), headers={"Content-Type": "text/event-stream"})
+
+
+async def legacy_stream(chunks):
+    # previous process_stream: one str line at a time, json.loads on each data line
+    async for line in response(chunks).aiter_lines():
+        if line.startswith("data: "):
+            json_data = line[len("data: "):]
+            if json_data.strip() == "[DONE]":
+                break
+            try:
+                yield json.loads(json_data)
+            except json.JSONDecodeError:
+                continue
+
+
+async def legacy(chunks) -> str:
+    # plus the delta extraction stream_alias never did
+    parts = []
+    async for chunk in legacy_stream(chunks):
+        c = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+        if c:
+            parts.append(c)
+    return "".join(parts)
+
+
+async def parser(chunks) -> str:
+    return "".join([d.text async for d in iter_text_deltas(response(chunks).aiter_bytes())])
+
+
+def measure(fn, chunks, rounds):
+    # best of N: the shared machines this runs on are noisy
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        text = asyncio.run(fn(chunks))
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    asyncio.run(fn(chunks))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return text, best, peak
+
+
+def main() -> None:
+    deltas = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    raw = recorded_stream(deltas)
+    chunks = network_chunks(raw)
+    print(f"stream: {deltas} deltas, {len(raw) / 1024:.0f} KB in {len(chunks)} network chunks\n")
+    results = {}
+    for name, fn in (("aiter_lines + json.loads", legacy), ("SSEParser + DeltaAssembler", parser)):
+        text, per_run, peak = measure(fn, chunks, rounds=20)
+        results[name] = text
+        print(f"{name:<28} {per_run * 1000:8.2f} ms/stream   "
+              f"{deltas / per_run / 1000:7.0f}k deltas/s   peak {peak / 1024:7.0f} KB")
+    assert len(set(results.values())) == 1, "parsers disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Time to first byte on /stream: fixed 0.8 s timeout + restart vs. hedged race.
+
+Simulates the two upstream calls of ``stream_alias`` with configurable
+delays (no network). The old strategy waited 0.8 s for the first streaming
+fragment and, on timeout, started the non-streaming call from scratch while
+the streaming request kept running; the hedged one keeps the stream alive,
+starts the non-streaming call at the same moment and takes whichever answers
+first, cancelling the other.
+
+    python -m benchmarks.bench_stream_race
+"""
+import asyncio
+import time
+
+from app.api.streaming import RaceStats, hedged_stream
+
+HEDGE = 0.8
+
+# name: (stream first-fragment delay or None if it hangs, stream error?, non-stream latency)
+SCENARIOS = {
+    "fast stream (0.3 s)": (0.3, False, 1.5),
+    "slow stream (1.2 s), slow process (2 s)": (1.2, False, 2.0),
+    "stalled stream, process 1 s": (None, False, 1.0),
+    "stream fails at 0.05 s, process 1 s": (0.05, True, 1.0),
+}
+
+
+def parts(first_delay, fails, process_latency):
+    async def stream():
+        await asyncio.sleep(3600 if first_delay is None else first_delay)
+        yield {"error": "Error de red"} if fails else {"text": "hola"}
+
+    async def process():
+        await asyncio.sleep(process_latency)
+        return {"message": "completo"}
+
+    return stream(), process
+
+
+async def legacy(first_delay, fails, process_latency):
+    ag, process = parts(first_delay, fails, process_latency)
+    t0 = time.monotonic()
+    try:
+        first = await asyncio.wait_for(anext(ag), timeout=HEDGE)
+        # an error fragment was forwarded to the client as if it were the answer
+        return time.monotonic() - t0, "error" not in first
+    except asyncio.TimeoutError:
+        pass
+    await process()
+    return time.monotonic() - t0, True
+
+
+async def hedged(first_delay, fails, process_latency, stats):
+    ag, process = parts(first_delay, fails, process_latency)
+    t0 = time.monotonic()
+    race = hedged_stream(ag, process, hedge_delay=HEDGE, stats=stats)
+    try:
+        async for _source, item in race:
+            return time.monotonic() - t0, "error" not in item
+    finally:
+        await race.aclose()
+
+
+async def main() -> None:
+    stats = RaceStats()
+    print(f"{'scenario':<42} {'legacy TTFB':>12} {'hedged TTFB':>12}")
+    for name, (first_delay, fails, latency) in SCENARIOS.items():
+        old, old_ok = await legacy(first_delay, fails, latency)
+        new, new_ok = await hedged(first_delay, fails, latency, stats)
+        print(f"{name:<42} {old:>11.2f}s{' ' if old_ok else '!'} {new:>11.2f}s{' ' if new_ok else '!'}")
+    print("\n! = the first bytes were an error, not the answer")
+    print("race stats:", stats.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""Jobs/sec of one RQ worker process: per-job client + asyncio.run vs. app.worker.
+
+The worker columns enqueue jobs the way the web process does (JobDispatcher,
+blob references) and drain them with ``app.worker.main(burst=True)``, the
+shipped entry point, at WORKER_CONCURRENCY 1 and 4. Redis is REDIS_URL when
+set, otherwise fakeredis; without either only the legacy column runs. SAIA is
+a local mock (files + chat) that adds a fixed delay to the first request on
+each new connection, standing in for the TLS handshake, and a per-request
+service latency.
+
+    python -m benchmarks.bench_worker_throughput [jobs]
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("UPLOAD_INDEX_PATH", "")  # no dedup: every job uploads
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app import tasks, worker  # noqa: E402
+from app.background import MemoryJobStore  # noqa: E402
+from app.blobs import blob_store  # noqa: E402
+from app.dispatcher import JobDispatcher  # noqa: E402
+from app.services.ai.saia_console_client import SAIAConsoleClient  # noqa: E402
+from app.worker_runtime import WorkerRuntime  # noqa: E402
+
+HANDSHAKE_DELAY = 0.05
+SERVICE_LATENCY = 0.02
+CHAT_BODY = json.dumps(
+    {"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+).encode()
+FILE_BODY = json.dumps({"id": "file_1"}).encode()
+
+
+async def _handle(reader, writer):
+    first = True
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            if length:
+                await reader.readexactly(length)
+            await asyncio.sleep(SERVICE_LATENCY + (HANDSHAKE_DELAY if first else 0))
+            first = False
+            body = FILE_BODY if head.startswith(b"POST /v1/files") else CHAT_BODY
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_mock():
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    async def serve():
+        server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+        holder["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=lambda: loop.run_until_complete(serve()), daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{holder['port']}"
+
+
+def make_client(base_url):
+    return SAIAConsoleClient("t", "o", "p", "assistant", base_url=base_url)
+
+
+def job_payload(i):
+    return {
+        "file_b64": base64.b64encode(b"%%PDF-1.4 job %d " % i + os.urandom(64)).decode(),
+        "filename": f"bench-{i}.pdf",
+        "prompt": "Resume el archivo",
+        "alias": f"bench-{i}",
+    }
+
+
+def legacy_job(base_url, payload):
+    # previous process_upload: a new client (and pool) and a new loop for every job
+    path = f"/tmp/saia_demo/{payload['filename']}"
+    os.makedirs("/tmp/saia_demo", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(base64.b64decode(payload["file_b64"]))
+    client = make_client(base_url)
+    try:
+        return asyncio.run(
+            client.send_pdf_and_query(path, payload["prompt"], alias=payload["alias"])
+        )
+    finally:
+        os.remove(path)
+
+
+def report(label, jobs, elapsed, ok):
+    print(f"{label:<36} {jobs / elapsed:8.1f} jobs/s   ({ok}/{jobs} ok, {elapsed:.2f}s)")
+
+
+def run_legacy(base_url, jobs):
+    t0 = time.perf_counter()
+    results = [legacy_job(base_url, job_payload(i)) for i in range(jobs)]
+    elapsed = time.perf_counter() - t0
+    ok = sum(1 for r in results if isinstance(r, dict) and r.get("message") == "ok")
+    report("per-job client + asyncio.run", jobs, elapsed, ok)
+
+
+def redis_connection():
+    if os.environ.get("REDIS_URL"):
+        from redis import Redis
+
+        return Redis.from_url(os.environ["REDIS_URL"])
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+    return fakeredis.FakeStrictRedis()
+
+
+def run_worker(base_url, jobs, concurrency, conn):
+    from rq import Queue
+
+    # a fresh queue per run, so nothing left over from an earlier run is drained
+    queue = Queue(f"bench-worker-{os.getpid()}-c{concurrency}", connection=conn)
+    # the file bytes travel through Redis, as with web and worker on separate dynos
+    tasks.shared_blobs.redis, tasks.shared_blobs.backend = conn, "redis"
+    dispatcher = JobDispatcher(queue, store=MemoryJobStore())
+    ids = []
+    for i in range(jobs):
+        p = job_payload(i)
+        blob = blob_store.put(base64.b64decode(p.pop("file_b64")))
+        p.update({"folder": "bench", "assistant": "assistant"})
+        job_id = f"bench-c{concurrency}-{i}-{os.getpid()}"
+        dispatcher._enqueue_sync(job_id, p, blob)
+        blob_store.release(blob.key)
+        ids.append(job_id)
+
+    rt = WorkerRuntime(concurrency=concurrency, client_factory=lambda: make_client(base_url))
+    tasks.runtime = worker.runtime = rt
+    worker.redis_conn = conn
+    os.environ["RQ_QUEUE"] = queue.name
+    t0 = time.perf_counter()
+    worker.main(burst=True)
+    elapsed = time.perf_counter() - t0
+    ok = 0
+    for job_id in ids:
+        job = queue.fetch_job(job_id)
+        if job is not None and job.get_status() == "finished":
+            res = job.return_value()
+            ok += isinstance(res, dict) and res.get("message") == "ok"
+    report(f"app.worker, WORKER_CONCURRENCY={concurrency}", jobs, elapsed, ok)
+
+
+def main() -> None:
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    base_url = start_mock()
+    print(f"mock SAIA at {base_url}: handshake {HANDSHAKE_DELAY * 1000:.0f} ms, "
+          f"latency {SERVICE_LATENCY * 1000:.0f} ms/request\n")
+
+    run_legacy(base_url, jobs)
+
+    conn = redis_connection()
+    if conn is None:
+        print("(no REDIS_URL and no fakeredis: worker columns skipped)")
+        return
+    for concurrency in (1, 4):
+        run_worker(base_url, jobs, concurrency, conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+import respx
+
+SAIA_FILES_URL = "https://api.saia.ai/v1/files"
+SAIA_CHAT_URL = "https://api.saia.ai/chat"
+
+
+def chat_reply(content='{"message": "ok"}', status_code=200):
+    """A SAIA chat completion carrying ``content`` as the assistant message."""
+    return httpx.Response(status_code, json={"choices": [{"message": {"content": content}}]})
+
+
+@pytest.fixture(autouse=True)
+def _isolated_local_stores(monkeypatch, tmp_path):
+    # keep the persistent upload index and result cache per-test so hits don't leak between tests
+    monkeypatch.setenv("UPLOAD_INDEX_PATH", str(tmp_path / "upload_index.sqlite3"))
+    monkeypatch.setenv("CHAT_RESULT_CACHE_PATH", str(tmp_path / "chat_results.sqlite3"))
+    # no real connections to SAIA from the app lifespan during tests
+    monkeypatch.setenv("HTTP_WARMUP_CONNECTIONS", "0")
+
+
+@pytest.fixture
+def saia(monkeypatch):
+    """SAIA credentials for the app plus mocked files and chat routes.
+
+    ``saia.uploads`` answers with a file id and ``saia.chat`` with an "ok"
+    message; tests change the chat route with ``saia.chat.side_effect`` and
+    build answers with ``saia.reply(content)``.
+    """
+    for k, v in {"GEAI_API_TOKEN": "t", "ORGANIZATION_ID": "o", "PROJECT_ID": "p"}.items():
+        monkeypatch.setenv(k, v)
+    with respx.mock(assert_all_called=False) as router:
+        yield SimpleNamespace(
+            router=router,
+            uploads=router.post(SAIA_FILES_URL).mock(
+                return_value=httpx.Response(200, json={"id": "f"})
+            ),
+            chat=router.post(SAIA_CHAT_URL).mock(return_value=chat_reply()),
+            reply=chat_reply,
+        )
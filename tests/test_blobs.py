@@ -0,0 +1,53 @@
+import hashlib
+import os
+
+import httpx
+import pytest
+import respx
+
+from app.blobs import BlobStore
+from app.services.ai.saia_console_client import SAIAConsoleClient
+
+
+def test_blob_store_keeps_small_blobs_in_memory_and_spills_large(tmp_path):
+    store = BlobStore(spill_bytes=16, blob_dir=str(tmp_path))
+    small = b"0123456789"
+    big = b"x" * 64
+
+    b1 = store.put(small)
+    b2 = store.put(big)
+    assert b1.in_memory and b1.view().obj is small
+    assert not b2.in_memory and os.path.exists(b2.path)
+    assert b2.sha256 == hashlib.sha256(big).hexdigest()
+    assert store.stats() == {"count": 2, "bytes_in_memory": 10, "bytes_on_disk": 64}
+
+    store.release(b2.key)
+    assert not os.path.exists(b2.path)
+    assert store.get(b2.key) is None
+
+
+@pytest.mark.asyncio
+async def test_send_bytes_and_query_accepts_blob(tmp_path):
+    store = BlobStore(spill_bytes=16, blob_dir=str(tmp_path))
+    data = b"col1,col2\n" * 10
+    blob = store.put(data)
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    seen = {}
+
+    def capture(request):
+        seen["body"] = request.read()
+        return httpx.Response(200, json={"id": "file_789"})
+
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(side_effect=capture)
+        m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+            )
+        )
+        res = await client.send_bytes_and_query(blob, "data.csv", "Resume")
+
+    assert res.get("message") == "ok"
+    assert data in seen["body"]
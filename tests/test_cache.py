@@ -0,0 +1,61 @@
+import time
+
+import httpx
+import pytest
+import respx
+
+from app.services.ai.cache import LRUCache
+from app.services.ai.saia_console_client import SAIAConsoleClient
+
+
+def test_lru_cache_orders_by_use_and_counts():
+    metrics = {}
+    cache = LRUCache(max_entries=2, max_bytes=10_000, metrics=metrics, prefix="c")
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # 'a' becomes most recent
+    cache.set("c", "3")  # evicts 'b'
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+    assert metrics["c_hits"] == 2
+    assert metrics["c_misses"] == 1
+    assert metrics["c_evictions"] == 1
+    assert metrics["c_entries"] == 2
+
+
+def test_lru_cache_enforces_byte_budget_and_ttl():
+    metrics = {}
+    cache = LRUCache(max_entries=100, max_bytes=10, ttl=0.01, metrics=metrics, prefix="c")
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)  # over budget: 'a' goes
+    assert "a" not in cache and metrics["c_bytes"] == 6
+    cache.set("huge", "z" * 50)  # never fits
+    assert "huge" not in cache
+    time.sleep(0.02)
+    assert cache.get("b") is None
+    assert metrics["c_expirations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upload_bytes_uses_cache_and_drops_headers(monkeypatch):
+    monkeypatch.setenv("UPLOAD_INDEX_PATH", "")
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    with respx.mock(assert_all_called=False) as m:
+        route = m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "f1"}, headers={"x-big": "h" * 500})
+        )
+        m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+        )
+        first = await client.upload_bytes(b"abc", "a.txt", alias="a-1")
+        # cached once a chat finds the file ingested
+        await client.query_uploaded(first, "Resume", alias="a-1")
+        second = await client.upload_bytes(b"abc", "a.txt", alias="a-2")
+
+    assert route.call_count == 1
+    assert "headers" in first and "headers" not in second
+    assert second["file_alias_used"] == "a-1" and second["reused"] is True
+    assert client.metrics["upload_cache_misses"] == 1
+    assert client.metrics["upload_cache_hits"] == 1
@@ -0,0 +1,29 @@
+import pytest
+
+from app.codec import JSONCodec, available_backends
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_codecs_round_trip_to_compact_utf8_bytes(backend):
+    c = JSONCodec(backend)
+    obj = {"text": "resumen en español ✓", "n": [1, 2.5, None, True]}
+    out = c.dumps(obj)
+    assert isinstance(out, bytes)
+    assert "español ✓".encode() in out and b": " not in out
+    assert c.loads(out) == obj
+    assert c.loads(out.decode()) == obj
+    assert c.dumps_text(obj) == out.decode()
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_values_the_fast_backends_reject_fall_back_to_stdlib(backend):
+    c = JSONCodec(backend)
+    assert c.loads(c.dumps({"big": 2**70})) == {"big": 2**70}
+    assert c.loads(c.dumps({1: "x"})) == {"1": "x"}
+    assert c.loads(c.dumps({"s": {1, 2}}, default=sorted)) == {"s": [1, 2]}
+    with pytest.raises(ValueError):
+        c.loads(b"{not json")
+
+
+def test_unknown_backend_uses_the_best_available():
+    assert JSONCodec("nope").backend == available_backends()[0]
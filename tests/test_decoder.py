@@ -0,0 +1,79 @@
+import httpx
+import pytest
+import respx
+
+from app.services.ai.decoder import (
+    answer_text,
+    completion_text,
+    decode_completion,
+    first_string,
+    parse_answer,
+    unfence,
+)
+from app.services.ai.processor import AIProcessor
+
+
+def _completion(content):
+    return {
+        "id": "chatcmpl-1",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+    }
+
+
+def test_fenced_and_plain_json_answers():
+    assert parse_answer('{"message": "hola"}') == {"message": "hola"}
+    assert parse_answer('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_answer('Aquí está:\n\n```JSON\n[1, 2]\n```\n') == [1, 2]
+    assert parse_answer('```json {"a": 1}```') == {"a": 1}
+    # cut-off answer: unterminated fence
+    assert parse_answer('```json\n{"a": 1}\n') == {"a": 1}
+    assert parse_answer("texto libre") == {"message": "texto libre"}
+
+
+def test_fence_inside_a_json_string_is_left_alone():
+    text = '{"code": "usa ```python para el bloque```"}'
+    assert unfence(text) is text
+    assert parse_answer(text) == {"code": "usa ```python para el bloque```"}
+
+
+def test_completion_text_shapes():
+    assert completion_text(_completion("hola")) == "hola"
+    assert completion_text({"choices": [{"text": "legacy"}]}) == "legacy"
+    parts = [{"type": "text", "text": "a"}, {"type": "image_url"}, {"type": "text", "text": "b"}]
+    assert completion_text(_completion(parts)) == "ab"
+    assert completion_text({"output": "salida"}) == "salida"
+    # unknown shape: first non-empty string, depth-first
+    assert completion_text({"x": [{}, {"y": ["", "deep"]}], "z": "later"}) == "deep"
+    assert completion_text({"n": 1}) is None
+
+
+def test_first_string_survives_very_deep_responses():
+    obj = "fondo"
+    for _ in range(5000):
+        obj = {"k": [obj]}
+    assert first_string(obj) == "fondo"
+
+
+def test_decode_completion_blank_answers_are_no_text_found():
+    assert decode_completion(_completion("  \n"))["error"] == "no_text_found"
+    assert decode_completion(_completion('{"message": ""}'))["error"] == "no_text_found"
+    assert decode_completion({"n": 1}) == {"n": 1}
+
+
+def test_answer_text_streaming_fragments():
+    assert answer_text({"choices": [{"delta": {"content": " hola"}}]}) == " hola"
+    # role-only / finish deltas are a known shape without text
+    assert answer_text({"choices": [{"delta": {"role": "assistant"}}]}) == ""
+    assert answer_text({"choices": [{"delta": {}, "finish_reason": "stop"}]}) == ""
+    assert answer_text({"text": "t"}) == "t"
+    assert answer_text({"error": "x"}) is None
+
+
+@pytest.mark.asyncio
+async def test_process_decodes_fenced_completion():
+    proc = AIProcessor("t", "o", "p", base_url="https://api.saia.ai/chat")
+    with respx.mock:
+        respx.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(200, json=_completion('```json\n{"message": "ok"}\n```'))
+        )
+        assert await proc.process("assistant", "hola") == {"message": "ok"}
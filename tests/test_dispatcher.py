@@ -0,0 +1,203 @@
+import asyncio
+import base64
+import os
+import threading
+import time
+
+import pytest
+
+from app import tasks
+from app.background import MemoryJobStore
+from app.blobs import SharedBlobStore, blob_store
+from app.dispatcher import JobDispatcher
+from app.worker_runtime import WorkerRuntime
+
+
+class _FakeClient:
+    def __init__(self):
+        self.seen = []
+        self.delay = 0.0
+        self.cancelled = 0
+
+    async def send_bytes_and_query(self, blob, filename, prompt, **kwargs):
+        self.seen.append(bytes(blob.view()))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return {"message": f"{filename}:{prompt}"}
+
+
+@pytest.fixture(autouse=True)
+def _shared_blob_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(tasks.shared_blobs, "blob_dir", str(tmp_path / "shared"))
+
+
+@pytest.fixture
+def fake_runtime(monkeypatch):
+    client = _FakeClient()
+    rt = WorkerRuntime(concurrency=1, client_factory=lambda: client)
+    monkeypatch.setattr(tasks, "runtime", rt)
+    yield client
+    rt.close()
+
+
+def _payload():
+    return {"filename": "a.pdf", "prompt": "resume", "folder": "f", "alias": "a", "assistant": "x"}
+
+
+def test_process_upload_runs_job_payload_on_worker_runtime(fake_runtime):
+    before = blob_store.stats()["count"]
+    res = tasks.process_upload(dict(_payload(), file_b64=base64.b64encode(b"PDF").decode()))
+    assert res == {"message": "a.pdf:resume"}
+    assert fake_runtime.seen == [b"PDF"]
+    assert blob_store.stats()["count"] == before
+
+
+def test_process_upload_reads_blob_by_reference(fake_runtime):
+    ref = tasks.shared_blobs.put(b"PDF")
+    assert ref.startswith("file:")
+    assert tasks.process_upload(dict(_payload(), blob_ref=ref)) == {"message": "a.pdf:resume"}
+    assert fake_runtime.seen == [b"PDF"]
+    assert tasks.process_upload(dict(_payload(), blob_ref="file:" + "0" * 64))["detail"] == (
+        "blob_not_found"
+    )
+
+
+def test_shared_blobs_are_written_once_per_content(tmp_path):
+    store = SharedBlobStore(blob_dir=str(tmp_path), ttl=60)
+    r1 = store.put(b"same bytes")
+    r2 = store.put(b"same bytes")
+    assert r1 == r2
+    assert store.metrics["writes"] == 1 and store.metrics["dedup_hits"] == 1
+    blob = store.get(r1)
+    assert blob.path and bytes(blob.view()) == b"same bytes"
+
+    old = store._path(r1.split(":", 1)[1])
+    os.utime(old, (0, 0))
+    assert store.sweep() == 1
+    assert store.get(r1) is None
+
+
+def test_shared_blobs_redis_backend():
+    fakeredis = pytest.importorskip("fakeredis")
+    conn = fakeredis.FakeStrictRedis()
+    store = SharedBlobStore(redis_conn=conn, backend="redis", ttl=60)
+    ref = store.put(b"\x00binary")
+    assert ref.startswith("redis:") and store.put(b"\x00binary") == ref
+    assert conn.ttl(f"blob:{ref[6:]}") > 0
+    assert bytes(store.get(ref).view()) == b"\x00binary"
+
+
+def test_dispatcher_without_queue_is_local():
+    d = JobDispatcher(None, store=MemoryJobStore())
+    assert d.mode == "local"
+    assert d.stats()["mode"] == "local"
+
+
+@pytest.mark.asyncio
+async def test_rq_job_state_is_mirrored_into_job_store(fake_runtime):
+    fakeredis = pytest.importorskip("fakeredis")
+    rq = pytest.importorskip("rq")
+
+    conn = fakeredis.FakeStrictRedis()
+    queue = rq.Queue("default", connection=conn)
+    store = MemoryJobStore()
+    d = JobDispatcher(queue, store=store, poll_interval=0.05)
+
+    job_id = store.create(_payload())
+    await d.enqueue(job_id, _payload(), blob_store.put(b"PDF"))
+    assert d.mode == "rq" and queue.count == 1
+    assert d.stats()["queue_depth"] == 1
+    # the queued job carries a reference, never the file bytes
+    assert queue.jobs[0].args[0]["blob_ref"].startswith("file:")
+    assert "file_b64" not in queue.jobs[0].args[0]
+    await d.sync_once()
+    assert store.get(job_id)["status"] == "queued"
+
+    rq.SimpleWorker([queue], connection=conn).work(burst=True)
+
+    assert await d.sync_once() == 1
+    assert d.stats()["queue_depth"] == 0
+    j = store.get(job_id)
+    assert j["status"] == "finished"
+    assert j["result"] == {"message": "a.pdf:resume"}
+    assert fake_runtime.seen == [b"PDF"]
+    # another web process only has Redis to go by
+    assert (await d.lookup(job_id))["status"] == "finished"
+    await d.stop()
+
+
+@pytest.mark.asyncio
+async def test_threaded_worker_runs_jobs_outside_the_main_thread(fake_runtime, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    rq = pytest.importorskip("rq")
+    from app import worker
+
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(worker, "redis_conn", conn)
+    queue = rq.Queue("default", connection=conn)
+    store = MemoryJobStore()
+    d = JobDispatcher(queue, store=store)
+    job_id = store.create(_payload())
+    await d.enqueue(job_id, _payload(), blob_store.put(b"PDF"))
+
+    # WORKER_CONCURRENCY > 1: every worker but one runs in its own thread
+    w = worker._make_worker([queue], name="t-0")
+    t = threading.Thread(target=w.work, kwargs={"burst": True})
+    t.start()
+    t.join(10)
+
+    await d.sync_once()
+    assert store.get(job_id)["status"] == "finished"
+    await d.stop()
+
+
+@pytest.mark.asyncio
+async def test_job_past_its_timeout_is_stopped_and_failed(fake_runtime, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    rq = pytest.importorskip("rq")
+    from app import worker
+
+    conn = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(worker, "redis_conn", conn)
+    queue = rq.Queue("default", connection=conn)
+    store = MemoryJobStore()
+    d = JobDispatcher(queue, store=store)
+    d.job_timeout = 1
+    fake_runtime.delay = 4
+    job_id = store.create(_payload())
+    await d.enqueue(job_id, _payload(), blob_store.put(b"PDF"))
+
+    w = worker._make_worker([queue], name="t-timeout")
+    t0 = time.monotonic()
+    t = threading.Thread(target=w.work, kwargs={"burst": True})
+    t.start()
+    t.join(10)
+    assert time.monotonic() - t0 < 3
+    assert fake_runtime.cancelled == 1
+
+    await d.sync_once()
+    j = store.get(job_id)
+    assert j["status"] == "failed"
+    assert "JobTimeoutException" in j["error"]
+    await d.stop()
+
+
+def test_shared_blobs_default_to_redis_with_a_connection(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.delenv("SHARED_BLOB_BACKEND", raising=False)
+    assert SharedBlobStore(redis_conn=fakeredis.FakeStrictRedis()).backend == "redis"
+    assert SharedBlobStore().backend == "file"
+
+
+def test_worker_refuses_an_unshared_file_backend(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app import worker
+
+    monkeypatch.setattr(worker, "redis_conn", fakeredis.FakeStrictRedis())
+    monkeypatch.setattr(worker.shared_blobs, "backend", "file")
+    monkeypatch.delenv("SHARED_BLOB_DIR", raising=False)
+    with pytest.raises(SystemExit, match="SHARED_BLOB_DIR"):
+        worker.main(burst=True)
@@ -0,0 +1,29 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_slow_fast_path_hands_job_to_background_without_restarting(monkeypatch, saia):
+    monkeypatch.setenv("FAST_CHAT_TIMEOUT", "0.05")
+
+    async def slow_chat(request):
+        await asyncio.sleep(0.3)
+        return saia.reply()
+
+    saia.chat.side_effect = slow_chat
+    with TestClient(app) as c:
+        r = c.post(
+            "/upload_pdf",
+            files={"file": ("a.txt", b"hola mundo", "text/plain")},
+            data={"prompt": "Resume"},
+        )
+        body = r.json()
+        assert body["status"] == "queued"
+        st = c.get(f"/status/{body['job_id']}", params={"wait": 5}).json()
+
+    assert st["status"] == "finished"
+    assert st["result"]["message"] == "ok"
+    # the in-flight upload and chat were reused, not repeated
+    assert saia.uploads.call_count == 1 and saia.chat.call_count == 1
@@ -0,0 +1,129 @@
+import asyncio
+import gc
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.http_transport import TransportManager
+
+
+async def _serve(reader, writer):
+    # minimal keep-alive HTTP/1.1 server: one fixed response per request
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if not head:
+                break
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: 11\r\n\r\n{\"ok\":true}"
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_services_share_one_warm_pool_per_origin():
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    manager = TransportManager(http2=False)
+    try:
+        chat = manager.get(f"http://127.0.0.1:{port}/chat")
+        files = manager.get(f"http://127.0.0.1:{port}/v1/files")
+        assert chat is files
+
+        for path in ("/chat", "/v1/files", "/chat"):
+            r = await chat.get(f"http://127.0.0.1:{port}{path}")
+            assert r.status_code == 200
+
+        pool = manager.stats()["pools"][f"http://127.0.0.1:{port}"]
+        assert pool["requests"] == 3
+        # keepalive: one connect served every request
+        assert pool["connects"] == 1
+        assert pool["connect_time_avg"] is not None
+        assert pool["idle"] == 1 and pool["active"] == 0 and pool["waiters"] == 0
+    finally:
+        await manager.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_connections_and_keepalive_pings_idle_pool():
+    server = await asyncio.start_server(_serve, "127.0.0.1", 0)
+    base = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    manager = TransportManager(http2=False)
+    try:
+        report = await manager.warm_up([f"{base}/chat", f"{base}/v1/files"], 3)
+        origin = next(iter(report))
+        assert report[origin]["connections_opened"] == 3
+        assert manager.stats()["pools"][origin]["idle"] == 3
+
+        task = asyncio.create_task(manager.keepalive([base], 0.05))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        assert manager.keepalive_pings >= 3
+        # pings reuse the warm connections instead of opening new ones
+        assert manager.stats()["pools"][origin]["connects"] == 3
+    finally:
+        await manager.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+# the client of a closed loop can't be closed, only collected: its socket is
+# closed by the garbage collector, which warns about it
+@pytest.mark.filterwarnings("ignore::ResourceWarning")
+def test_loop_change_closes_pools_of_the_previous_loop():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    manager = TransportManager(http2=False)
+
+    async def request():
+        client = manager.get(url)
+        assert (await client.get(url)).status_code == 200
+        return client
+
+    try:
+        # asyncio.run closes each loop, as per-job loops and test loops do
+        first = asyncio.run(request())
+        first_ref = weakref.ref(first)
+        del first
+        second = asyncio.run(request())
+        assert second is not first_ref()
+        assert manager.stats()["loop_changes"] == 1
+        # nothing keeps the client of the closed loop alive
+        gc.collect()
+        assert first_ref() is None
+
+        # a loop that is still running elsewhere closes its own clients
+        loop = asyncio.new_event_loop()
+        t = threading.Thread(target=loop.run_forever, daemon=True)
+        t.start()
+        third = asyncio.run_coroutine_threadsafe(request(), loop).result(5)
+        asyncio.run(manager.aclose())
+        assert third.is_closed
+        loop.call_soon_threadsafe(loop.stop)
+        t.join(5)
+        loop.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.background import MemoryJobStore
+from app.main import app
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_as_soon_as_job_finishes():
+    store = MemoryJobStore()
+    job_id = store.create({})
+
+    async def finish():
+        await asyncio.sleep(0.05)
+        store.set_stage(job_id, "chatting")
+        store.set_result(job_id, {"message": "ok"})
+
+    asyncio.create_task(finish())
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    j = await store.wait(job_id, 5)
+    assert j["status"] == "finished" and loop.time() - t0 < 1
+    # a job that doesn't finish in time is returned as it is
+    other = store.create({})
+    assert (await store.wait(other, 0.05))["status"] == "queued"
+
+
+def test_events_stream_sends_stage_transitions(saia):
+    replies = iter(
+        [
+            httpx.Response(400, json={"error": {"code": "8024", "message": "no pages"}}),
+            saia.reply(),
+        ]
+    )
+
+    async def chat(request):
+        await asyncio.sleep(0.05)
+        return next(replies)
+
+    saia.chat.side_effect = chat
+    with TestClient(app) as c:
+        job = c.post(
+            "/upload_pdf",
+            files={"file": ("a.txt", b"hola", "text/plain")},
+            data={"prompt": "Resume"},
+        ).json()
+        with c.stream("GET", f"/status/{job['job_id']}/events") as r:
+            body = "".join(r.iter_text())
+
+    events = [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in body.strip().split("\n\n")
+        if block.startswith("event:")
+    ]
+    stages = [data.get("stage") for _, data in events]
+    assert "chatting" in stages and "ingesting" in stages
+    assert events[-1][0] == "done"
+    assert events[-1][1]["status"] == "finished"
+    assert events[-1][1]["result"]["message"] == "ok"
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import pytest
+
+from app.background import MemoryJobStore as JobStore
+
+
+def test_payload_dropped_on_finish_and_ttl_expiry():
+    store = JobStore(ttl=60, max_jobs=100, max_bytes=1_000_000)
+    job_id = store.create({"inline_text": "x" * 5000})
+    assert store.stats()["bytes"] > 5000
+    store.set_result(job_id, {"message": "ok"})
+    assert store.get(job_id)["payload"] == {}
+    assert store.stats()["bytes"] < 1000
+
+    store.get(job_id)["updated_at"] = time.time() - 120
+    running = store.create({})
+    store.get(running)["updated_at"] = time.time() - 120
+    assert store.sweep() == 1
+    assert store.get(job_id) is None
+    # unfinished jobs don't expire with the TTL
+    assert store.get(running) is not None
+
+
+def test_caps_evict_oldest_finished_jobs_only():
+    store = JobStore(ttl=3600, max_jobs=3, max_bytes=1_000_000)
+    queued = store.create({})
+    done = []
+    for _ in range(3):
+        j = store.create({})
+        store.set_result(j, {"message": "ok"})
+        done.append(j)
+    assert store.stats()["jobs"] == 3
+    assert store.get(queued) is not None
+    assert store.get(done[0]) is None
+    assert store.stats()["evicted"] == 1
+
+    small = JobStore(ttl=3600, max_jobs=100, max_bytes=200)
+    a = small.create({})
+    small.set_result(a, {"message": "a" * 150})
+    b = small.create({})
+    small.set_result(b, {"message": "b" * 150})
+    assert small.get(a) is None and small.get(b) is not None
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    from app.background import SQLiteJobStore
+
+    path = str(tmp_path / "jobs.sqlite3")
+    # two instances stand in for two gunicorn workers on the same machine
+    web1 = SQLiteJobStore(path, ttl=60)
+    web2 = SQLiteJobStore(path, ttl=60)
+    job_id = web1.create({"blob_id": "abc"})
+    assert web2.get(job_id)["status"] == "queued"
+    # the payload stays with the process running the job
+    assert web1.get(job_id)["payload"] == {"blob_id": "abc"}
+    assert web2.get(job_id)["payload"] == {}
+
+    web1.set_result(job_id, {"message": "hola ñ"})
+    j = web2.get(job_id)
+    assert j["status"] == "finished" and j["result"] == {"message": "hola ñ"}
+    assert web1.get(job_id)["payload"] == {}
+    assert web2.stats()["by_status"] == {"finished": 1}
+
+    web2.execute("UPDATE jobs SET updated_at = 0 WHERE id = ?", (job_id,))
+    assert web1.sweep() == 1 and web2.get(job_id) is None
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    from app.background import JobStore as BaseJobStore
+
+    class NoSweep(BaseJobStore):
+        def create(self, payload=None):
+            return "x"
+
+    with pytest.raises(TypeError, match="sweep"):
+        NoSweep()
+
+
+def test_sqlite_stage_write_does_not_wait_out_a_locked_database(tmp_path):
+    import sqlite3
+
+    from app.background import SQLiteJobStore
+
+    path = str(tmp_path / "jobs.sqlite3")
+    store = SQLiteJobStore(path, ttl=60)
+    job_id = store.create({})
+    # another process holding the write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        t0 = time.monotonic()
+        store.set_stage(job_id, "chatting")
+        assert time.monotonic() - t0 < 1
+        assert store.metrics["stage_writes_skipped"] == 1
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+    store.set_stage(job_id, "chatting")
+    assert asyncio.run(store.aget(job_id))["stage"] == "chatting"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_sweep_fails_jobs_left_unfinished_past_max_age(backend, tmp_path):
+    from app.background import SQLiteJobStore
+
+    if backend == "memory":
+        store = JobStore(ttl=60, max_age=600)
+    else:
+        store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), ttl=60, max_age=600)
+    stale = store.create({})
+    fresh = store.create({})
+    store.set_status(stale, "running")
+    # created before a restart: nobody will ever finish it
+    if backend == "memory":
+        store.get(stale)["created_at"] = time.time() - 700
+    else:
+        store.execute("UPDATE jobs SET created_at = ? WHERE id = ?", (time.time() - 700, stale))
+
+    assert store.sweep() == 1
+    j = store.get(stale)
+    assert j["status"] == "failed" and j["error"] == "job_abandoned"
+    assert store.get(fresh)["status"] == "queued"
+    assert store.stats()["abandoned"] == 1
+
+
+def test_sqlite_writes_from_the_loop_run_off_it_and_keep_totals(tmp_path):
+    import threading
+
+    from app.background import SQLiteJobStore
+
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), ttl=60, max_jobs=3)
+    threads = set()
+    execute = store.execute
+
+    def spy(*args, **kwargs):
+        threads.add(threading.current_thread())
+        return execute(*args, **kwargs)
+
+    store.execute = spy
+
+    async def run():
+        ids = [await store.acreate({}) for _ in range(3)]
+        await store.aset_status(ids[0], "running")
+        store.report_stage(ids[0], "chatting")
+        await store.aset_result(ids[0], {"message": "x" * 100})
+        await store.aset_error(ids[1], "boom")
+        return ids
+
+    ids = asyncio.run(run())
+    assert threading.main_thread() not in threads
+    # the stage reported before the result doesn't land after it
+    assert store.get(ids[0])["stage"] == "finished"
+    assert store.get(ids[1])["status"] == "failed"
+
+    # over max_jobs: the oldest finished job goes, counted from the totals row
+    store.set_result(store.create({}), "ok")
+    assert store.get(ids[0]) is None and store.metrics["evicted"] == 1
+    rows, size = store.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM jobs")[0]
+    assert rows == 3
+    assert store.execute("SELECT jobs, bytes FROM job_totals")[0] == (rows, size)
@@ -0,0 +1,114 @@
+import io
+import time
+
+import pytest
+from PyPDF2 import PdfWriter
+
+from app.services import preflight as pf
+from app.services.preflight import PdfPreflight
+
+
+def _pdf(pages: int) -> bytes:
+    w = PdfWriter()
+    for _ in range(pages):
+        w.add_blank_page(width=200, height=200)
+    buf = io.BytesIO()
+    w.write(buf)
+    return buf.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_structural_check_counts_pages_and_caches():
+    checker = PdfPreflight(max_workers=1, timeout=5)
+    data = _pdf(3)
+    res = await checker.check(data)
+    assert res["ok"] and res["pages"] == 3 and res["method"] == "structural"
+
+    again = await checker.check(data)
+    assert again.get("cached") and again["pages"] == 3
+    assert checker.metrics["preflight_runs"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rejects_zero_pages_and_non_pdf(tmp_path):
+    checker = PdfPreflight(max_workers=1, timeout=5)
+    empty = await checker.check(_pdf(0))
+    assert not empty["ok"] and empty["error"] == "document_no_pages"
+
+    p = tmp_path / "fake.pdf"
+    p.write_bytes(b"hello" * 100)
+    bad = await checker.check(str(p))
+    assert not bad["ok"] and "%PDF" in bad["detail"]
+
+
+@pytest.mark.asyncio
+async def test_inconclusive_structure_falls_back_to_full_parse_within_budget(monkeypatch):
+    checker = PdfPreflight(max_workers=1, timeout=0.05)
+    data = _pdf(2).replace(b"startxref", b"startxrex")
+
+    def slow(buf):
+        time.sleep(0.3)
+        return pf._result(True, "full", pages=2)
+
+    monkeypatch.setattr(pf, "full_check", slow)
+    started = time.monotonic()
+    res = await checker.check(data)
+    assert time.monotonic() - started < 0.25
+    assert res["ok"] and res["method"] == "timeout"
+    assert checker.metrics["preflight_timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rejects_while_timed_out_checks_hold_the_pool(monkeypatch):
+    checker = PdfPreflight(max_workers=1, timeout=0.05)
+
+    def slow(buf):
+        time.sleep(0.3)
+        return pf._result(True, "full", pages=1)
+
+    monkeypatch.setattr(pf, "full_check", slow)
+    first = await checker.check(_pdf(1).replace(b"startxref", b"startxrex"))
+    assert first["ok"] and first["method"] == "timeout"
+
+    busy = await checker.check(_pdf(2).replace(b"startxref", b"startxrex"))
+    assert not busy["ok"] and busy["error"] == "preflight_unavailable"
+    assert checker.metrics["preflight_busy_rejects"] == 1
+
+    time.sleep(0.35)
+    assert (await checker.check(_pdf(3)))["ok"]
+    checker.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_check_reads_its_own_copy_of_the_fd(monkeypatch, tmp_path):
+    import hashlib
+    import mmap
+    import os
+    from types import SimpleNamespace
+
+    checker = PdfPreflight(max_workers=1, timeout=0.05)
+    real_mmap = mmap.mmap
+
+    def slow_mmap(fd, *args, **kwargs):
+        time.sleep(0.2)
+        return real_mmap(fd, *args, **kwargs)
+
+    monkeypatch.setattr(pf, "mmap", SimpleNamespace(mmap=slow_mmap, ACCESS_READ=mmap.ACCESS_READ))
+    data = _pdf(2)
+    (tmp_path / "a.pdf").write_bytes(data)
+    (tmp_path / "other").write_bytes(b"hello" * 100)
+
+    fd = os.open(tmp_path / "a.pdf", os.O_RDONLY)
+    res = await checker.check(fd)
+    assert res["method"] == "timeout"
+    # the upload is closed and its number reused while the check still runs
+    os.close(fd)
+    reused = os.open(tmp_path / "other", os.O_RDONLY)
+    try:
+        assert reused == fd
+        time.sleep(0.3)
+        assert checker._cache.get(hashlib.sha256(data).hexdigest())["pages"] == 2
+        os.fstat(reused)  # not closed by the check either
+    finally:
+        os.close(reused)
+        checker.shutdown()
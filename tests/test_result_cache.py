@@ -0,0 +1,108 @@
+import httpx
+import pytest
+import respx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.ai.result_cache import ChatResultCache, normalize_prompt
+from app.services.ai.saia_console_client import SAIAConsoleClient
+
+
+def test_prompt_normalization_shares_entry(tmp_path):
+    cache = ChatResultCache(str(tmp_path / "r.sqlite3"), ttl=60, max_bytes=10_000)
+    assert normalize_prompt("  Resume   el ARCHIVO ") == "resume el archivo"
+    cache.put("abc", "Resume el archivo", "asst", {"message": "ok"})
+    assert cache.get("abc", "resume  el archivo", "asst") == {"message": "ok"}
+    assert cache.get("abc", "resume el archivo", "other") is None
+    # errors are never cached
+    assert not cache.put("abc", "otro", "asst", {"error": "chat_failed"})
+
+
+def test_ttl_and_size_cap(tmp_path):
+    cache = ChatResultCache(str(tmp_path / "r.sqlite3"), ttl=0, max_bytes=10_000)
+    cache.put("abc", "p", "a", {"message": "ok"})
+    assert cache.get("abc", "p", "a") is None
+
+    cache = ChatResultCache(str(tmp_path / "r2.sqlite3"), ttl=60, max_bytes=100)
+    cache.put("a1", "p", "a", {"message": "x" * 60})
+    cache.put("a2", "p", "a", {"message": "y" * 60})
+    # least recently used entry was trimmed to fit the budget
+    assert cache.get("a1", "p", "a") is None
+    assert cache.get("a2", "p", "a") is not None
+
+
+@pytest.mark.asyncio
+async def test_cached_answer_skips_network_and_bypass(tmp_path):
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai",
+        result_cache=ChatResultCache(str(tmp_path / "r.sqlite3")),
+    )
+    with respx.mock(assert_all_called=False) as m:
+        up_route = m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "file_1"})
+        )
+        chat_route = m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+            )
+        )
+        first = await client.send_bytes_and_query(b"%PDF doc", "doc.pdf", "Resume")
+        second = await client.send_bytes_and_query(b"%PDF doc", "doc.pdf", " resume ")
+        assert first.get("message") == second.get("message") == "ok"
+        assert chat_route.call_count == 1
+        assert client.metrics["result_cache_hits"] == 1
+
+        await client.send_bytes_and_query(
+            b"%PDF doc", "doc.pdf", "Resume", use_cache=False
+        )
+        assert chat_route.call_count == 2
+        assert up_route.call_count >= 1
+
+
+def test_upload_pdf_counts_one_miss_per_request(monkeypatch, saia):
+    monkeypatch.setenv("CHAT_RESULT_CACHE", "1")
+    monkeypatch.setenv("FAST_CHAT_TIMEOUT", "5")
+    with TestClient(app) as c:
+        for _ in range(2):
+            r = c.post(
+                "/upload_pdf",
+                files={"file": ("a.txt", b"hola mundo", "text/plain")},
+                data={"prompt": "Resume"},
+            )
+            assert r.json()["status"] == "finished"
+        metrics = app.state.saia_client.metrics
+
+    assert metrics["result_cache_misses"] == 1
+    assert metrics["result_cache_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_result_cache_sqlite_runs_off_the_event_loop(tmp_path):
+    import threading
+
+    cache = ChatResultCache(str(tmp_path / "r.sqlite3"))
+    threads = []
+    execute = cache.execute
+
+    def spy(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return execute(*args, **kwargs)
+
+    cache.execute = spy
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai", result_cache=cache
+    )
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "file_1"})
+        )
+        m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+            )
+        )
+        await client.send_bytes_and_query(b"%PDF doc", "doc.pdf", "Resume")
+        hit = await client.cached_result(client._sha256(b"%PDF doc"), "Resume")
+        assert hit["message"] == "ok"
+
+    assert threads and threading.current_thread() not in threads
@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from app.services.ai.retry import IngestionRetryScheduler, size_bucket
+from app.services.ai.saia_console_client import SAIAConsoleClient
+
+
+def test_plan_uses_observed_quantiles_within_deadline():
+    sched = IngestionRetryScheduler(deadline=5.0, max_attempts=20, min_samples=3)
+    for latency in (1.0, 1.2, 1.4, 1.6, 3.0):
+        sched.record("pdf", 2 * 1024 * 1024, latency, retries=1)
+
+    plan = sched.plan(".pdf", 3 * 1024 * 1024)
+    first = plan.next_delay(0.3)
+    assert first == pytest.approx(1.4 - 0.3)  # p50 of the bucket
+    total = 0.3 + first
+    while True:
+        d = plan.next_delay(total)
+        if d is None:
+            break
+        total += d
+    assert total <= 5.0 + 1e-9
+
+    stats = sched.stats()["buckets"][f"pdf:{size_bucket(2 * 1024 * 1024)}"]
+    assert stats["samples"] == 5 and stats["p50"] == 1.4
+
+
+def test_unseen_bucket_falls_back_to_legacy_schedule():
+    plan = IngestionRetryScheduler(deadline=10.0).plan("txt", 10)
+    assert plan.next_delay(0.0) == pytest.approx(0.2)
+
+
+@pytest.mark.asyncio
+async def test_query_retries_8024_and_records_latency():
+    sched = IngestionRetryScheduler(deadline=2.0, max_attempts=5)
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai",
+        retry_scheduler=sched,
+    )
+    busy = httpx.Response(
+        400, json={"error": {"message": "The document has no pages.", "code": "8024"}}
+    )
+    ok = httpx.Response(200, json={"choices": [{"message": {"content": "listo"}}]})
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "f"})
+        )
+        chat = m.post("https://api.saia.ai/chat").mock(side_effect=[busy, busy, ok])
+        res = await client.send_bytes_and_query(b"abc", "a.txt", "Resume")
+
+    assert res.get("message") == "listo"
+    assert chat.call_count == 3
+    bucket = sched.stats()["buckets"]["txt:<100KB"]
+    assert bucket["retries"] == 2 and bucket["samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_chat_latency_is_not_recorded_as_ingestion_latency():
+    sched = IngestionRetryScheduler(deadline=2.0, max_attempts=5)
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai",
+        retry_scheduler=sched,
+    )
+
+    async def slow_answer(request):
+        # a long generation once the file is ingested
+        await asyncio.sleep(0.5)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "listo"}}]})
+
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "f"})
+        )
+        m.post("https://api.saia.ai/chat").mock(side_effect=slow_answer)
+        await client.send_bytes_and_query(b"abc", "a.txt", "Resume")
+
+    assert sched.stats()["buckets"]["txt:<100KB"]["p50"] < 0.2
@@ -37,3 +37,59 @@ async def test_upload_and_chat(monkeypatch, tmp_path):
         assert up.get("id") == "file_123"
         res = await client.send_pdf_and_query(str(p), "Resume el archivo")
         assert res.get("message") == "ok"
+
+
+@pytest.mark.asyncio
+async def test_upload_chunks_streams_multipart_and_hashes():
+    import hashlib
+
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    parts = [b"%PDF-1.4 ", b"x" * 1000, b" %%EOF"]
+
+    async def chunks():
+        for p in parts:
+            yield p
+
+    seen = {}
+
+    def capture(request):
+        seen["body"] = request.read()
+        seen["headers"] = request.headers
+        return httpx.Response(200, json={"id": "file_456"})
+
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(side_effect=capture)
+        up = await client.upload_chunks(
+            chunks(), "doc.pdf", alias="doc-1", size=sum(len(p) for p in parts)
+        )
+
+    data = b"".join(parts)
+    assert up.get("id") == "file_456"
+    assert up["file_size"] == len(data)
+    assert up["file_sha256"] == hashlib.sha256(data).hexdigest()
+    assert int(seen["headers"]["content-length"]) == len(seen["body"])
+    assert seen["headers"]["fileName"] == "doc-1"
+    assert data in seen["body"]
+    assert b'filename="doc.pdf"' in seen["body"]
+
+
+@pytest.mark.asyncio
+async def test_upload_chunks_rejects_oversized_stream():
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+
+    async def chunks():
+        for _ in range(10):
+            yield b"x" * 100
+
+    def consume(request):
+        request.read()
+        return httpx.Response(200, json={"id": "never"})
+
+    with respx.mock(assert_all_called=False) as m:
+        m.post("https://api.saia.ai/v1/files").mock(side_effect=consume)
+        up = await client.upload_chunks(chunks(), "doc.txt", max_bytes=500)
+    assert up["error"] == "file_too_large"
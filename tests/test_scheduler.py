@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.scheduler import JobScheduler, QueueFull
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_clients_and_priority_first():
+    sched = JobScheduler(workers=1, max_queue=10)
+    gate = asyncio.Event()
+    order = []
+
+    def job(name):
+        async def run():
+            await gate.wait()
+            order.append(name)
+            return name
+        return run
+
+    # the first job occupies the only worker; the rest queue up behind it
+    futs = [sched.submit(job("a0"), client="a")]
+    await asyncio.sleep(0)
+    futs += [sched.submit(job(f"a{i}"), client="a") for i in range(1, 4)]
+    futs.append(sched.submit(job("b1"), client="b"))
+    futs.append(sched.submit(job("urgent"), client="c", priority=0))
+    assert sched.stats()["queue_depth"] == 5
+    gate.set()
+    await asyncio.gather(*futs)
+    assert order == ["a0", "urgent", "a1", "b1", "a2", "a3"]
+    stats = sched.stats()
+    assert stats["completed"] == 6 and stats["wait_max"] is not None
+    await sched.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_with_retry_after():
+    sched = JobScheduler(workers=1, max_queue=2)
+    gate = asyncio.Event()
+
+    async def blocked():
+        await gate.wait()
+
+    sched.submit(blocked)
+    await asyncio.sleep(0)
+    sched.submit(blocked)
+    sched.submit(blocked)
+    with pytest.raises(QueueFull) as exc:
+        sched.submit(blocked)
+    assert exc.value.retry_after >= 1
+    assert sched.stats()["rejected"] == 1
+    gate.set()
+    await sched.stop()
+
+
+def test_upload_pdf_returns_429_when_queue_full(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.scheduler import job_scheduler
+
+    monkeypatch.setattr(job_scheduler, "is_full", lambda: True)
+    r = TestClient(app).post(
+        "/upload_pdf", files={"file": ("a.txt", b"hola", "text/plain")}
+    )
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert r.json()["error"] == "queue_full"
+
+
+def test_shutdown_stops_jobs_before_closing_http_pools(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    order = []
+
+    def recorder(name):
+        async def record():
+            order.append(name)
+
+        return record
+
+    monkeypatch.setattr(main.job_scheduler, "stop", recorder("scheduler"))
+    monkeypatch.setattr(main.job_dispatcher, "stop", recorder("dispatcher"))
+    monkeypatch.setattr(main.transport_manager, "aclose", recorder("http"))
+    with TestClient(main.app):
+        pass
+    # jobs still in flight must not meet closed clients
+    assert order == ["scheduler", "dispatcher", "http"]
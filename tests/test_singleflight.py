@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.services.ai.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_upload_and_chat():
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    client.upload_index = None
+
+    async def slow_chat(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+        )
+
+    with respx.mock(assert_all_called=False) as m:
+        up_route = m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "file_1"})
+        )
+        chat_route = m.post("https://api.saia.ai/chat").mock(side_effect=slow_chat)
+        results = await asyncio.gather(
+            *[
+                client.send_bytes_and_query(b"%PDF same", "doc.pdf", "Resume")
+                for _ in range(5)
+            ]
+        )
+
+    assert up_route.call_count == 1
+    assert chat_route.call_count == 1
+    assert all(r.get("message") == "ok" for r in results)
+    # each caller gets its own dict
+    assert len({id(r) for r in results}) == 5
+    assert client.metrics["singleflight_leaders"] == 1
+    assert client.metrics["singleflight_coalesced"] == 4
+    assert client.metrics["singleflight_coalesce_rate"] == 0.8
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_shared_call_alive():
+    sf = SingleFlight()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def work():
+        started.set()
+        await release.wait()
+        return "done"
+
+    a = asyncio.ensure_future(sf.do("k", work))
+    b = asyncio.ensure_future(sf.do("k", work))
+    await started.wait()
+    a.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await b == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await a
+
+
+@pytest.mark.asyncio
+async def test_cancelling_every_waiter_cancels_shared_call():
+    sf = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    a = asyncio.ensure_future(sf.do("k", work))
+    b = asyncio.ensure_future(sf.do("k", work))
+    await started.wait()
+    a.cancel()
+    b.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert sf.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_query_uploaded_keys_single_flight_on_folder():
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    up = {"file_sha256": "ab" * 32, "file_alias_used": "doc"}
+
+    async def slow_chat(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+        )
+
+    with respx.mock(assert_all_called=False) as m:
+        chat_route = m.post("https://api.saia.ai/chat").mock(side_effect=slow_chat)
+        await asyncio.gather(
+            *[
+                client.query_uploaded(up, "Resume", alias="doc", folder=folder, use_cache=False)
+                for folder in ("a", "a", "b")
+            ]
+        )
+
+    # same folder shares one chat call, another folder gets its own
+    assert chat_route.call_count == 2
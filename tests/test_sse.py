@@ -0,0 +1,78 @@
+import json
+
+import httpx
+import pytest
+import respx
+
+from app.services.ai.processor import AIProcessor
+from app.services.ai.sse import DeltaAssembler, SSEParser, TextDelta, iter_text_deltas
+
+
+def _chunk(text):
+    return b"data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": text}}]}).encode()
+
+
+def test_parser_handles_multiline_fields_comments_and_split_crlf():
+    raw = (
+        b": keep-alive\r\n"
+        b"event: update\r\nid: 7\r\ndata: line one\r\ndata: line two\r\n\r\n"
+        b"data:no-space\n\n"
+        b"data: last\r\r"
+    )
+    p = SSEParser()
+    events = []
+    # one byte at a time: every boundary, including between \r and \n
+    for i in range(len(raw)):
+        events += p.feed(raw[i:i + 1])
+    events += p.flush()
+    assert [(e.event, e.data, e.id) for e in events] == [
+        ("update", b"line one\nline two", "7"),
+        ("message", b"no-space", "7"),
+        ("message", b"last", "7"),
+    ]
+
+
+def test_flush_dispatches_unterminated_last_event():
+    p = SSEParser()
+    assert p.feed(b"data: [DONE]") == []
+    assert [e.data for e in p.flush()] == [b"[DONE]"]
+
+
+def test_assembler_extracts_delta_text_and_skips_empty_deltas():
+    asm = DeltaAssembler()
+    p = SSEParser()
+    raw = (
+        b'data: {"choices":[{"index":0,"delta":{"role":"assistant"}}]}\n\n'
+        + _chunk("Hola") + b"\n\n"
+        + _chunk(" mundo") + b"\n\n"
+        + b'data: {"choices":[{"index":0,"delta":{},"finish_reason":"stop"}]}\n\n'
+        + b"data: [DONE]\n\n"
+    )
+    out = [d for d in (asm.feed(e) for e in p.feed(raw)) if d is not None]
+    assert out == [TextDelta("Hola"), TextDelta(" mundo")]
+    assert asm.text == "Hola mundo"
+    assert asm.finish_reason == "stop" and asm.done
+
+
+@pytest.mark.asyncio
+async def test_iter_text_deltas_stops_at_done():
+    async def chunks():
+        yield _chunk("a") + b"\n\ndata: [DO"
+        yield b"NE]\n\n"
+        yield _chunk("never") + b"\n\n"
+
+    assert [d.text async for d in iter_text_deltas(chunks())] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_process_stream_yields_text_deltas():
+    body = b"".join(_chunk(t) + b"\n\n" for t in ("uno ", "dos")) + b"data: [DONE]\n\n"
+    proc = AIProcessor("t", "o", "p", base_url="https://api.saia.ai/chat")
+    with respx.mock:
+        respx.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, content=body, headers={"Content-Type": "text/event-stream"}
+            )
+        )
+        out = [x async for x in proc.process_stream("assistant", "hola")]
+    assert out == [TextDelta("uno "), TextDelta("dos")]
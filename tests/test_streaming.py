@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.streaming import RaceStats, coalesced_sse, hedged_stream
+from app.main import app
+
+
+def _frames(raw: bytes):
+    return [f for f in raw.decode().split("\n\n") if f]
+
+
+async def _collect(gen):
+    return [frame async for frame in gen]
+
+
+@pytest.mark.asyncio
+async def test_burst_deltas_are_merged_and_first_one_is_not_delayed():
+    async def burst():
+        for _ in range(200):
+            yield "ab"
+
+    frames = await _collect(coalesced_sse(burst(), max_delay=0.05, max_bytes=100, heartbeat=10))
+    texts = [json.loads(f[len("data: "):])["text"] for f in _frames(b"".join(frames))]
+    assert "".join(texts) == "ab" * 200
+    assert texts[0] == "ab"
+    # 400 chars in 100-char frames after the first delta
+    assert len(texts) <= 6
+
+
+@pytest.mark.asyncio
+async def test_idle_source_gets_heartbeats_and_is_closed_on_disconnect():
+    closed = []
+
+    async def slow():
+        try:
+            yield "hola"
+            await asyncio.sleep(10)
+            yield "nunca"
+        finally:
+            closed.append(True)
+
+    gen = coalesced_sse(slow(), max_delay=0.01, max_bytes=1024, heartbeat=0.05)
+    assert b"hola" in await anext(gen)
+    assert await anext(gen) == b": keep-alive\n\n"
+    await gen.aclose()
+    assert closed == [True]
+
+
+class _StreamingProcessor:
+    async def process_stream(self, assistant_id, content):
+        for i in range(500):
+            yield {"choices": [{"delta": {"content": f"{i} "}}]}
+
+    async def process(self, assistant_id, content, stream=False):
+        raise AssertionError("no fallback expected")
+
+
+def test_stream_alias_forwards_deltas_without_artificial_pauses(tmp_path):
+    f = tmp_path / "doc.pdf"
+    f.write_bytes(b"%PDF")
+    with TestClient(app) as c:
+        app.state.ai_processor = _StreamingProcessor()
+        app.state.stream_uploads = {"doc": str(f)}
+        t0 = time.monotonic()
+        r = c.get("/stream/doc")
+        elapsed = time.monotonic() - t0
+    frames = [json.loads(x[len("data: "):]) for x in _frames(r.content) if x.startswith("data: ")]
+    assert frames[-1] == {"done": True}
+    assert "".join(fr["text"] for fr in frames[:-1]) == "".join(f"{i} " for i in range(500))
+    # 500 deltas used to take 500 x 20 ms of sleeps
+    assert elapsed < 2
+    assert r.headers["cache-control"] == "no-cache"
+
+
+def _race_parts(first_delay, fallback_delay, first_chunk={"text": "hola"}):
+    state = {"stream_closed": False, "fallback_cancelled": False}
+
+    async def stream():
+        try:
+            await asyncio.sleep(first_delay)
+            yield first_chunk
+            yield {"text": " mundo"}
+        finally:
+            state["stream_closed"] = True
+
+    async def fallback():
+        try:
+            await asyncio.sleep(fallback_delay)
+            return {"message": "completo"}
+        except asyncio.CancelledError:
+            state["fallback_cancelled"] = True
+            raise
+
+    return stream(), fallback, state
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_still_wins_against_slower_fallback_which_is_cancelled():
+    stream, fallback, state = _race_parts(0.1, 5)
+    stats = RaceStats()
+    out = await _collect(hedged_stream(stream, fallback, hedge_delay=0.02, stats=stats))
+    assert out == [("stream", {"text": "hola"}), ("stream", {"text": " mundo"})]
+    assert state["fallback_cancelled"]
+    assert stats.metrics["stream_wins"] == 1 and stats.metrics["hedges_started"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fallback_wins_and_the_streaming_call_is_closed():
+    stream, fallback, state = _race_parts(5, 0.02)
+    stats = RaceStats()
+    out = await _collect(hedged_stream(stream, fallback, hedge_delay=0.01, stats=stats))
+    assert out == [("fallback", {"message": "completo"})]
+    assert state["stream_closed"]
+    assert stats.stats()["fallback_wins"] == 1 and stats.stats()["fallback_ttfb_p50"] < 1
+
+
+@pytest.mark.asyncio
+async def test_stream_error_starts_fallback_without_waiting_for_the_hedge():
+    stream, fallback, _ = _race_parts(0, 0.01, first_chunk={"error": "Error de red"})
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    out = await _collect(hedged_stream(stream, fallback, hedge_delay=5, stats=RaceStats()))
+    assert out == [("fallback", {"message": "completo"})]
+    assert loop.time() - t0 < 1
+
+
+def test_stream_alias_stops_a_runaway_answer(tmp_path, monkeypatch):
+    from app.api import endpoints
+
+    monkeypatch.setattr(endpoints, "MAX_STREAM_CHUNKS", 100)
+    f = tmp_path / "doc.pdf"
+    f.write_bytes(b"%PDF")
+    with TestClient(app) as c:
+        app.state.ai_processor = _StreamingProcessor()
+        app.state.stream_uploads = {"doc": str(f)}
+        r = c.get("/stream/doc")
+    frames = [json.loads(x[len("data: "):]) for x in _frames(r.content) if x.startswith("data: ")]
+    assert frames[-1] == {"done": True, "truncated": True}
+    assert "".join(fr["text"] for fr in frames[:-1]) == "".join(f"{i} " for i in range(100))
+
+
+@pytest.mark.asyncio
+async def test_coalescing_limit_counts_utf8_bytes():
+    async def burst():
+        for _ in range(200):
+            yield "ñá"
+
+    frames = await _collect(coalesced_sse(burst(), max_delay=1, max_bytes=100, heartbeat=10))
+    texts = [json.loads(f[len("data: "):])["text"] for f in _frames(b"".join(frames))]
+    assert "".join(texts) == "ñá" * 200
+    assert max(len(t.encode()) for t in texts) <= 100
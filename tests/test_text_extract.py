@@ -0,0 +1,45 @@
+import io
+
+import httpx
+import pytest
+import respx
+from PyPDF2 import PdfWriter
+
+from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.services.text_extract import extract_inline_text, extract_text
+
+
+def test_extract_text_respects_budget_and_encoding():
+    assert extract_text("año,mes\n2024,1\n".encode("utf-8"), ".csv", 100) == "año,mes\n2024,1\n"
+    assert extract_text("año".encode("latin-1"), ".txt", 100) == "año"
+    assert extract_text(b"x" * 200, ".txt", 100) is None
+    assert extract_text(b"\x89PNG...", ".png", 100) is None
+
+
+@pytest.mark.asyncio
+async def test_scanned_pdf_falls_back_to_upload():
+    w = PdfWriter()
+    w.add_blank_page(width=200, height=200)
+    buf = io.BytesIO()
+    w.write(buf)
+    assert await extract_inline_text(buf.getvalue(), ".pdf", 1000) is None
+
+
+@pytest.mark.asyncio
+async def test_send_text_and_query_skips_files_api():
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai"
+    )
+    with respx.mock(assert_all_called=False) as m:
+        files = m.post("https://api.saia.ai/v1/files")
+        chat = m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+            )
+        )
+        res = await client.send_text_and_query("linea 1\nlinea 2", "a.txt", "Resume")
+
+    assert res.get("message") == "ok" and res.get("inline_text") is True
+    assert files.call_count == 0
+    assert b"linea 1" in chat.calls[0].request.content
+    assert client.metrics["inline_text_used"] == 1
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_upload_batch_uploads_concurrently_and_chats_once(monkeypatch, saia):
+    monkeypatch.setenv("BATCH_UPLOAD_CONCURRENCY", "2")
+    files = [
+        ("files", ("a.txt", b"uno", "text/plain")),
+        ("files", ("b.csv", b"x,y\n1,2\n", "text/csv")),
+        ("files", ("c.exe", b"MZ", "application/octet-stream")),
+    ]
+    r = TestClient(app).post("/upload_batch", files=files, data={"prompt": "Compara {file}"})
+
+    body = r.json()
+    assert body["status"] == "finished" and "wall_time" in body
+    assert [f["status"] for f in body["files"]] == ["uploaded", "uploaded", "rejected"]
+    assert saia.uploads.call_count == 2 and saia.chat.call_count == 1
+    sent = saia.chat.calls[0].request.content.decode()
+    for f in body["files"][:2]:
+        assert "{file:%s}" % f["alias"] in sent
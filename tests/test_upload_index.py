@@ -0,0 +1,75 @@
+import time
+
+import httpx
+import pytest
+import respx
+
+from app.services.ai.saia_console_client import SAIAConsoleClient
+from app.services.ai.upload_index import UploadIndex
+
+
+def test_upload_index_expires_entries(tmp_path):
+    index = UploadIndex(str(tmp_path / "idx.sqlite3"), ttl=60)
+    index.record("abc", "test1", "doc-1", file_id="f1", size=10)
+    assert index.lookup("abc", "test1")["alias"] == "doc-1"
+    assert index.lookup("abc", "other") is None
+
+    index.execute("UPDATE uploads SET uploaded_at = ?", (time.time() - 120,))
+    assert index.lookup("abc", "test1") is None
+
+
+@pytest.mark.asyncio
+async def test_same_bytes_under_new_alias_reuse_first_upload(tmp_path):
+    path = str(tmp_path / "idx.sqlite3")
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai",
+        upload_index=UploadIndex(path),
+    )
+    data = b"contrato " * 50
+
+    with respx.mock(assert_all_called=False) as m:
+        files = m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "file_1"})
+        )
+        chat = m.post("https://api.saia.ai/chat").mock(
+            return_value=httpx.Response(
+                200, json={"choices": [{"message": {"content": '{"message": "ok"}'}}]}
+            )
+        )
+        await client.send_bytes_and_query(data, "c.pdf", "Resume", alias="c-aaaaaa")
+        # a second process sharing the index file sees the same entry
+        other = SAIAConsoleClient(
+            "token", "org", "proj", "assistant", "https://api.saia.ai",
+            upload_index=UploadIndex(path),
+        )
+        res = await other.send_bytes_and_query(data, "c.pdf", "Resume", alias="c-bbbbbb")
+
+    assert res.get("message") == "ok"
+    assert files.call_count == 1
+    assert other.metrics["upload_dedup_hits"] == 1
+    assert b"{file:c-aaaaaa}" in chat.calls[-1].request.content
+
+
+@pytest.mark.asyncio
+async def test_upload_never_ingested_is_not_reused(tmp_path):
+    from app.services.ai.retry import IngestionRetryScheduler
+
+    index = UploadIndex(str(tmp_path / "idx.sqlite3"))
+    client = SAIAConsoleClient(
+        "token", "org", "proj", "assistant", "https://api.saia.ai",
+        upload_index=index,
+        retry_scheduler=IngestionRetryScheduler(deadline=0.3, max_attempts=2),
+    )
+    busy = httpx.Response(
+        400, json={"error": {"message": "The document has no pages.", "code": "8024"}}
+    )
+    with respx.mock(assert_all_called=False) as m:
+        files = m.post("https://api.saia.ai/v1/files").mock(
+            return_value=httpx.Response(200, json={"id": "file_1"})
+        )
+        m.post("https://api.saia.ai/chat").mock(return_value=busy)
+        await client.send_bytes_and_query(b"roto", "r.pdf", "Resume", alias="r-1")
+        await client.send_bytes_and_query(b"roto", "r.pdf", "Resume", alias="r-2")
+
+    assert files.call_count == 2
+    assert index.lookup(client._sha256(b"roto"), "test1") is None
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.worker_runtime import WorkerRuntime
+
+
+def test_runtime_reuses_loop_and_client_across_jobs():
+    made = []
+    rt = WorkerRuntime(concurrency=1, client_factory=lambda: made.append(1) or object())
+
+    async def job(client):
+        return client, asyncio.get_running_loop()
+
+    try:
+        c1, loop1 = rt.run(job)
+        c2, loop2 = rt.run(job)
+        assert c1 is c2 and loop1 is loop2
+        assert len(made) == 1
+    finally:
+        rt.close()
+
+
+def test_runtime_runs_up_to_concurrency_jobs_at_once():
+    rt = WorkerRuntime(concurrency=2, client_factory=object)
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    async def job(client):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        await asyncio.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: rt.run(job), range(6)))
+        assert state["peak"] == 2
+    finally:
+        rt.close()
+
+
+def test_runtime_cancels_a_job_past_its_timeout():
+    rt = WorkerRuntime(concurrency=1, client_factory=object)
+    cancelled = threading.Event()
+
+    async def stuck(client):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    try:
+        with pytest.raises(TimeoutError):
+            rt.run(stuck, timeout=0.1)
+        assert cancelled.wait(1)
+    finally:
+        rt.close()